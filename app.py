@@ -3,36 +3,48 @@
 from config import init_session_state, add_button_styles
 from ui.chat_display import display_chat_messages
 from ui.query_confirmation import create_query_confirmation_ui
-from utils.query_generator import generator
+from ui.icons import TOOL_ICONS, svg_to_base64
+from utils.query_generator import generate
+from utils.semantic_cache import semantic_cache
+from utils.router import router
+from utils.query_repair import preflight_stats
 from langchain.schema import HumanMessage
 import streamlit as st
-from utils.my_langchain_tools import *
+from utils.my_langchain_tools import run_query, run_queries, answer_query, stream_answer
+from utils.result_cache import result_cache
+from utils.app_context import get_context
+import utils.embedding as embedding
+import utils.tracing as tracing
+import logging
+import time
 from utils.error_handler import handle_query_error, clear_error_state, clear_confirmation_state
 from utils.message_handler import store_ai_message
 from utils.chain_processor import process_chain_response
 import my_db_specifics
 
-# Example queries that can be used via buttons
-EXAMPLE_QUERIES = []
-for x in my_db_specifics.sql_examples:
-  x["tool_name"] = "SQL_QueryTool"
-  EXAMPLE_QUERIES.append(x)
+def example_queries():
+    """Example queries that can be used via buttons; the vector examples need config.yaml, so they are collected on first use"""
+    examples = []
+    for x in my_db_specifics.sql_examples:
+      x["tool_name"] = "SQL_QueryTool"
+      examples.append(x)
 
-for x in my_db_specifics.graph_examples:
-  x["tool_name"] = "Graph_QueryTool"
-  EXAMPLE_QUERIES.append(x)
+    for x in my_db_specifics.graph_examples:
+      x["tool_name"] = "Graph_QueryTool"
+      examples.append(x)
 
-for x in my_db_specifics.full_text_search_examples:
-  x["tool_name"] = "Fulltext_QueryTool"
-  EXAMPLE_QUERIES.append(x)
+    for x in my_db_specifics.full_text_search_examples:
+      x["tool_name"] = "Fulltext_QueryTool"
+      examples.append(x)
 
-for x in my_db_specifics.vector_search_examples:
-  x["tool_name"] = "Vector_QueryTool"
-  EXAMPLE_QUERIES.append(x)
+    for x in my_db_specifics.vector_search_examples:
+      x["tool_name"] = "Vector_QueryTool"
+      examples.append(x)
+    return examples
 
 def create_example_buttons():
     """Create buttons for example queries in a single column"""
-    for idx, example in enumerate(EXAMPLE_QUERIES):
+    for idx, example in enumerate(example_queries()):
         if st.button(
             example["input"], 
             key=f"example_{idx}",
@@ -49,22 +61,64 @@ def handle_example_query(example):
     
     # Set up the confirmation state as if the bot generated this query
     st.session_state.awaiting_confirmation = True
+    st.session_state.request_id = tracing.new_request_id()
+    st.session_state.confirmation_started = time.time()
     st.session_state.current_query = example["query"]
     st.session_state.current_chain_input = example["input"]
     st.session_state.tool_name = example["tool_name"]
+    st.session_state.extra_queries = []
 
 
-def process_confirmed_query(query):
-    """Process a confirmed query and store the response"""
-    with st.spinner("Processing confirmed query..."):
-        #print ("I am in process_confirmed_query. curre_chain_input", st.session_state.current_chain_input)
-        #print ("query", query)
-        query_response = execute_query(
-            st.session_state.current_chain_input, 
-            query
+def record_confirmation_wait(confirmed, edited=False):
+    """Record the time the user took to confirm or reject the generated query"""
+    if st.session_state.confirmation_started is None:
+        return
+    with tracing.request(st.session_state.request_id):
+        tracing.record_span(
+            "confirmation_wait",
+            1000 * (time.time() - st.session_state.confirmation_started),
+            confirmed=confirmed,
+            edited=edited,
         )
-        store_ai_message(query_response, query)
-        clear_confirmation_state()
+    st.session_state.confirmation_started = None
+
+def process_confirmed_query(query):
+    """Process a confirmed query, or all queries of a compound question, and store the response"""
+    queries = query if isinstance(query, list) else [query]
+    record_confirmation_wait(True, edited=queries[0] != st.session_state.current_query)
+
+    with tracing.request(st.session_state.request_id):
+        with st.spinner("Processing confirmed query..."):
+            #print ("I am in process_confirmed_query. curre_chain_input", st.session_state.current_chain_input)
+            #print ("query", query)
+            with tracing.span("execute", queries=len(queries)):
+                if isinstance(query, list):
+                    # The queries run concurrently and their results go into one answer
+                    query_result = run_queries(query)
+                else:
+                    query_result = run_query(query)
+            stream_answers = get_context().param.get("stream_answers", True)
+            if not stream_answers:
+                with tracing.span("answer"):
+                    query_response = answer_query(
+                        st.session_state.current_chain_input, 
+                        query_result
+                    )
+
+        if stream_answers:
+            # Show the answer as it is generated; the stored message replaces this bubble on rerun
+            icon = svg_to_base64(TOOL_ICONS.get(st.session_state.tool_name, TOOL_ICONS["default"]).strip())
+            with st.chat_message("assistant", avatar=icon), tracing.span("answer", streamed=True):
+                query_response = st.write_stream(
+                    stream_answer(st.session_state.current_chain_input, query_result)
+                )
+
+        # The generated query ran unchanged, so paraphrases of this question can reuse it
+        if not isinstance(query, list) and query == st.session_state.current_query:
+            semantic_cache().add(st.session_state.current_chain_input, st.session_state.tool_name, query)
+        with tracing.span("store_message"):
+            store_ai_message(query_response, query, query_result)
+    clear_confirmation_state()
 
 def handle_confirmation_result(confirmation_result):
     """Handle the result of query confirmation"""
@@ -79,16 +133,71 @@ def handle_confirmation_result(confirmation_result):
             handle_query_error(e)
             return True
     else:
+        record_confirmation_wait(False)
         st.warning("Query rejected. Please try a different question.")
         clear_error_state()
         return True
 
+def show_cache_stats():
+    """Show the hit rates of the caches and the local router's fast-path rate"""
+    with st.expander("Cache statistics"):
+        st.markdown("**Semantic question cache**")
+        st.json(semantic_cache().info())
+        st.markdown("**Query result cache**")
+        st.json(result_cache().info())
+        st.markdown("**Embedding cache**")
+        st.json(embedding.cache().stats)
+        st.markdown("**Local router**")
+        st.json(router().info())
+        st.markdown("**Query pre-flight**")
+        st.json(preflight_stats.info())
+
+@st.cache_resource(show_spinner="Warming up the database, clients and example indexes...")
+def app_context():
+    """Create the shared resources once per process; every session reuses them"""
+    context = get_context()
+    logging.basicConfig(
+        level=context.param.get("log_level", "INFO"),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    context.warm_up()
+    if context.param.get("trace_metrics_port"):
+        tracing.serve_metrics(context.param["trace_metrics_port"])
+    return context
+
+def show_performance():
+    """Show p50/p95 per stage over the recent questions of this process"""
+    with st.expander("Performance"):
+        percentiles = tracing.tracer().percentiles()
+        if not percentiles:
+            st.caption("No questions traced yet.")
+            return
+        st.dataframe(
+            [{"stage": stage, **values} for stage, values in percentiles.items()],
+            hide_index=True,
+            use_container_width=True,
+        )
+        if tracing.tracer().path:
+            st.caption(f"Spans are written to {tracing.tracer().path}")
+
+def show_resource_health(context):
+    """Show the warm-up time of the shared resources and their health check"""
+    with st.expander("Shared resources"):
+        st.caption(f"Warm-up: {sum(context.warmup_ms.values()):.0f} ms")
+        st.json(context.health())
+
 def run_chatbot():
     """Main function to run the chatbot interface"""
+    context = app_context()
+
     # Configure the sidebar
     with st.sidebar:
         st.markdown("### Example queries you can try:")
         create_example_buttons()
+        show_cache_stats()
+        show_resource_health(context)
+        if context.param.get("perf_sidebar", False):
+            show_performance()
     
     # Main chat interface
     st.title("DrugBot 💊")
@@ -109,9 +218,11 @@ def run_chatbot():
     if prompt := st.chat_input("What would you like to know about the drugs database?", key="chat_input"):
         st.session_state.messages.append(HumanMessage(content=prompt))
         try:
-            with st.spinner("Processing response..."):
+            # One request id follows the question through generation, confirmation and answer
+            st.session_state.request_id = tracing.new_request_id()
+            with st.spinner("Processing response..."), tracing.request(st.session_state.request_id):
                 #print ("I am in run_chatbot. prompt", prompt)
-                generated_query = generator.invoke(prompt)
+                generated_query = generate(prompt)
                 #generated_query = generator.invoke({"input": prompt}).get("output")
                 #print ("I am in run_chatbot. generated_query", generated_query)
                 process_chain_response(generated_query, prompt)
@@ -0,0 +1,180 @@
+# File: benchmarks/fakes.py
+"""
+Deterministic stand-ins for the OpenAI chat and embedding models.
+
+The chat model replays canned tool calls and queries per question, so the
+whole pipeline runs offline with the same LLM output on every run. The
+embeddings hash the words of a text into a fixed number of dimensions, so
+texts that share words are close and vector search still ranks sensibly.
+"""
+
+import asyncio
+import hashlib
+import math
+import re
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+DIMENSIONS = 1536
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def hash_embedding(text: str, dimensions: int = DIMENSIONS) -> List[float]:
+    """
+    Embed a text as the normalized counts of its hashed words.
+
+    Args:
+        text (str): The text to embed
+        dimensions (int): The vector length
+
+    Returns:
+        List[float]: A unit vector; texts without words map to the first axis
+    """
+    vector = [0.0] * dimensions
+    for word in _WORD.findall(text.lower()):
+        vector[int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16) % dimensions] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm == 0:
+        vector[0] = 1.0
+        return vector
+    return [value / norm for value in vector]
+
+
+class HashEmbeddings(Embeddings):
+    """LangChain embeddings for the few-shot example indexes, based on hash_embedding"""
+
+    def __init__(self, model: str = "hash-embedding", dimensions: int = DIMENSIONS):
+        self.model = model
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [hash_embedding(text, self.dimensions) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return hash_embedding(text, self.dimensions)
+
+
+class FakeOpenAIClient:
+    """Answers client.embeddings.create(input=..., model=...) like the OpenAI client, with hash_embedding"""
+
+    def __init__(self, latency_s: float = 0.0, dimensions: int = DIMENSIONS):
+        self.latency_s = latency_s
+        self.dimensions = dimensions
+        self.calls = 0
+        self.embeddings = SimpleNamespace(create=self._create)
+
+    def _create(self, input: Sequence[str], model: str) -> SimpleNamespace:
+        self.calls += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=hash_embedding(text, self.dimensions))
+            for i, text in enumerate(input)
+        ])
+
+
+@dataclass
+class Scenario:
+    """
+    One benchmark question and the LLM output to replay for it.
+
+    query is what the SQL or graph tool "generates"; the full-text and vector
+    tools build their query from templates and leave it None.
+    """
+
+    question: str
+    tool_name: str
+    args: Dict[str, Any]
+    query: Optional[str] = None
+    source: str = ""
+
+
+def scenario_table(scenarios: List[Scenario]) -> Dict[str, Scenario]:
+    """Index scenarios by their question and by the my_question the tools pass on to the LLM"""
+    table = {}
+    for scenario in scenarios:
+        table.setdefault(scenario.question.strip(), scenario)
+        table.setdefault(str(scenario.args.get("my_question", "")).strip(), scenario)
+    return table
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    A chat model that answers every pipeline prompt from a scenario_table.
+
+    The kind of call is recognized from the prompt: routing (tools are bound),
+    query generation ("User input:" few-shot prompt), query repair, query
+    validation (the query itself is echoed) and the final answer.
+    """
+
+    scenarios: Dict[str, Scenario]
+    latency_s: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        return self.bind(tools=[getattr(tool, "name", str(tool)) for tool in tools], **kwargs)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        tools: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        message = self._reply(messages, tools)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        tools: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        # Waits without holding a thread, like a real async client
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        message = self._reply(messages, tools)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _reply(self, messages: List[BaseMessage], tools: Optional[List[str]]) -> AIMessage:
+        text = messages[-1].content
+        prompt = "\n".join(str(message.content) for message in messages)
+
+        if tools is not None:
+            scenario = self._scenario(text)
+            return AIMessage(content="", tool_calls=[
+                {"name": scenario.tool_name, "args": dict(scenario.args), "id": "replay_call"}
+            ])
+        if "format the results into sentences" in prompt:
+            question = prompt.split("Given the Question ", 1)[1].split(" and the query_result ", 1)[0]
+            return AIMessage(content=f"Here is what the database returned for: {question}")
+        if "DuckDB rejected" in prompt:
+            question = text.split("Question: ", 1)[1].split("\n", 1)[0]
+            return AIMessage(content=self._scenario(question).query)
+        if "User input: " in text:
+            question = text.rsplit("User input: ", 1)[1].split("\n", 1)[0]
+            return AIMessage(content=self._scenario(question).query)
+        # A validation prompt: the query was already correct
+        return AIMessage(content=text)
+
+    def _scenario(self, question: str) -> Scenario:
+        question = question.strip()
+        if question not in self.scenarios:
+            raise KeyError(f"no canned LLM output for question {question!r}")
+        return self.scenarios[question]
@@ -0,0 +1,201 @@
+# File: benchmarks/fixture_db.py
+"""
+A small DrugDB with the schema of the real database, for offline benchmarks.
+
+It holds the drugs, disorders, mechanisms of action and trials that the
+example questions of my_db_specifics and interesting_q.txt ask about, so
+every example query returns rows. Disorder definitions are embedded with the
+same hash embedding the fake OpenAI client uses. The full-text index on
+Trials.StudyTitle is built here; the HNSW index is created by the app when
+it first opens the database, and drug_graph is defined on every connection.
+
+    python -m benchmarks.fixture_db /tmp/drug_fixture.db
+"""
+
+import argparse
+import os
+from typing import Any, Callable, List
+
+from benchmarks.fakes import hash_embedding
+
+SCHEMA = [
+    "CREATE TABLE Drug (drug_cui VARCHAR PRIMARY KEY, name VARCHAR);",
+    "CREATE TABLE Disorder (disorder_cui VARCHAR PRIMARY KEY, name VARCHAR, definition VARCHAR, definitionEmbedding FLOAT[1536]);",
+    "CREATE TABLE MOA (moa_id VARCHAR PRIMARY KEY, name VARCHAR);",
+    "CREATE TABLE DrugMOA (drug_cui VARCHAR, moa_id VARCHAR);",
+    "CREATE TABLE DrugDisorder (drug_cui VARCHAR, disorder_cui VARCHAR);",
+    """CREATE TABLE Trials (
+        PostingID INTEGER PRIMARY KEY, Sponsor VARCHAR, StudyTitle VARCHAR, Disorder VARCHAR, Phase VARCHAR,
+        LinkToSponsorStudyRegistry VARCHAR, LinkToClinicalTrials VARCHAR, drug_cui VARCHAR[], drug_names VARCHAR[]
+    );""",
+]
+
+FTS_INDEX = "PRAGMA create_fts_index('Trials', 'PostingID', 'StudyTitle', overwrite = 1);"
+
+DRUGS = [
+    ("C0000001", "abiraterone"),
+    ("C0000002", "fluocinolone acetonide"),
+    ("C0000003", "Fluticasone propionate"),
+    ("C0000004", "Nicotinamide"),
+    ("C0000005", "etoposide"),
+    ("C0000006", "hydroflumethiazide"),
+    ("C0000007", "tretoquinol"),
+    ("C0000008", "Valaciclovir"),
+    ("C0000009", "donepezil"),
+    ("C0000010", "memantine"),
+    ("C0000011", "galantamine"),
+    ("C0000012", "baclofen"),
+    ("C0000013", "gefitinib"),
+    ("C0000014", "cisplatin"),
+    ("C0000015", "methotrexate"),
+    ("C0000016", "ursodiol"),
+]
+
+DISORDERS = [
+    ("D0000001", "Alzheimer's Disease", "A progressive neurodegenerative disease of the brain with memory loss and dementia."),
+    ("D0000002", "Non-small cell lung carcinoma", "A carcinoma of the lung that is not a small cell carcinoma."),
+    ("D0000003", "Prostate cancer", "A malignant tumor of the prostate gland."),
+    ("D0000004", "Eczema", "An inflammation of the skin with itching, redness and scaling."),
+    ("D0000005", "Psoriasis", "A chronic inflammatory skin disease with scaly plaques."),
+    ("D0000006", "Asthma", "A chronic inflammatory disease of the airways of the lung with wheezing."),
+    ("D0000007", "Pellagra", "A disease caused by a lack of niacin with dermatitis, diarrhea and dementia."),
+    ("D0000008", "Testicular cancer", "A malignant tumor of the testis."),
+    ("D0000009", "Hypertension", "Persistently high arterial blood pressure."),
+    ("D0000010", "Edema", "Swelling caused by excess fluid trapped in the body tissues."),
+    ("D0000011", "Herpes zoster", "A viral infection of a nerve and the skin around it, caused by the varicella zoster virus."),
+    ("D0000012", "Muscle spasticity", "Stiff or rigid muscles with exaggerated reflexes."),
+    ("D0000013", "Rheumatoid arthritis", "A chronic autoimmune disorder of the joint with pain, swelling and stiffness."),
+    ("D0000014", "Osteoarthritis", "A degenerative disorder of the joint cartilage and bone."),
+    ("D0000015", "Gout", "An inflammatory arthritis of the joint caused by uric acid crystals."),
+    ("D0000016", "Hepatitis", "An inflammation of the liver, often caused by a viral infection."),
+    ("D0000017", "Liver cirrhosis", "A chronic disorder of the liver in which scar tissue replaces liver tissue."),
+    ("D0000018", "Fatty liver disease", "A disorder with excess fat stored in the liver cells."),
+    ("D0000019", "Primary biliary cholangitis", "A chronic disorder of the liver that destroys the bile ducts."),
+    ("D0000020", "Bronchospasm", "A sudden constriction of the muscles in the walls of the bronchioles of the lung."),
+]
+
+MOAS = [
+    ("M0000001", "Cytochrome P450 17A1 Inhibitors"),
+    ("M0000002", "Corticosteroid Hormone Receptor Agonists"),
+    ("M0000003", "Vitamin B3 activity"),
+    ("M0000004", "Topoisomerase Inhibitors"),
+    ("M0000005", "Sodium Chloride Symporter Inhibitors"),
+    ("M0000006", "Adrenergic beta2-Agonists"),
+    ("M0000007", "DNA Polymerase Inhibitors"),
+    ("M0000008", "Cholinesterase Inhibitors"),
+    ("M0000009", "NMDA Receptor Antagonists"),
+    ("M0000010", "GABA B receptor interactions"),
+    ("M0000011", "Protein Kinase Inhibitors"),
+    ("M0000012", "DNA Crosslinking Activity"),
+    ("M0000013", "Folic Acid Metabolism Inhibitors"),
+    ("M0000014", "Bile Acid Replacement"),
+]
+
+DRUG_MOA = [
+    ("C0000001", "M0000001"), ("C0000002", "M0000002"), ("C0000003", "M0000002"), ("C0000004", "M0000003"),
+    ("C0000005", "M0000004"), ("C0000006", "M0000005"), ("C0000007", "M0000006"), ("C0000008", "M0000007"),
+    ("C0000009", "M0000008"), ("C0000010", "M0000009"), ("C0000011", "M0000008"), ("C0000012", "M0000010"),
+    ("C0000013", "M0000011"), ("C0000014", "M0000012"), ("C0000015", "M0000013"), ("C0000016", "M0000014"),
+]
+
+DRUG_DISORDER = [
+    ("C0000001", "D0000003"),
+    ("C0000002", "D0000004"), ("C0000002", "D0000005"), ("C0000002", "D0000013"), ("C0000002", "D0000016"), ("C0000002", "D0000011"),
+    ("C0000003", "D0000006"), ("C0000003", "D0000004"),
+    ("C0000004", "D0000007"),
+    ("C0000005", "D0000008"), ("C0000005", "D0000002"),
+    ("C0000006", "D0000009"), ("C0000006", "D0000010"),
+    ("C0000007", "D0000006"), ("C0000007", "D0000020"),
+    ("C0000008", "D0000011"),
+    ("C0000009", "D0000001"), ("C0000010", "D0000001"), ("C0000011", "D0000001"),
+    ("C0000012", "D0000012"),
+    ("C0000013", "D0000002"), ("C0000014", "D0000002"), ("C0000014", "D0000008"),
+    ("C0000015", "D0000013"), ("C0000015", "D0000005"), ("C0000015", "D0000014"),
+    ("C0000016", "D0000019"), ("C0000016", "D0000017"),
+]
+
+TRIALS = [
+    ("GSK", "A double blind, placebo controlled study of Valaciclovir in herpes zoster", "Herpes zoster", "Phase 3", ["C0000008"]),
+    ("GSK", "Valaciclovir suppressive therapy, a double blind randomized trial", "Herpes zoster", "Phase 4", ["C0000008"]),
+    ("GSK", "Open label Valaciclovir pharmacokinetics in children", "Herpes zoster", "Phase 1", ["C0000008"]),
+    ("Eisai", "A double blind study of donepezil in Alzheimer's disease", "Alzheimer's Disease", "Phase 3", ["C0000009"]),
+    ("Eisai", "Donepezil and memantine combination in moderate Alzheimer's disease, double blind", "Alzheimer's Disease", "Phase 3", ["C0000009", "C0000010"]),
+    ("Janssen", "Galantamine long-term safety study in Alzheimer's disease", "Alzheimer's Disease", "Phase 4", ["C0000011"]),
+    ("GSK", "Fluticasone propionate inhaler in persistent asthma", "Asthma", "Phase 3", ["C0000003"]),
+    ("GSK", "Fluticasone propionate versus placebo in mild asthma, double blind", "Asthma", "Phase 2", ["C0000003"]),
+    ("Novartis", "Fluticasone propionate nasal spray in children with asthma", "Asthma", "Phase 3", ["C0000003", "C0000007"]),
+    ("AstraZeneca", "Gefitinib as first line treatment of non-small cell lung carcinoma", "Non-small cell lung carcinoma", "Phase 3", ["C0000013"]),
+    ("Pfizer", "Cisplatin and etoposide in advanced lung carcinoma", "Non-small cell lung carcinoma", "Phase 2", ["C0000014", "C0000005"]),
+    ("Janssen", "Abiraterone in metastatic prostate cancer", "Prostate cancer", "Phase 3", ["C0000001"]),
+    ("Roche", "Methotrexate dose escalation in rheumatoid arthritis, double blind", "Rheumatoid arthritis", "Phase 2", ["C0000015"]),
+    ("Intercept", "Ursodiol in primary biliary cholangitis of the liver", "Primary biliary cholangitis", "Phase 3", ["C0000016"]),
+]
+
+
+def create_schema(connection: Any) -> None:
+    """Create the DrugDB tables in an empty database"""
+    for statement in SCHEMA:
+        connection.execute(statement)
+
+
+def build_fts_index(connection: Any) -> None:
+    """Create (or replace) the fts_main_Trials full-text index on StudyTitle"""
+    connection.execute("LOAD fts;")
+    connection.execute(FTS_INDEX)
+
+
+def build_fixture(path: str, embed: Callable[[str], List[float]] = hash_embedding, fts: bool = True) -> str:
+    """
+    Write the fixture database, replacing an existing file.
+
+    Args:
+        path (str): The DuckDB file to create
+        embed: Embeds a disorder definition into 1536 floats
+        fts (bool): Build the full-text index; needs the fts extension
+
+    Returns:
+        str: The path of the database
+    """
+    import duckdb
+
+    for file in (path, path + ".wal"):
+        if os.path.exists(file):
+            os.remove(file)
+
+    drug_names = dict(DRUGS)
+    with duckdb.connect(path) as connection:
+        create_schema(connection)
+        connection.executemany("INSERT INTO Drug VALUES (?, ?)", DRUGS)
+        connection.executemany(
+            "INSERT INTO Disorder VALUES (?, ?, ?, ?)",
+            [(cui, name, definition, embed(definition)) for cui, name, definition in DISORDERS],
+        )
+        connection.executemany("INSERT INTO MOA VALUES (?, ?)", MOAS)
+        connection.executemany("INSERT INTO DrugMOA VALUES (?, ?)", DRUG_MOA)
+        connection.executemany("INSERT INTO DrugDisorder VALUES (?, ?)", DRUG_DISORDER)
+        connection.executemany(
+            "INSERT INTO Trials VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    posting_id, sponsor, title, disorder, phase,
+                    f"https://example.org/registry/{posting_id}", f"https://clinicaltrials.gov/study/FX{posting_id:06d}",
+                    cuis, [drug_names[cui] for cui in cuis],
+                )
+                for posting_id, (sponsor, title, disorder, phase, cuis) in enumerate(TRIALS, start=1)
+            ],
+        )
+        if fts:
+            build_fts_index(connection)
+        connection.execute("CHECKPOINT;")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="the DuckDB file to write")
+    args = parser.parse_args()
+    print(build_fixture(args.path))
+
+
+if __name__ == "__main__":
+    main()
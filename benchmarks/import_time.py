@@ -0,0 +1,108 @@
+# File: benchmarks/import_time.py
+"""
+Cold-start breakdown of the app, based on python -X importtime.
+
+Each module is imported in a fresh interpreter. The report shows the total
+import time, the slowest imports by their own time, and the time per
+top-level package. With --init it also times the first use of every app
+context resource (config, database pool, SQLDatabase, HTTP and LLM clients,
+example indexes), which needs the database, the DuckDB extensions and the
+OpenAI API for an example index that is not built yet.
+
+Run from the repository root (config.yaml must exist):
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time app --top 30 --init
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+DEFAULT_MODULES = ["my_db_specifics", "utils.my_langchain_tools", "utils.query_generator", "app"]
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+_INIT_SCRIPT = """
+from utils.app_context import get_context
+for name, ms in get_context().warm_up().items():
+    print(f"INIT {name} {1000 * ms:.0f}")
+"""
+
+
+def import_times(module: str) -> Tuple[List[Tuple[str, int, int, int]], float]:
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Args:
+        module (str): The module to import
+
+    Returns:
+        Tuple: (module name, self us, cumulative us, nesting level) per import, and the wall time in seconds
+    """
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+
+    rows = []
+    for line in completed.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows, wall
+
+
+def report(module: str, top: int) -> None:
+    rows, wall = import_times(module)
+    total = next((cumulative for name, _, cumulative, _ in rows if name == module), 0)
+    print(f"== import {module}: {total / 1000:.1f} ms of imports, {wall * 1000:.0f} ms interpreter wall time")
+
+    print(f"-- slowest {top} imports by self time")
+    for name, self_us, cumulative_us, _ in sorted(rows, key=lambda row: row[1], reverse=True)[:top]:
+        print(f"   {self_us / 1000:8.1f} ms self {cumulative_us / 1000:9.1f} ms cumulative  {name}")
+
+    packages: Dict[str, int] = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        packages[name.split(".")[0]] += self_us
+    print("-- self time per top-level package")
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"   {self_us / 1000:8.1f} ms  {package}")
+    print()
+
+
+def report_init() -> None:
+    completed = subprocess.run([sys.executable, "-c", _INIT_SCRIPT], capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"initializing the app context failed:\n{completed.stderr[-2000:]}")
+    print("== first use of the app context resources")
+    for line in completed.stdout.splitlines():
+        if line.startswith("INIT "):
+            _, name, us = line.split()
+            print(f"   {int(us) / 1000:8.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="modules to import")
+    parser.add_argument("--top", type=int, default=15, help="rows per table")
+    parser.add_argument("--init", action="store_true", help="also time the first use of every app context resource")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        report(module, args.top)
+    if args.init:
+        report_init()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,509 @@
+# File: benchmarks/pipeline.py
+"""
+Offline benchmark of the question pipeline, per stage and per tool.
+
+Every example question of my_db_specifics and every question in
+interesting_q.txt is sent through the same stages as in the app:
+
+    route      the routing LLM picks the tool (llm_with_tools)
+    generate   the tool writes its query (call_tools)
+    preflight  EXPLAIN and repair before the confirmation UI
+    execute    the confirmed query runs on the pool (run_queries)
+    answer     the answer LLM formats the rows (answer_query)
+
+The chat model and the embeddings are the deterministic fakes of
+benchmarks/fakes.py and the database is the fixture of benchmarks/fixture_db.py,
+so no API key or network is needed and every run sees the same LLM output.
+The human confirmation step is skipped. The local router is switched off so
+that every question takes the LLM routing path, and the result cache is
+switched off so that every run executes its query.
+
+The report shows p50/p95 latency and the peak traced allocation per stage,
+and the throughput of each tool with concurrent questions: on threads with
+the synchronous pipeline of the app, and on one event loop with aask of
+utils/async_pipeline.py. Results can be
+saved as a baseline and compared against it; a stage that got slower than
+the tolerance is reported as a regression and sets the exit code.
+
+The app needs the fts, vss and duckpgq DuckDB extensions. Where one of them
+cannot be loaded, the benchmark opens the fixture without it and skips the
+questions that need it: Graph_QueryTool queries need duckpgq and full-text
+queries need fts; without vss the vector search scans the table instead of
+using the HNSW index. The skipped extensions are saved with the baseline.
+Run from the repository root:
+
+    python -m benchmarks.pipeline --iterations 20
+    python -m benchmarks.pipeline --save-baseline
+    python -m benchmarks.pipeline --llm-latency-ms 300 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+import yaml
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# The app modules read config.yaml from the working directory on first use, so
+# they are only used after changing into the benchmark workdir
+sys.path.insert(0, str(REPO_ROOT))
+
+from benchmarks.fakes import FakeOpenAIClient, HashEmbeddings, ReplayChatModel, Scenario, scenario_table  # noqa: E402
+from benchmarks.fixture_db import build_fixture  # noqa: E402
+
+STAGES = ["route", "generate", "preflight", "execute", "answer"]
+TOOLS = ["SQL_QueryTool", "Graph_QueryTool", "Fulltext_QueryTool", "Vector_QueryTool"]
+
+DEFAULT_BASELINE = REPO_ROOT / "benchmarks" / "pipeline_baseline.json"
+QUESTIONS_FILE = REPO_ROOT / "interesting_q.txt"
+
+EMBEDDING_MODEL = "hash-embedding"
+
+EXTENSIONS = ["duckpgq", "fts", "vss"]
+
+# The LLM output replayed for the questions in interesting_q.txt
+INTERESTING_SCENARIOS = {
+    "double blind & Alzheimer's disease": (
+        "Fulltext_QueryTool",
+        {"my_question": "double blind & Alzheimer's disease", "original_query": "double blind & Alzheimer's disease", "limit": 20},
+        None,
+    ),
+    "What diseases can fluocinolone acetonide treat? Show me 4 results. Use the graph query.": (
+        "Graph_QueryTool",
+        {"my_question": "What diseases can fluocinolone acetonide treat? Show me 4 results. Use the graph query.", "limit": 4},
+        """FROM GRAPH_TABLE (drug_graph
+            MATCH
+            (i:Drug WHERE LOWER(i.name) = LOWER('fluocinolone acetonide'))-[m:MAY_TREAT]->(c:Disorder)
+            COLUMNS (c.name AS disorder_name)
+            )
+            LIMIT 4;""",
+    ),
+    "What diseases can hydroflumethiazide treat?": (
+        "SQL_QueryTool",
+        {"my_question": "What diseases can hydroflumethiazide treat?", "limit": 20},
+        """SELECT Disorder.name
+            FROM DrugDisorder, Drug, Disorder
+            WHERE DrugDisorder.drug_cui = Drug.drug_cui
+            AND DrugDisorder.disorder_cui = Disorder.disorder_cui
+            AND LOWER(Drug.name) = LOWER('hydroflumethiazide')
+            LIMIT 20;""",
+    ),
+    "Show 5 liver-related disorder?": (
+        "Vector_QueryTool",
+        {"my_question": "liver-related disorder", "limit": 5},
+        None,
+    ),
+    "What is the MOA of tretoquinol?": (
+        "SQL_QueryTool",
+        {"my_question": "What is the MOA of tretoquinol?", "limit": 20},
+        """SELECT MOA.name
+            FROM DrugMOA, Drug, MOA
+            WHERE DrugMOA.drug_cui = Drug.drug_cui
+            AND DrugMOA.moa_id = MOA.moa_id
+            AND LOWER(Drug.name) = LOWER('tretoquinol')
+            LIMIT 20;""",
+    ),
+}
+
+_LIMIT = re.compile(r"\bLIMIT\s+(\d+)", re.IGNORECASE)
+_QUOTED = re.compile(r"\"([^\"]+)\"")
+
+
+def example_scenarios() -> List[Scenario]:
+    """Turn the few-shot examples of my_db_specifics into scenarios that replay their own query"""
+    import my_db_specifics
+
+    scenarios = []
+    for tool_name, examples in (
+        ("SQL_QueryTool", my_db_specifics.sql_examples),
+        ("Graph_QueryTool", my_db_specifics.graph_examples),
+        ("Fulltext_QueryTool", my_db_specifics.full_text_search_examples),
+        ("Vector_QueryTool", my_db_specifics.vector_search_examples),
+    ):
+        for example in examples:
+            limits = _LIMIT.findall(example["query"])
+            args = {"my_question": example["input"], "limit": int(limits[-1]) if limits else 20}
+            if tool_name == "Fulltext_QueryTool":
+                quoted = _QUOTED.search(example["input"])
+                args["original_query"] = quoted.group(1) if quoted else example["input"]
+            llm_written = tool_name in ("SQL_QueryTool", "Graph_QueryTool")
+            scenarios.append(Scenario(
+                example["input"], tool_name, args, example["query"] if llm_written else None, "my_db_specifics"
+            ))
+    return scenarios
+
+
+def interesting_scenarios(path: Path = QUESTIONS_FILE) -> List[Scenario]:
+    """Return a scenario per question in interesting_q.txt; every question needs an INTERESTING_SCENARIOS entry"""
+    questions = [line.strip() for line in path.read_text().splitlines() if line.strip()]
+    missing = [question for question in questions if question not in INTERESTING_SCENARIOS]
+    if missing:
+        raise SystemExit(f"add the LLM output for these questions to INTERESTING_SCENARIOS: {missing}")
+    return [
+        Scenario(question, *INTERESTING_SCENARIOS[question], source=path.name)
+        for question in questions
+    ]
+
+
+def missing_extensions() -> List[str]:
+    """Return the DuckDB extensions of the app that cannot be loaded here"""
+    import duckdb
+
+    missing = []
+    with duckdb.connect() as connection:
+        for extension in EXTENSIONS:
+            try:
+                connection.execute(f"LOAD {extension};")
+            except duckdb.Error:
+                missing.append(extension)
+    return missing
+
+
+def needed_extensions(scenario: Scenario) -> List[str]:
+    """Return the extensions the query of a scenario needs; the vector search runs without vss"""
+    query = (scenario.query or "").lower()
+    needed = []
+    if scenario.tool_name == "Graph_QueryTool" or "graph_table" in query:
+        needed.append("duckpgq")
+    if scenario.tool_name == "Fulltext_QueryTool" or "match_bm25" in query:
+        needed.append("fts")
+    return needed
+
+
+def prepare_workdir(workdir: str, missing: List[str]) -> str:
+    """Write the fixture database and a config.yaml for it into workdir and change into it"""
+    os.makedirs(workdir, exist_ok=True)
+    database = build_fixture(os.path.join(workdir, "drug.db"), fts="fts" not in missing)
+    config = {
+        "openai_api": "offline",
+        "vector_embedding_model": EMBEDDING_MODEL,
+        "drugdb_path": database,
+        "local_router": False,
+        "result_cache_max_bytes": 0,
+    }
+    with open(os.path.join(workdir, "config.yaml"), "w") as stream:
+        yaml.safe_dump(config, stream)
+    os.chdir(workdir)
+    return database
+
+
+def open_pool(missing: List[str]):
+    """
+    Open the connection pool of the app without the extensions that are missing.
+
+    The indexes are not checked: the HNSW index needs vss and the full-text
+    index is built with the fixture when fts is there.
+    """
+    import my_db_specifics
+    import utils.vector_index as vector_index
+    from utils.app_context import setting
+    from utils.db_pool import ConnectionPool
+
+    skipped = {f"LOAD {extension};" for extension in missing}
+    if "duckpgq" in missing:
+        skipped.add(my_db_specifics.property_graph_definition)
+    init_commands = [command for command in my_db_specifics.initialization_commands if command not in skipped]
+    if "vss" not in missing:
+        init_commands += vector_index.session_commands()
+    return ConnectionPool(setting("drugdb_path"), size=setting("db_pool_size", 4), init_commands=init_commands)
+
+
+def install_fakes(
+    scenarios: List[Scenario], llm_latency_s: float, embedding_latency_s: float, missing: List[str]
+) -> Dict[str, float]:
+    """Put the fake models into the app context and warm it up; returns the warm-up ms per resource"""
+    from utils.app_context import get_context
+
+    context = get_context()
+    if missing:
+        context.__dict__["pool"] = open_pool(missing)
+    context.__dict__.update(
+        openai_client=FakeOpenAIClient(latency_s=embedding_latency_s),
+        llm=ReplayChatModel(scenarios=scenario_table(scenarios), latency_s=llm_latency_s),
+        example_embeddings=HashEmbeddings(EMBEDDING_MODEL),
+    )
+    return context.warm_up()
+
+
+@contextlib.contextmanager
+def _stage(record: Dict[str, Dict[str, float]], name: str):
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    yield
+    record[name] = {"ms": 1000 * (time.perf_counter() - start)}
+    if tracing:
+        record[name]["alloc_kib"] = (tracemalloc.get_traced_memory()[1] - before) / 1024
+
+
+def run_question(scenario: Scenario) -> Dict[str, Dict[str, float]]:
+    """
+    Send one question through every stage of the pipeline.
+
+    Args:
+        scenario (Scenario): The question to ask
+
+    Returns:
+        Dict[str, Dict[str, float]]: Per stage the "ms" and, while tracemalloc traces, the peak "alloc_kib"
+    """
+    from utils.my_langchain_tools import answer_query, run_queries
+    from utils.query_generator import call_tools, llm_with_tools
+    from utils.query_repair import preflight
+
+    record: Dict[str, Dict[str, float]] = {}
+    started = time.perf_counter()
+    with _stage(record, "route"):
+        message = llm_with_tools().invoke(scenario.question)
+    with _stage(record, "generate"):
+        tool_calls = call_tools(message)
+    with _stage(record, "preflight"):
+        preflight(tool_calls, started)
+    with _stage(record, "execute"):
+        query_results = run_queries([tool_call["output"] for tool_call in tool_calls])
+    with _stage(record, "answer"):
+        answer_query(scenario.question, query_results[0] if len(query_results) == 1 else query_results)
+    return record
+
+
+async def _ask_all(scenarios: List[Scenario], concurrency: int) -> None:
+    """Answer every question with the asyncio pipeline, at most concurrency at once"""
+    from utils.async_pipeline import aask
+
+    slots = asyncio.Semaphore(concurrency)
+
+    async def ask(scenario: Scenario) -> None:
+        async with slots:
+            await aask(scenario.question)
+
+    await asyncio.gather(*(ask(scenario) for scenario in scenarios))
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def measure(scenarios: List[Scenario], iterations: int, rounds: int, concurrency: int) -> Dict[str, Any]:
+    """
+    Run the latency, allocation and throughput passes.
+
+    Args:
+        scenarios: The questions to ask
+        iterations: Timed runs of every question, after one warm-up run
+        rounds: How often every question of a tool is asked in the throughput pass
+        concurrency: Questions in flight at once in the throughput pass
+
+    Returns:
+        Dict[str, Any]: The results per tool, in the layout of the baseline file
+    """
+    latencies: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+    allocations: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+    errors: Dict[str, List[str]] = defaultdict(list)
+    healthy = []
+
+    for scenario in scenarios:
+        try:
+            run_question(scenario)
+        except Exception as e:
+            errors[scenario.tool_name].append(f"{scenario.question}: {type(e).__name__}: {e}")
+            continue
+        healthy.append(scenario)
+        for _ in range(iterations):
+            for stage, values in run_question(scenario).items():
+                latencies[scenario.tool_name][stage].append(values["ms"])
+
+    # Tracing slows every allocation down, so allocations get their own pass
+    tracemalloc.start()
+    try:
+        for scenario in healthy:
+            for stage, values in run_question(scenario).items():
+                allocations[scenario.tool_name][stage].append(values["alloc_kib"])
+    finally:
+        tracemalloc.stop()
+
+    throughput, async_throughput = {}, {}
+    for tool_name in TOOLS:
+        workload = [scenario for scenario in healthy if scenario.tool_name == tool_name] * rounds
+        if not workload:
+            continue
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(run_question, workload))
+        throughput[tool_name] = len(workload) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        asyncio.run(_ask_all(workload, concurrency))
+        async_throughput[tool_name] = len(workload) / (time.perf_counter() - start)
+
+    results = {}
+    for tool_name in TOOLS:
+        stages = {}
+        for stage in STAGES:
+            values = latencies[tool_name][stage]
+            if not values:
+                continue
+            stages[stage] = {
+                "p50_ms": percentile(values, 0.5),
+                "p95_ms": percentile(values, 0.95),
+                "mean_ms": sum(values) / len(values),
+                "alloc_kib": sum(allocations[tool_name][stage]) / max(1, len(allocations[tool_name][stage])),
+            }
+        totals = [sum(run) for run in zip(*(latencies[tool_name][stage] for stage in STAGES))]
+        results[tool_name] = {
+            "questions": sum(1 for scenario in healthy if scenario.tool_name == tool_name),
+            "stages": stages,
+            "total_p50_ms": percentile(totals, 0.5) if totals else None,
+            "total_p95_ms": percentile(totals, 0.95) if totals else None,
+            "throughput_qps": throughput.get(tool_name),
+            "async_throughput_qps": async_throughput.get(tool_name),
+            "errors": errors[tool_name],
+        }
+    return results
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    for tool_name, result in results.items():
+        print(f"== {tool_name}: {result['questions']} questions")
+        if result["stages"]:
+            print(f"   {'stage':<10} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9} {'alloc KiB':>10}")
+            for stage, values in result["stages"].items():
+                print(
+                    f"   {stage:<10} {values['p50_ms']:9.2f} {values['p95_ms']:9.2f} "
+                    f"{values['mean_ms']:9.2f} {values['alloc_kib']:10.1f}"
+                )
+            print(f"   {'total':<10} {result['total_p50_ms']:9.2f} {result['total_p95_ms']:9.2f}")
+        if result["throughput_qps"] is not None:
+            print(f"   throughput {result['throughput_qps']:.1f} questions/s")
+        if result.get("async_throughput_qps") is not None:
+            print(f"   async throughput {result['async_throughput_qps']:.1f} questions/s")
+        for error in result["errors"]:
+            print(f"   ERROR {error}")
+        print()
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_ms: float) -> List[str]:
+    """
+    Compare the p50 latencies and the throughput with a baseline.
+
+    Args:
+        results: The current results
+        baseline: Results saved earlier with --save-baseline
+        tolerance: Allowed relative slowdown, e.g. 0.2 for 20%
+        min_delta_ms: Latency differences below this are noise and never regressions
+
+    Returns:
+        List[str]: One line per regression
+    """
+    regressions = []
+    print(f"== compared with the baseline of {baseline.get('created', 'unknown date')}")
+    for tool_name, result in results.items():
+        before = baseline.get("tools", {}).get(tool_name)
+        if not before:
+            continue
+        for stage, values in result["stages"].items():
+            old = before["stages"].get(stage, {}).get("p50_ms")
+            if old is None:
+                continue
+            new = values["p50_ms"]
+            change = (new - old) / old if old else 0.0
+            flag = ""
+            if change > tolerance and new - old > min_delta_ms:
+                flag = "  REGRESSION"
+                regressions.append(f"{tool_name} {stage}: p50 {old:.2f} -> {new:.2f} ms")
+            print(f"   {tool_name:<20} {stage:<10} {old:9.2f} -> {new:9.2f} ms  {100 * change:+6.1f}%{flag}")
+
+        for key, label in (("throughput_qps", "throughput"), ("async_throughput_qps", "async")):
+            old_qps, new_qps = before.get(key), result.get(key)
+            if not (old_qps and new_qps):
+                continue
+            change = (new_qps - old_qps) / old_qps
+            flag = ""
+            if change < -tolerance:
+                flag = "  REGRESSION"
+                regressions.append(f"{tool_name} {label} throughput: {old_qps:.1f} -> {new_qps:.1f} questions/s")
+            print(f"   {tool_name:<20} {label:<10} {old_qps:9.1f} -> {new_qps:9.1f} q/s  {100 * change:+6.1f}%{flag}")
+    print()
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10, help="timed runs per question")
+    parser.add_argument("--rounds", type=int, default=5, help="runs per question in the throughput pass")
+    parser.add_argument("--concurrency", type=int, default=4, help="questions in flight in the throughput pass")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated latency of every LLM call")
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0, help="simulated latency of every embedding call")
+    parser.add_argument("--workdir", help="where the fixture database and caches go (default: a new temporary directory)")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="baseline file to compare with or to save")
+    parser.add_argument("--save-baseline", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown reported as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="smaller latency changes are never regressions")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="drugbot-bench-")
+    missing = missing_extensions()
+    database = prepare_workdir(workdir, missing)
+    scenarios, skipped = [], []
+    for scenario in example_scenarios() + interesting_scenarios():
+        (skipped if set(needed_extensions(scenario)) & set(missing) else scenarios).append(scenario)
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        warmup_ms = install_fakes(scenarios, args.llm_latency_ms / 1000, args.embedding_latency_ms / 1000, missing)
+        results = measure(scenarios, args.iterations, args.rounds, args.concurrency)
+
+    print(f"fixture database {database}")
+    if missing:
+        print(f"missing DuckDB extensions {', '.join(missing)}: skipped {len(skipped)} questions")
+    print("warm-up " + ", ".join(f"{name} {ms:.1f} ms" for name, ms in warmup_ms.items()) + "\n")
+    print_report(results)
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "settings": {
+                **{key: getattr(args, key) for key in ("iterations", "rounds", "concurrency", "llm_latency_ms", "embedding_latency_ms")},
+                "missing_extensions": missing,
+                "skipped_questions": len(skipped),
+            },
+            "tools": results,
+        }
+        baseline_path.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"saved the baseline to {baseline_path}")
+        regressions = []
+    elif baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text())
+        if baseline.get("settings", {}).get("missing_extensions", []) != missing:
+            print("the baseline was recorded with other DuckDB extensions; its stages are not comparable\n")
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    else:
+        print(f"no baseline at {baseline_path}; save one with --save-baseline")
+        regressions = []
+
+    failed = any(result["errors"] for result in results.values())
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions or failed else 0)
+
+
+if __name__ == "__main__":
+    main()
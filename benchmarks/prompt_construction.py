@@ -0,0 +1,119 @@
+# File: benchmarks/prompt_construction.py
+"""
+Per-call overhead of building the SQL and graph prompts and chains.
+
+Compares the old tool bodies, which rebuilt every template and chain on each
+call, with the prebuilt runnables of utils/prompts.py that only receive the
+per-call inputs. The LLM is a fake chat model and the few-shot examples are
+taken in order, so the benchmark runs offline and measures LangChain overhead
+only.
+
+Run from the repository root (config.yaml must exist):
+
+    python -m benchmarks.prompt_construction --calls 200
+"""
+
+import argparse
+import time
+from typing import Dict, List
+
+from langchain.chains import create_sql_query_chain
+from langchain_community.utilities import SQLDatabase
+from langchain_core.example_selectors import BaseExampleSelector
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, FewShotPromptTemplate, PromptTemplate
+
+import my_db_specifics
+import utils.prompts as prompts
+
+QUESTION = "Which drugs may treat Alzheimer's Disease?"
+
+
+class FirstExamplesSelector(BaseExampleSelector):
+    """Selects the first k examples, so no embedding call is needed"""
+
+    def __init__(self, examples: List[Dict[str, str]], k: int = 5):
+        self.examples = examples
+        self.k = k
+
+    def add_example(self, example: Dict[str, str]) -> None:
+        self.examples.append(example)
+
+    def select_examples(self, input_variables: Dict[str, str]) -> List[dict]:
+        return self.examples[:self.k]
+
+
+def per_call_sql(llm, db, selector, limit):
+    """The SQL tool body before the prompts were hoisted"""
+    sql_generation_prompt = FewShotPromptTemplate(
+        example_selector=selector,
+        example_prompt=PromptTemplate.from_template("User input: {input}\nSQL query: {query}"),
+        prefix=prompts.SQL_GENERATION_PREFIX,
+        suffix=prompts.SQL_GENERATION_SUFFIX,
+        input_variables=["input", "top_k", "table_info"],
+    )
+    write_query = create_sql_query_chain(llm, db, sql_generation_prompt)
+    system = prompts.sql_validation_system.replace("{dialect}", db.dialect).replace("{limit}", str(limit))
+    validation_prompt = ChatPromptTemplate.from_messages([("system", system), ("human", "{query}")])
+    validation_chain = validation_prompt | llm | StrOutputParser()
+    query = write_query.invoke({"question": QUESTION, "top_k": limit, "table_info": my_db_specifics.sql_database_prompt})
+    return validation_chain.invoke({"query": query})
+
+
+def per_call_graph(llm, selector, limit):
+    """The graph tool body before the prompts were hoisted"""
+    pgq_generation_prompt = prompts.graph_generation_prompt(selector)
+    system = prompts.graph_validation_system.replace("{limit}", str(limit))
+    validation_prompt = ChatPromptTemplate.from_messages([("system", system), ("human", "{query}")])
+    generate_query = pgq_generation_prompt | validation_prompt | llm | StrOutputParser()
+    return generate_query.invoke({"input": QUESTION, "table_info": my_db_specifics.graph_database_prompt, "top_k": limit})
+
+
+def measure(label: str, function, calls: int) -> float:
+    function()
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    per_call_us = 1e6 * (time.perf_counter() - start) / calls
+    print(f"{label:<28} {per_call_us:10.1f} us/call")
+    return per_call_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="calls per variant")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    llm = FakeListChatModel(responses=["SELECT 1;"])
+    db = SQLDatabase.from_uri("duckdb:///:memory:")
+    sql_selector = FirstExamplesSelector(my_db_specifics.sql_examples)
+    graph_selector = FirstExamplesSelector(my_db_specifics.graph_examples)
+
+    # Prebuilt once, like the chains of utils/my_langchain_tools.py
+    sql_write_query = create_sql_query_chain(llm, db, prompts.sql_generation_prompt(sql_selector))
+    sql_validation_chain = prompts.sql_validation_prompt.partial(dialect=db.dialect) | llm | StrOutputParser()
+    graph_generate_query = (
+        prompts.graph_validation_inputs(prompts.graph_generation_prompt(graph_selector))
+        | prompts.graph_validation_prompt | llm | StrOutputParser()
+    )
+
+    def prebuilt_sql():
+        query = sql_write_query.invoke({"question": QUESTION, "top_k": args.limit, "table_info": my_db_specifics.sql_database_prompt})
+        return sql_validation_chain.invoke({"query": query, "limit": args.limit})
+
+    def prebuilt_graph():
+        return graph_generate_query.invoke({"input": QUESTION, "table_info": my_db_specifics.graph_database_prompt, "top_k": args.limit})
+
+    for name, before, after in (
+        ("SQL", lambda: per_call_sql(llm, db, sql_selector, args.limit), prebuilt_sql),
+        ("graph", lambda: per_call_graph(llm, graph_selector, args.limit), prebuilt_graph),
+    ):
+        rebuilt = measure(f"{name}: rebuilt per call", before, args.calls)
+        hoisted = measure(f"{name}: prebuilt", after, args.calls)
+        print(f"{name}: {rebuilt - hoisted:.1f} us saved per call ({rebuilt / hoisted:.2f}x)\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+# File: benchmarks/synthetic_db.py
+"""
+Synthetic DrugDB at a chosen scale, for scaling tests of the query paths.
+
+Scale 1 has about as many rows as the real database (2000 trials). The
+generator keeps the shapes that matter for the query plans:
+
+- drug, disorder and MOA names are built from syllables and medical terms,
+  and the entities of benchmarks/fixture_db.py come first, so every example
+  question of my_db_specifics still finds its rows
+- Trials.drug_cui holds 1 to 6 drugs per trial, picked with a Zipf
+  popularity, so a few drugs appear in many trials
+- drug-disorder degrees follow a power law, and popular disorders attract
+  most of the edges
+- Disorder.definitionEmbedding holds random unit vectors with 1536 floats
+
+After loading the data it builds the full-text index on Trials.StudyTitle,
+the HNSW index and the drug_graph property graph, and checks that the graph
+can be queried. The graph is kept, so a read-only app finds it in the file.
+With --time-queries every example query of my_db_specifics is then timed.
+
+Run from the repository root (config.yaml must exist for the HNSW settings):
+
+    python -m benchmarks.synthetic_db drug_x10.db --scale 10 --time-queries
+    python -m benchmarks.synthetic_db drug_x1000.db --scale 1000 --seed 7
+"""
+
+import argparse
+import os
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import pyarrow as pa
+
+from benchmarks import fixture_db
+
+BASE_ROWS = {"Drug": 1500, "Disorder": 2500, "MOA": 300, "Trials": 2000}
+DIMENSIONS = 1536
+CHUNK_ROWS = 50_000
+
+SYLLABLES = [
+    "ab", "ce", "da", "fe", "glu", "ka", "lo", "mo", "na", "pra", "qui", "ri",
+    "sa", "te", "tri", "va", "xi", "ze", "bu", "cor", "del", "em", "fil", "hy",
+]
+DRUG_SUFFIXES = [
+    "mab", "nib", "pril", "olol", "azole", "statin", "vir", "cillin", "sartan",
+    "tide", "parin", "oxacin", "dronate", "profen", "zepam", "setron", "lukast", "tidine",
+]
+DISORDER_MODIFIERS = [
+    "Acute", "Chronic", "Primary", "Secondary", "Hereditary", "Congenital",
+    "Idiopathic", "Autoimmune", "Recurrent", "Progressive", "Juvenile", "Malignant",
+]
+ORGANS = [
+    "liver", "kidney", "lung", "heart", "skin", "joint", "brain", "bone", "colon",
+    "pancreas", "thyroid", "retina", "bladder", "prostate", "breast", "stomach",
+    "spleen", "muscle", "nerve", "artery", "vein", "esophagus", "ovary", "lymph node", "spinal cord",
+]
+CONDITIONS = [
+    ("inflammation", "an inflammation of the {organ} with swelling and pain"),
+    ("carcinoma", "a malignant tumor that arises in the epithelium of the {organ}"),
+    ("fibrosis", "a thickening and scarring of the connective tissue of the {organ}"),
+    ("failure", "a loss of function of the {organ}"),
+    ("infection", "an infection of the {organ} caused by bacteria or viruses"),
+    ("degeneration", "a progressive loss of cells and function of the {organ}"),
+    ("cyst", "a closed sac with fluid that forms in the {organ}"),
+    ("hemorrhage", "a bleeding into or from the {organ}"),
+    ("insufficiency", "an inability of the {organ} to perform its normal function"),
+    ("dysplasia", "an abnormal development of cells in the {organ}"),
+    ("stenosis", "an abnormal narrowing of a passage in the {organ}"),
+    ("neuropathy", "a damage of the nerves that supply the {organ}"),
+    ("sarcoma", "a malignant tumor of the connective tissue of the {organ}"),
+    ("ischemia", "a restriction of the blood supply to the {organ}"),
+    ("hyperplasia", "an enlargement of the {organ} caused by an increase of its cells"),
+    ("atrophy", "a wasting away of the tissue of the {organ}"),
+]
+MOA_TARGETS = [
+    "Cyclooxygenase", "Angiotensin Converting Enzyme", "HMG-CoA Reductase", "Beta Adrenergic Receptor",
+    "Histamine H2 Receptor", "Proton Pump", "Dopamine D2 Receptor", "Serotonin 5-HT3 Receptor",
+    "GABA A Receptor", "Calcium Channel", "Sodium Channel", "Potassium Channel", "Tyrosine Kinase",
+    "Topoisomerase II", "DNA Polymerase", "Reverse Transcriptase", "Neuraminidase", "Thrombin",
+    "Factor Xa", "Phosphodiesterase 5", "Carbonic Anhydrase", "Xanthine Oxidase", "Aromatase",
+    "Estrogen Receptor", "Androgen Receptor", "Glucocorticoid Receptor", "Insulin Receptor",
+    "GLP-1 Receptor", "DPP-4", "SGLT2", "Leukotriene Receptor", "Muscarinic Receptor",
+    "Nicotinic Receptor", "Opioid Mu Receptor", "NMDA Receptor", "Acetylcholinesterase",
+    "Bacterial Cell Wall Synthesis", "Ergosterol Synthesis", "Microtubule", "Proteasome",
+]
+MOA_ACTIONS = ["Inhibitors", "Agonists", "Antagonists", "Blockers", "Modulators", "Activators", "Interactions", "Binders"]
+SPONSORS = [
+    "Pfizer", "Novartis", "Roche", "Merck", "GSK", "Sanofi", "AstraZeneca", "Johnson & Johnson",
+    "AbbVie", "Bayer", "Eli Lilly", "Bristol-Myers Squibb", "Amgen", "Gilead", "Takeda",
+    "Boehringer Ingelheim", "Novo Nordisk", "Teva", "Astellas", "Daiichi Sankyo", "Eisai",
+    "Biogen", "Regeneron", "Vertex", "Otsuka", "UCB", "Ipsen", "Servier", "Lundbeck", "Chiesi",
+]
+DESIGNS = [
+    "A double blind, placebo controlled study of", "An open label study of", "A randomized trial of",
+    "A double blind, randomized comparison of", "A long-term safety study of", "A dose escalation study of",
+    "A pharmacokinetic study of", "An extension study of",
+]
+PHASES = ["Phase 1", "Phase 2", "Phase 3", "Phase 4"]
+
+
+def zipf_weights(n: int, exponent: float = 1.1) -> np.ndarray:
+    """Selection probabilities of n items whose popularity falls off with their rank"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def drug_name(index: int) -> str:
+    """A unique drug-like name for every index, e.g. 'cemolovir'"""
+    digits, rest = [], index + len(SYLLABLES)
+    while rest:
+        rest, digit = divmod(rest, len(SYLLABLES))
+        digits.append(SYLLABLES[digit])
+    return "".join(digits) + DRUG_SUFFIXES[index % len(DRUG_SUFFIXES)]
+
+
+def disorder_entry(index: int) -> tuple:
+    """A unique (name, definition) pair for every index"""
+    combinations = len(DISORDER_MODIFIERS) * len(ORGANS) * len(CONDITIONS)
+    variant, rest = divmod(index, combinations)
+    rest, condition = divmod(rest, len(CONDITIONS))
+    modifier, organ = divmod(rest, len(ORGANS))
+    condition_name, definition = CONDITIONS[condition]
+    name = f"{DISORDER_MODIFIERS[modifier]} {ORGANS[organ]} {condition_name}" + (f" type {variant + 1}" if variant else "")
+    definition = definition.format(organ=ORGANS[organ])
+    return name, f"{DISORDER_MODIFIERS[modifier]} disorder: {definition}."
+
+
+def moa_name(index: int) -> str:
+    """A unique mechanism-of-action name for every index"""
+    variant, rest = divmod(index, len(MOA_TARGETS) * len(MOA_ACTIONS))
+    target, action = divmod(rest, len(MOA_ACTIONS))
+    return f"{MOA_TARGETS[target]} {MOA_ACTIONS[action]}" + (f" subtype {variant + 1}" if variant else "")
+
+
+def row_counts(scale: float) -> Dict[str, int]:
+    """Rows per entity table at a scale factor; never fewer than the fixture entities"""
+    minimum = {
+        "Drug": len(fixture_db.DRUGS), "Disorder": len(fixture_db.DISORDERS),
+        "MOA": len(fixture_db.MOAS), "Trials": len(fixture_db.TRIALS),
+    }
+    return {table: max(minimum[table], int(round(rows * scale))) for table, rows in BASE_ROWS.items()}
+
+
+def _insert(connection: Any, table: str, columns: Dict[str, Any]) -> None:
+    chunk = pa.table(columns)
+    connection.register("chunk", chunk)
+    connection.execute(f"INSERT INTO {table} SELECT * FROM chunk")
+    connection.unregister("chunk")
+
+
+def _embeddings(rng: np.random.Generator, rows: int) -> pa.Array:
+    vectors = rng.standard_normal((rows, DIMENSIONS), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return pa.FixedSizeListArray.from_arrays(pa.array(vectors.reshape(-1)), DIMENSIONS)
+
+
+def generate(connection: Any, scale: float, seed: int = 0) -> Dict[str, int]:
+    """
+    Fill an empty database with the DrugDB tables at a scale factor.
+
+    Args:
+        connection: A DuckDB connection to an empty database
+        scale (float): 1 is about the size of the real database
+        seed (int): Seed of the random generator; the same seed gives the same database
+
+    Returns:
+        Dict[str, int]: The row count of every table
+    """
+    rng = np.random.default_rng(seed)
+    counts = row_counts(scale)
+    fixture_db.create_schema(connection)
+
+    # The fixture entities come first, so the example questions keep their answers
+    drug_cuis = [cui for cui, _ in fixture_db.DRUGS] + [f"C{i:09d}" for i in range(len(fixture_db.DRUGS), counts["Drug"])]
+    drug_names = [name for _, name in fixture_db.DRUGS] + [drug_name(i) for i in range(len(fixture_db.DRUGS), counts["Drug"])]
+    _insert(connection, "Drug", {"drug_cui": drug_cuis, "name": drug_names})
+
+    disorder_cuis = [cui for cui, _, _ in fixture_db.DISORDERS]
+    disorder_names = [name for _, name, _ in fixture_db.DISORDERS]
+    definitions = [definition for _, _, definition in fixture_db.DISORDERS]
+    for i in range(len(fixture_db.DISORDERS), counts["Disorder"]):
+        name, definition = disorder_entry(i)
+        disorder_cuis.append(f"D{i:09d}")
+        disorder_names.append(name)
+        definitions.append(definition)
+    for start in range(0, counts["Disorder"], CHUNK_ROWS):
+        end = min(start + CHUNK_ROWS, counts["Disorder"])
+        _insert(connection, "Disorder", {
+            "disorder_cui": disorder_cuis[start:end],
+            "name": disorder_names[start:end],
+            "definition": definitions[start:end],
+            "definitionEmbedding": _embeddings(rng, end - start),
+        })
+
+    moa_ids = [moa_id for moa_id, _ in fixture_db.MOAS] + [f"M{i:09d}" for i in range(len(fixture_db.MOAS), counts["MOA"])]
+    moa_names = [name for _, name in fixture_db.MOAS] + [moa_name(i) for i in range(len(fixture_db.MOAS), counts["MOA"])]
+    _insert(connection, "MOA", {"moa_id": moa_ids, "name": moa_names})
+
+    # One to three mechanisms per drug, popular mechanisms are shared by many drugs
+    synthetic_drugs = np.arange(len(fixture_db.DRUGS), counts["Drug"])
+    moa_per_drug = rng.integers(1, 4, size=len(synthetic_drugs))
+    moa_targets = rng.choice(counts["MOA"], size=int(moa_per_drug.sum()), p=zipf_weights(counts["MOA"]))
+    drug_moa = list(fixture_db.DRUG_MOA) + list(zip(
+        (drug_cuis[i] for i in np.repeat(synthetic_drugs, moa_per_drug)), (moa_ids[i] for i in moa_targets)
+    ))
+    _insert(connection, "DrugMOA", {"drug_cui": [d for d, _ in drug_moa], "moa_id": [m for _, m in drug_moa]})
+
+    # Power-law degrees: most drugs treat one or two disorders, a few treat hundreds
+    max_degree = max(1, counts["Disorder"] // 20)
+    degrees = np.minimum(rng.zipf(2.0, size=len(synthetic_drugs)), max_degree)
+    targets = rng.choice(counts["Disorder"], size=int(degrees.sum()), p=zipf_weights(counts["Disorder"], 0.9))
+    connection.execute("CREATE TEMP TABLE edges (drug_cui VARCHAR, disorder_cui VARCHAR)")
+    connection.executemany("INSERT INTO edges VALUES (?, ?)", fixture_db.DRUG_DISORDER)
+    sources = np.repeat(synthetic_drugs, degrees)
+    for start in range(0, len(sources), CHUNK_ROWS * 4):
+        end = start + CHUNK_ROWS * 4
+        _insert(connection, "edges", {
+            "drug_cui": [drug_cuis[i] for i in sources[start:end]],
+            "disorder_cui": [disorder_cuis[i] for i in targets[start:end]],
+        })
+    connection.execute("INSERT INTO DrugDisorder SELECT DISTINCT drug_cui, disorder_cui FROM edges ORDER BY ALL")
+    connection.execute("DROP TABLE edges")
+
+    drug_weights = zipf_weights(counts["Drug"])
+    disorder_weights = zipf_weights(counts["Disorder"])
+    sponsor_weights = zipf_weights(len(SPONSORS), 0.8)
+    fixture_drugs = {cui: i for i, (cui, _) in enumerate(fixture_db.DRUGS)}
+    fixture_trials = [
+        (i, sponsor, title, disorder, phase, cuis)
+        for i, (sponsor, title, disorder, phase, cuis) in enumerate(fixture_db.TRIALS, start=1)
+    ]
+    for start in range(0, counts["Trials"], CHUNK_ROWS):
+        end = min(start + CHUNK_ROWS, counts["Trials"])
+        posting_ids, sponsors, titles, disorders, phases, cui_lists = [], [], [], [], [], []
+        for posting_id, sponsor, title, disorder, phase, cuis in fixture_trials[start:end]:
+            posting_ids.append(posting_id)
+            sponsors.append(sponsor)
+            titles.append(title)
+            disorders.append(disorder)
+            phases.append(phase)
+            cui_lists.append([fixture_drugs[cui] for cui in cuis])
+
+        rows = end - max(start, len(fixture_trials))
+        if rows > 0:
+            lengths = np.minimum(rng.zipf(2.5, size=rows), 6)
+            chosen = rng.choice(counts["Drug"], size=int(lengths.sum()), p=drug_weights)
+            offsets = np.concatenate([[0], np.cumsum(lengths)])
+            trial_disorders = rng.choice(counts["Disorder"], size=rows, p=disorder_weights)
+            trial_sponsors = rng.choice(len(SPONSORS), size=rows, p=sponsor_weights)
+            trial_designs = rng.integers(0, len(DESIGNS), size=rows)
+            trial_phases = rng.integers(0, len(PHASES), size=rows)
+            for row in range(rows):
+                drugs = chosen[offsets[row]:offsets[row + 1]].tolist()
+                disorder = disorder_names[trial_disorders[row]]
+                posting_ids.append(max(start, len(fixture_trials)) + row + 1)
+                sponsors.append(SPONSORS[trial_sponsors[row]])
+                titles.append(f"{DESIGNS[trial_designs[row]]} {' and '.join(drug_names[d] for d in drugs)} in {disorder.lower()}")
+                disorders.append(disorder)
+                phases.append(PHASES[trial_phases[row]])
+                cui_lists.append(drugs)
+
+        _insert(connection, "Trials", {
+            "PostingID": pa.array(posting_ids, pa.int32()),
+            "Sponsor": sponsors,
+            "StudyTitle": titles,
+            "Disorder": disorders,
+            "Phase": phases,
+            "LinkToSponsorStudyRegistry": [f"https://example.org/registry/{i}" for i in posting_ids],
+            "LinkToClinicalTrials": [f"https://clinicaltrials.gov/study/SY{i:09d}" for i in posting_ids],
+            "drug_cui": [[drug_cuis[d] for d in drugs] for drugs in cui_lists],
+            "drug_names": [[drug_names[d] for d in drugs] for drugs in cui_lists],
+        })
+
+    return {
+        table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ("Drug", "Disorder", "MOA", "DrugMOA", "DrugDisorder", "Trials")
+    }
+
+
+def build_indexes(connection: Any) -> Dict[str, float]:
+    """
+    Build the full-text and HNSW indexes and the drug_graph property graph.
+
+    Args:
+        connection: A read-write DuckDB connection to a generated database
+
+    Returns:
+        Dict[str, float]: Seconds spent on each step
+    """
+    import my_db_specifics
+    import utils.fts_index as fts_index
+    import utils.vector_index as vector_index
+
+    timings = {}
+    start = time.perf_counter()
+    # The same managed index the app builds, so the app finds it current and does not rebuild it
+    connection.execute("LOAD fts;")
+    fts_index.check_index(connection)
+    timings["fts_index"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    connection.execute("LOAD vss;")
+    vector_index.ensure_index(connection)
+    timings["hnsw_index"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    connection.execute("LOAD duckpgq;")
+    connection.execute(my_db_specifics.property_graph_definition)
+    connection.execute(
+        "FROM GRAPH_TABLE (drug_graph MATCH (i:Drug)-[m:MAY_TREAT]->(c:Disorder) COLUMNS (i.name AS drug_name)) LIMIT 1;"
+    ).fetchall()
+    timings["drug_graph"] = time.perf_counter() - start
+
+    connection.execute("CHECKPOINT;")
+    return timings
+
+
+def example_queries() -> List[tuple]:
+    """(tool, question, query) for every example of my_db_specifics"""
+    import my_db_specifics
+
+    return [
+        (tool, example["input"], example["query"])
+        for tool, examples in (
+            ("sql", my_db_specifics.sql_examples),
+            ("graph", my_db_specifics.graph_examples),
+            ("fulltext", my_db_specifics.full_text_search_examples),
+            ("vector", my_db_specifics.vector_search_examples),
+        )
+        for example in examples
+    ]
+
+
+def time_queries(path: str, repetitions: int, seed: int = 0) -> None:
+    """Run every example query of my_db_specifics on a connection like the app's and print the median time"""
+    import my_db_specifics
+    import utils.vector_index as vector_index
+    import utils.vector_params as vector_params
+    from utils.db_pool import ConnectionPool
+
+    rng = np.random.default_rng(seed)
+    # Read-only like a serving process; the pool skips drug_graph, which build_indexes already stored
+    pool = ConnectionPool(
+        path, size=1, init_commands=my_db_specifics.initialization_commands + vector_index.session_commands(), read_only=True
+    )
+    connection = pool.new_connection()
+
+    print(f"{'tool':<9} {'median ms':>10} {'rows':>7}  question")
+    for tool, question, query in example_queries():
+        # The vector placeholders get random unit vectors, like the stored embeddings
+        parameters = {}
+        for name in vector_params.placeholder_names(query):
+            vector = rng.standard_normal(DIMENSIONS)
+            parameters[name] = (vector / np.linalg.norm(vector)).tolist()
+
+        timings, rows = [], 0
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            rows = len(connection.execute(query, parameters).fetchall())
+            timings.append(1000 * (time.perf_counter() - start))
+        print(f"{tool:<9} {sorted(timings)[len(timings) // 2]:10.2f} {rows:7d}  {question[:70]}")
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="the DuckDB file to write (replaced if it exists)")
+    parser.add_argument("--scale", type=float, default=1.0, help="size relative to the real database, e.g. 10 or 1000")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator")
+    parser.add_argument("--no-indexes", action="store_true", help="skip the FTS and HNSW indexes and drug_graph")
+    parser.add_argument("--time-queries", action="store_true", help="time every example query of my_db_specifics afterwards")
+    parser.add_argument("--repetitions", type=int, default=5, help="runs per query with --time-queries")
+    args = parser.parse_args()
+
+    import duckdb
+
+    for file in (args.path, args.path + ".wal"):
+        if os.path.exists(file):
+            os.remove(file)
+
+    with duckdb.connect(args.path) as connection:
+        start = time.perf_counter()
+        counts = generate(connection, args.scale, args.seed)
+        print(f"generated scale {args.scale} in {time.perf_counter() - start:.1f} s")
+        for table, rows in counts.items():
+            print(f"   {table:<13} {rows:>12,} rows")
+        if not args.no_indexes:
+            for step, seconds in build_indexes(connection).items():
+                print(f"   {step:<13} {seconds:10.1f} s")
+        connection.execute("CHECKPOINT;")
+    print(f"{args.path}: {os.path.getsize(args.path) / 2 ** 20:.1f} MiB")
+
+    if args.time_queries:
+        time_queries(args.path, args.repetitions, args.seed)
+
+
+if __name__ == "__main__":
+    main()
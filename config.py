@@ -8,7 +8,11 @@ def init_session_state():
         "current_query": None,
         "current_chain_input": None,
         "tool_name": None,
+        "extra_queries": [],
         "last_error": None,
+        "preflight_error": None,
+        "request_id": None,
+        "confirmation_started": None,
         "retry_count": 0
     }
     
@@ -1,4 +1,5 @@
-import utils.embedding as embedding
+import utils.vector_params as vector_params
+import utils.vector_index as vector_index
 
 property_graph_definition = """CREATE PROPERTY GRAPH drug_graph
   VERTEX TABLES (
@@ -220,14 +221,24 @@ full_text_search_query_template = """SELECT PostingID as trial_id, StudyTitle, s
 
 vector_search_query_template = """SELECT name, definition
         FROM Disorder
-        ORDER BY array_distance(definitionEmbedding, {question_embedding}::FLOAT[1536])
+        ORDER BY {distance_function}(definitionEmbedding, {question_embedding}::FLOAT[1536])
         LIMIT {limit};"""
 
 
 
-vector_search_examples = [
+# Used by the numpy vector backend, which ranks the disorders itself and passes their cuis nearest first
+vector_search_by_cui_query_template = """SELECT name, definition
+        FROM Disorder
+        WHERE list_contains({disorder_cuis}, disorder_cui)
+        ORDER BY list_position({disorder_cuis}, disorder_cui);"""
+
+
+
+def _vector_search_examples():
+    """The vector search examples; their queries depend on hnsw_metric, so they are built on first access"""
+    return [
         {   "input": "Show 3 joint-related disorder?", 
-            "query": vector_search_query_template.format(question_embedding=embedding.get_embedding("joint-related disorder"), limit=3)
+            "query": vector_search_query_template.format(distance_function=vector_index.distance_function(), question_embedding=vector_params.embedding_placeholder("joint-related disorder"), limit=3)
         },
         {
             "input": "Show 3 trials that tested drugs against the top 10 joint-related disorders",
@@ -238,7 +249,7 @@ vector_search_examples = [
                         (
                         SELECT disorder_cui, name
                             FROM Disorder
-                            ORDER BY array_distance(definitionEmbedding, {question_embedding}::FLOAT[1536])
+                            ORDER BY {distance_function}(definitionEmbedding, {question_embedding}::FLOAT[1536])
                             LIMIT 10
                         ) target_disease,
 
@@ -249,6 +260,15 @@ vector_search_examples = [
                             )  drug_for_disorder
 
                         WHERE target_disease.disorder_cui = drug_for_disorder.disorder_cui 
-                        AND list_contains(Trials.drug_cui, drug_for_disorder.drug_cui) LIMIT {limit}""".format(question_embedding=embedding.get_embedding("joint-related disorder"), limit = 3),
+                        AND list_contains(Trials.drug_cui, drug_for_disorder.drug_cui) LIMIT {limit}""".format(distance_function=vector_index.distance_function(), question_embedding=vector_params.embedding_placeholder("joint-related disorder"), limit = 3),
         },
-    ]
\ No newline at end of file
+    ]
+
+
+def __getattr__(name):
+    # Importing this module must not read config.yaml, which the distance function of the vector examples needs
+    if name == "vector_search_examples":
+        examples = _vector_search_examples()
+        globals()[name] = examples
+        return examples
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,16 @@
+# File: tests/conftest.py
+
+import pytest
+import yaml
+
+import utils.app_context as app_context
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    """Give the process a fresh AppContext that reads a config.yaml written to tmp_path"""
+    param = {"openai_api": "offline", "drugdb_path": str(tmp_path / "drug.db"), "vector_embedding_model": "test"}
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.safe_dump(param))
+    monkeypatch.setattr(app_context, "_context", app_context.AppContext(str(path)))
+    return param
@@ -0,0 +1,121 @@
+# File: tests/test_async_pipeline.py
+
+import asyncio
+import time
+
+import pytest
+
+import utils.async_pipeline as async_pipeline
+from benchmarks.fakes import ReplayChatModel, Scenario, scenario_table
+from utils.app_context import get_context
+
+LATENCY_S = 0.3
+QUESTION = "double blind & Alzheimer's disease"
+SCENARIO = Scenario(QUESTION, "Fulltext_QueryTool", {"my_question": QUESTION, "original_query": QUESTION, "limit": 20})
+
+
+class SlowCache:
+    """A semantic cache whose lookup takes LATENCY_S, like embedding the question"""
+
+    def __init__(self, hit=None):
+        self.hit = hit
+        self.calls = []
+
+    def lookup(self, question):
+        start = time.perf_counter()
+        time.sleep(LATENCY_S)
+        self.calls.append((start, time.perf_counter()))
+        return self.hit
+
+
+class RecordingChatModel(ReplayChatModel):
+    """Records when each routing call started, finished or was cancelled"""
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        EVENTS.append(("llm start", time.perf_counter()))
+        try:
+            result = await super()._agenerate(messages, stop, run_manager, tools, **kwargs)
+        except asyncio.CancelledError:
+            EVENTS.append(("llm cancelled", time.perf_counter()))
+            raise
+        EVENTS.append(("llm end", time.perf_counter()))
+        return result
+
+
+EVENTS = []
+
+
+@pytest.fixture
+def pipeline(config, monkeypatch):
+    EVENTS.clear()
+    context = get_context()
+    context.param["local_router"] = False
+    context.__dict__["llm"] = RecordingChatModel(scenarios=scenario_table([SCENARIO]), latency_s=LATENCY_S)
+    # The pre-flight needs the database; these tests only cover what happens before it
+    monkeypatch.setattr(async_pipeline, "preflight", lambda tool_calls, started: tool_calls)
+    return context
+
+
+def use_cache(context, cache):
+    context._resources["semantic_cache"] = cache
+    return cache
+
+
+def test_lookup_and_routing_overlap(pipeline):
+    cache = use_cache(pipeline, SlowCache())
+
+    start = time.perf_counter()
+    tool_calls = asyncio.run(async_pipeline.agenerate(QUESTION))
+    elapsed = time.perf_counter() - start
+
+    assert [tool_call["name"] for tool_call in tool_calls] == ["Fulltext_QueryTool"]
+    assert "match_bm25" in tool_calls[0]["output"]
+    (lookup_start, lookup_end), = cache.calls
+    llm_start = dict(EVENTS)["llm start"]
+    # The routing call started before the lookup finished, so both ran at once
+    assert lookup_start < llm_start < lookup_end
+    assert elapsed < 1.8 * LATENCY_S
+
+
+def test_hit_cancels_routing(pipeline):
+    query = "SELECT name FROM Drug\nLIMIT 20;"
+    use_cache(pipeline, SlowCache(hit={"question": "q", "tool_name": "SQL_QueryTool", "query": query, "similarity": 0.99}))
+    pipeline.__dict__["llm"].latency_s = 10 * LATENCY_S
+
+    start = time.perf_counter()
+    tool_calls = asyncio.run(async_pipeline.agenerate(QUESTION))
+    elapsed = time.perf_counter() - start
+
+    assert tool_calls[0]["id"] == "semantic_cache"
+    assert tool_calls[0]["output"] == query
+    assert [name for name, _ in EVENTS] == ["llm start", "llm cancelled"]
+    assert elapsed < 3 * LATENCY_S
+
+
+def test_llm_tools_generate_with_ainvoke(pipeline, monkeypatch):
+    calls = []
+
+    async def fake_chain_ainvoke(inputs):
+        calls.append(inputs["question"])
+        await asyncio.sleep(LATENCY_S)
+        return "SELECT name FROM Drug"
+
+    class Chain:
+        ainvoke = staticmethod(fake_chain_ainvoke)
+
+        def invoke(self, inputs):
+            raise AssertionError("the asyncio pipeline must not call the blocking chain")
+
+    monkeypatch.setattr("utils.my_langchain_tools.sql_chain", lambda: Chain())
+    tool_calls = [
+        {"name": "SQL_QueryTool", "args": {"my_question": f"question {i}", "limit": 5}, "id": str(i)} for i in range(3)
+    ]
+
+    start = time.perf_counter()
+    completed = asyncio.run(async_pipeline.acall_tools(tool_calls))
+    elapsed = time.perf_counter() - start
+
+    assert [tool_call["output"] for tool_call in completed] == ["SELECT name FROM Drug\nLIMIT 5;"] * 3
+    assert sorted(calls) == ["question 0", "question 1", "question 2"]
+    # The three generation calls waited on the event loop at the same time
+    assert elapsed < 2 * LATENCY_S
@@ -0,0 +1,113 @@
+# File: tests/test_query_validator.py
+
+import duckdb
+import pytest
+
+from utils.query_validator import normalize_query
+
+
+@pytest.fixture
+def connection():
+    with duckdb.connect() as connection:
+        connection.execute("CREATE TABLE Drug (drug_cui VARCHAR, name VARCHAR);")
+        yield connection
+
+
+def test_keeps_limit_offset():
+    query, fixes = normalize_query("SELECT * FROM Drug LIMIT 10 OFFSET 5;", 20)
+    assert query == "SELECT * FROM Drug LIMIT 10 OFFSET 5;"
+    assert fixes == []
+
+
+def test_keeps_offset_limit():
+    query, _ = normalize_query("SELECT * FROM Drug OFFSET 5 LIMIT 10;", 20)
+    assert query == "SELECT * FROM Drug OFFSET 5 LIMIT 10;"
+
+
+def test_adds_limit_before_offset():
+    query, fixes = normalize_query("SELECT * FROM Drug OFFSET 5;", 20)
+    assert query == "SELECT * FROM Drug\nLIMIT 20 OFFSET 5;"
+    assert fixes == ["added LIMIT 20"]
+
+
+def test_replaces_limit_zero_before_offset():
+    query, fixes = normalize_query("SELECT * FROM Drug LIMIT 0 OFFSET 2;", 20)
+    assert query == "SELECT * FROM Drug\nLIMIT 20 OFFSET 2;"
+    assert fixes == ["removed LIMIT 0", "added LIMIT 20"]
+
+
+def test_adds_missing_limit():
+    query, _ = normalize_query("SELECT * FROM Drug", 20)
+    assert query == "SELECT * FROM Drug\nLIMIT 20;"
+
+
+def test_normalize_is_idempotent():
+    for raw in ("SELECT * FROM Drug LIMIT 10 OFFSET 5;", "SELECT * FROM Drug OFFSET 5", "SELECT * FROM Drug"):
+        once, _ = normalize_query(raw, 20)
+        assert normalize_query(once, 20) == (once, [])
+
+
+def test_trailing_comment_does_not_swallow_limit_single_line():
+    query, fixes = normalize_query("FROM GRAPH_TABLE (drug_graph MATCH (i:Drug) COLUMNS (i.name)) -- all drugs", 20, single_line=True)
+    assert query == "FROM GRAPH_TABLE (drug_graph MATCH (i:Drug) COLUMNS (i.name)) LIMIT 20;"
+    assert "removed line comments" in fixes
+
+
+def test_comment_between_lines_single_line():
+    query, _ = normalize_query("SELECT name -- the drug name\nFROM Drug", 20, single_line=True)
+    assert query == "SELECT name FROM Drug LIMIT 20;"
+
+
+def test_trailing_comment_multi_line():
+    query, _ = normalize_query("SELECT * FROM Drug -- every drug", 20)
+    assert query == "SELECT * FROM Drug\nLIMIT 20;"
+
+
+def test_comment_marker_inside_literal_is_kept():
+    query, fixes = normalize_query("SELECT * FROM Drug WHERE name = 'a--b' LIMIT 5;", 20)
+    assert query == "SELECT * FROM Drug WHERE name = 'a--b' LIMIT 5;"
+    assert fixes == []
+
+
+def test_escapes_apostrophe_in_literal():
+    query, fixes = normalize_query("SELECT * FROM Drug WHERE name = 'Alzheimer's disease' LIMIT 5;", 20)
+    assert query == "SELECT * FROM Drug WHERE name = 'Alzheimer''s disease' LIMIT 5;"
+    assert fixes == ["escaped apostrophes inside string literals"]
+
+
+def test_escapes_apostrophe_after_single_letter():
+    query, _ = normalize_query("SELECT * FROM Drug WHERE name = 'O'Brien' LIMIT 5;", 20)
+    assert query == "SELECT * FROM Drug WHERE name = 'O''Brien' LIMIT 5;"
+
+
+def test_keeps_escaped_apostrophe():
+    query, fixes = normalize_query("SELECT * FROM Drug WHERE name = 'Alzheimer''s disease' LIMIT 5;", 20)
+    assert query == "SELECT * FROM Drug WHERE name = 'Alzheimer''s disease' LIMIT 5;"
+    assert fixes == []
+
+
+def test_apostrophe_outside_literal_is_left_alone():
+    query, _ = normalize_query("SELECT name AS drug's FROM Drug LIMIT 5;", 20)
+    assert "drug's" in query
+
+
+def test_apostrophe_in_comment_is_removed_with_it():
+    query, _ = normalize_query("SELECT * FROM Drug -- the drug's rows\nWHERE name = 'O'Brien'", 20)
+    assert query == "SELECT * FROM Drug\nWHERE name = 'O''Brien'\nLIMIT 20;"
+
+
+def test_closes_parentheses_before_limit_offset():
+    query, _ = normalize_query("SELECT * FROM (SELECT * FROM Drug LIMIT 10 OFFSET 5", 20)
+    assert query == "SELECT * FROM (SELECT * FROM Drug) LIMIT 10 OFFSET 5;"
+
+
+@pytest.mark.parametrize("raw, single_line", [
+    ("SELECT * FROM Drug LIMIT 10 OFFSET 5;", False),
+    ("SELECT * FROM Drug LIMIT 0 OFFSET 2;", False),
+    ("SELECT * FROM Drug OFFSET 5", False),
+    ("SELECT * FROM Drug WHERE name = 'O'Brien' -- by name", False),
+    ("SELECT name -- the name\nFROM Drug WHERE name = 'Alzheimer's disease'", True),
+])
+def test_normalized_queries_compile(connection, raw, single_line):
+    query, _ = normalize_query(raw, 20, single_line=single_line)
+    connection.execute("EXPLAIN " + query).fetchall()
@@ -0,0 +1,88 @@
+# File: tests/test_result_cache.py
+
+import pyarrow as pa
+import pytest
+
+from utils.query_result import QueryResult
+from utils.result_cache import ResultCache, is_read_only, normalize_query
+
+
+def result(query, rows=3):
+    return QueryResult(query, pa.table({"name": [f"drug {i}" for i in range(rows)]}))
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / "drug.db"
+    path.write_bytes(b"v1")
+    return path
+
+
+def test_normalize_collapses_whitespace_and_case():
+    assert normalize_query("SELECT  name\n  FROM Drug ;") == normalize_query("select name from drug")
+
+
+def test_normalize_keeps_string_literals():
+    assert normalize_query("SELECT * FROM Drug WHERE name = 'Aspirin'") == "select * from drug where name ='Aspirin'"
+    assert normalize_query("SELECT * FROM Drug WHERE name = 'Aspirin'") != normalize_query(
+        "SELECT * FROM Drug WHERE name = 'aspirin'"
+    )
+
+
+def test_hit_for_reformatted_query(database):
+    cache = ResultCache(str(database), max_bytes=1024 * 1024, ttl=60)
+    cache.put("SELECT name FROM Drug", result("SELECT name FROM Drug"))
+    assert cache.get("select name\nfrom drug;") is not None
+    assert cache.stats["hits"] == 1
+
+
+def test_database_change_invalidates(database):
+    cache = ResultCache(str(database), max_bytes=1024 * 1024, ttl=60)
+    cache.put("SELECT name FROM Drug", result("SELECT name FROM Drug"))
+    database.write_bytes(b"version 2")
+    assert cache.get("SELECT name FROM Drug") is None
+    assert cache.stats["invalidations"] == 1
+    assert cache.info()["entries"] == 0
+
+
+def test_expired_entry_is_dropped(database):
+    cache = ResultCache(str(database), max_bytes=1024 * 1024, ttl=0)
+    cache.put("SELECT name FROM Drug", result("SELECT name FROM Drug"))
+    assert cache.get("SELECT name FROM Drug") is None
+    assert cache.stats["expired"] == 1
+
+
+def test_evicts_least_recently_used(database):
+    first, second = result("q1"), result("q2")
+    cache = ResultCache(str(database), max_bytes=first.nbytes + second.nbytes, ttl=60)
+    cache.put("SELECT 1", first)
+    cache.put("SELECT 2", second)
+    cache.get("SELECT 1")
+    cache.put("SELECT 3", result("q3"))
+    assert cache.get("SELECT 2") is None
+    assert cache.get("SELECT 1") is not None
+    assert cache.info()["bytes"] <= cache.max_bytes
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM Drug",
+    "-- drugs\nWITH d AS (SELECT * FROM Drug) SELECT * FROM d",
+    "FROM GRAPH_TABLE (drug_graph MATCH (d:Drug) COLUMNS (d.name))",
+    "SELECT * FROM Drug WHERE name = 'insert'",
+])
+def test_read_only_queries(query):
+    assert is_read_only(query)
+
+
+@pytest.mark.parametrize("query", [
+    "INSERT INTO Drug VALUES ('C1', 'Aspirin')",
+    "WITH d AS (SELECT 1) INSERT INTO Drug SELECT * FROM d",
+    "SELECT 1; DROP TABLE Drug",
+    "CREATE TABLE copy AS SELECT * FROM Drug",
+    "SET threads = 1",
+])
+def test_write_statements_are_not_cached(database, query):
+    cache = ResultCache(str(database), max_bytes=1024 * 1024, ttl=60)
+    assert not is_read_only(query)
+    cache.put(query, result(query))
+    assert cache.info()["entries"] == 0
@@ -0,0 +1,48 @@
+# File: tests/test_result_compactor.py
+
+import pyarrow as pa
+
+from utils.query_result import QueryResult
+from utils.result_compactor import MIN_SAMPLE_ROWS, compact_result, count_tokens
+
+
+def result(rows, columns=1):
+    return QueryResult(
+        "SELECT * FROM Drug",
+        pa.table({f"name_{c}": [f"drug {i}" for i in range(rows)] for c in range(columns)}),
+    )
+
+
+def test_small_result_is_sent_whole():
+    text = compact_result(result(5), budget=1000)
+    assert text == result(5).to_llm_text()
+    assert "Note:" not in text
+
+
+def test_large_result_is_sampled_head_and_tail():
+    text = compact_result(result(2000), budget=400)
+    lines = text.split("\n\nNote:")[0].split("\n")
+    rows = lines[1:]
+    assert len(rows) >= MIN_SAMPLE_ROWS
+    assert rows[0] == "drug 0"
+    assert rows[-1] == "drug 1999"
+    assert "drug 1000" not in rows
+    assert f"the query returned 2000 rows. Only the first {len(rows) - len(rows) // 2} and the last {len(rows) // 2} rows" in text
+    assert count_tokens(text) <= 400
+
+
+def test_aggregates_when_no_useful_sample_fits():
+    table = pa.table({"phase": ["Phase 1", "Phase 2", "Phase 2"] * 500, "enrollment": list(range(1500))})
+    text = compact_result(QueryResult("SELECT * FROM Trials", table), budget=80)
+    assert "too many to show" in text
+    assert text.startswith("phase: 1500 non-null; 2 distinct")
+    assert "most frequent: Phase 2 (1000)" in text
+    assert "enrollment: 1500 non-null; 1500 distinct; min 0, max 1499" in text
+    assert count_tokens(text) <= 80
+
+
+def test_wide_aggregates_drop_trailing_columns():
+    text = compact_result(result(3000, columns=40), budget=120)
+    assert "more columns left out" in text
+    assert text.startswith("name_0:")
+    assert count_tokens(text) <= 120
@@ -0,0 +1,58 @@
+# File: tests/test_router.py
+
+import pytest
+
+from utils.router import DEFAULT_LIMIT, LocalRouter, is_keyword_search, question_limit
+
+
+@pytest.fixture
+def router(config):
+    return LocalRouter(use_classifier=False)
+
+
+@pytest.mark.parametrize("question", [
+    "double blind & Alzheimer's disease",
+    "insulin | !metformin",
+    "placebo & (insulin | metformin)",
+    'Search 3 trials with these words in their titles "double blind & Valaciclovir".',
+])
+def test_keyword_input_is_full_text(question):
+    assert is_keyword_search(question)
+
+
+@pytest.mark.parametrize("question", [
+    "Which drugs treat Alzheimer's & Parkinson's disease?",
+    "Find trials for insulin | metformin in children",
+    "Trials for insulin | metformin in children",
+    "Which drugs are used for diabetes?",
+])
+def test_sentences_are_not_full_text(question):
+    assert not is_keyword_search(question)
+
+
+def test_sentence_with_operator_goes_to_llm_router(router):
+    assert router.route("Which drugs treat Alzheimer's & Parkinson's disease?") is None
+    assert router.info()["fast_path"] == 0
+
+
+def test_quoted_keywords_become_the_search_terms(router):
+    tool_name, args = router.route('Search 3 trials with these words in their titles "double blind & Valaciclovir".')
+    assert tool_name == "Fulltext_QueryTool"
+    assert args["original_query"] == "double blind & Valaciclovir"
+    assert args["limit"] == 3
+
+
+def test_vector_and_graph_hints(router):
+    assert router.route("Find the definition of joint-related disorder")[0] == "Vector_QueryTool"
+    assert router.route("Which drugs treat asthma? Use the graph query.")[0] == "Graph_QueryTool"
+
+
+@pytest.mark.parametrize("question, limit", [
+    ("Show me 5 drugs for asthma", 5),
+    ("List the top 12 trials", 12),
+    ("Which drugs treat asthma?", DEFAULT_LIMIT),
+    ("Which drugs can be used to treat Alzheimer's Disease? Only give me all results without limit.", 0),
+    ("Give me all results for asthma | copd", 0),
+])
+def test_question_limit(question, limit):
+    assert question_limit(question) == limit
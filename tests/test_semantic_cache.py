@@ -0,0 +1,74 @@
+# File: tests/test_semantic_cache.py
+
+import sqlite3
+
+import numpy as np
+import pytest
+
+import utils.semantic_cache as semantic_cache
+from utils.semantic_cache import SemanticCache
+
+QUERY = "SELECT name FROM Drug WHERE name ILIKE '%statin%'\nLIMIT 20;"
+
+# Questions at a known cosine similarity to "Which drugs are statins?"
+VECTORS = {
+    "Which drugs are statins?": [1.0, 0.0],
+    "Which drugs are statins": [0.99, np.sqrt(1 - 0.99 ** 2)],
+    "List 5 drugs that are statins": [0.97, np.sqrt(1 - 0.97 ** 2)],
+    "Which trials study statins?": [0.9, np.sqrt(1 - 0.9 ** 2)],
+}
+
+
+@pytest.fixture(autouse=True)
+def embeddings(monkeypatch):
+    monkeypatch.setattr(semantic_cache.embedding, "get_embedding", lambda text: VECTORS[text])
+    monkeypatch.setattr(semantic_cache.embedding, "get_embeddings", lambda texts: [VECTORS[t] for t in texts])
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SemanticCache(str(tmp_path / "semantic.sqlite"), threshold=0.95)
+    cache.add("Which drugs are statins?", "SQL_QueryTool", QUERY)
+    return cache
+
+
+def test_hit_above_threshold(cache):
+    hit = cache.lookup("Which drugs are statins")
+    assert hit["query"] == QUERY
+    assert hit["tool_name"] == "SQL_QueryTool"
+    assert hit["similarity"] == pytest.approx(0.99, abs=1e-5)
+    assert cache.info()["llm_calls_saved"] == 2
+
+
+def test_miss_below_threshold(cache):
+    assert cache.lookup("Which trials study statins?") is None
+    assert cache.info()["hits"] == 0
+    assert cache.info()["lookups"] == 1
+
+
+def test_threshold_is_configurable(tmp_path):
+    cache = SemanticCache(str(tmp_path / "semantic.sqlite"), threshold=0.85)
+    cache.add("Which drugs are statins?", "SQL_QueryTool", QUERY)
+    assert cache.lookup("Which trials study statins?") is not None
+
+
+def test_template_tools_are_not_stored(cache):
+    cache.add("Which trials study statins?", "Fulltext_QueryTool", "SELECT * FROM Trials")
+    cache.add("Which trials study statins?", "Vector_QueryTool", "SELECT * FROM Disorder")
+    assert cache.info()["entries"] == 1
+
+
+def test_reload_skips_template_tools(cache, tmp_path):
+    with sqlite3.connect(cache.path) as db:
+        db.execute("INSERT INTO questions VALUES (?, ?, ?)", ("Which trials study statins?", "Vector_QueryTool", "q"))
+    reloaded = SemanticCache(cache.path, threshold=0.85)
+    assert reloaded.lookup("Which trials study statins?")["tool_name"] == "SQL_QueryTool"
+    assert reloaded.info()["entries"] == 1
+
+
+def test_hit_gets_limit_of_new_question(cache):
+    from utils.query_generator import cached_tool_call
+
+    tool_call = cached_tool_call("List 5 drugs that are statins", cache.lookup("List 5 drugs that are statins"))
+    assert tool_call["output"] == "SELECT name FROM Drug WHERE name ILIKE '%statin%'\nLIMIT 5;"
+    assert tool_call["args"]["limit"] == 5
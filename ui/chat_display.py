@@ -2,7 +2,8 @@
 
 import streamlit as st
 from langchain.schema import HumanMessage, AIMessage
-from ui.icons import get_tool_icon_and_description
+from ui.icons import TOOL_DESCRIPTIONS, get_tool_icon_and_description
+from utils.vector_params import placeholder_names, placeholder_text
 
 def display_user_message(message: HumanMessage) -> None:
     """
@@ -26,11 +27,6 @@ def display_assistant_message(message: AIMessage) -> None:
     Args:
         message (AIMessage): The assistant's message to display
     """
-    # Get tool information if it exists
-    tool_name = (message.tool_calls[0]["name"] 
-                if hasattr(message, 'tool_calls') and message.tool_calls 
-                else "default")
-    
     # Get the icon and description for the tool used
     icon, description = get_tool_icon_and_description(message)
     
@@ -41,31 +37,58 @@ def display_assistant_message(message: AIMessage) -> None:
         
         # If there are tool calls, show the query details in an expander
         if hasattr(message, 'tool_calls') and message.tool_calls:
+            # A compound question keeps one result per tool call
+            query_results = (message.additional_kwargs.get("query_results")
+                             or [message.additional_kwargs.get("query_result")])
             with st.expander("See query details"):
-                st.markdown(f"**Tool Used:** {tool_name.replace('_', ' ')}")
-                if description:
-                    st.markdown(f"**Description:** {description}")
-                
-                # Display the query if it exists
-                if 'args' in message.tool_calls[0]:
-                    args = message.tool_calls[0]['args']
-                    query = None
-                    
-                    # Extract query from args
-                    if isinstance(args, dict):
-                        query = (args.get('executed_query') or 
-                               args.get('query') or 
-                               args.get('my_question'))
-                    elif isinstance(args, str):
-                        query = args
-                    
-                    if query:
-                        # Special handling for Vector queries
-                        if tool_name == "Vector_QueryTool":
-                            display_vector_query(query)
-                        else:
-                            st.markdown("**Query Used:**")
-                            st.code(query, language='sql')
+                for i, tool_call in enumerate(message.tool_calls):
+                    if i:
+                        st.markdown("---")
+                    display_tool_call(tool_call, query_results[i] if i < len(query_results) else None,
+                                      description if i == 0 else TOOL_DESCRIPTIONS.get(tool_call["name"]))
+
+def display_tool_call(tool_call: dict, query_result, description: str | None) -> None:
+    """
+    Display the tool, the query and the fetched rows of one tool call.
+    
+    Args:
+        tool_call (dict): The tool call stored on the assistant message
+        query_result: The summary of the executed query's result (QueryResult.summary), or None
+        description (str | None): The description of the tool
+    """
+    tool_name = tool_call["name"]
+    st.markdown(f"**Tool Used:** {tool_name.replace('_', ' ')}")
+    if description:
+        st.markdown(f"**Description:** {description}")
+    
+    # Display the query if it exists
+    if 'args' in tool_call:
+        args = tool_call['args']
+        query = None
+        
+        # Extract query from args
+        if isinstance(args, dict):
+            query = (args.get('executed_query') or 
+                   args.get('query') or 
+                   args.get('my_question'))
+        elif isinstance(args, str):
+            query = args
+        
+        if query:
+            # Special handling for Vector queries
+            if tool_name == "Vector_QueryTool":
+                display_vector_query(query)
+            else:
+                st.markdown("**Query Used:**")
+                st.code(query, language='sql')
+    
+    # Show the kept rows; the Arrow table is passed through without a copy
+    if query_result is not None:
+        st.markdown(f"**Query Result:** {query_result['row_count']} rows, {query_result['nbytes']:,} bytes")
+        preview = query_result["preview"]
+        if preview.num_rows < query_result["row_count"]:
+            st.caption(f"First {preview.num_rows} rows")
+        st.dataframe(preview, use_container_width=True)
 
 def display_vector_query(query: str) -> None:
     """
@@ -74,6 +97,15 @@ def display_vector_query(query: str) -> None:
     Args:
         query (str): The vector query to display
     """
+    names = placeholder_names(query)
+    if names:
+        # The embedding is bound as a parameter, so the query is already compact
+        st.markdown("**Query Used:**")
+        st.code(query, language='sql')
+        for name in names:
+            st.markdown(f"`${name}` is the embedding of: *{placeholder_text(name) or 'unknown text'}*")
+        return
+
     st.markdown("**⚠️ Truncated Query:**")
     st.markdown("""
     > **Note:** The query below is a simplified version where the embedding vector has been 
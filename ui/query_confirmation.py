@@ -1,18 +1,20 @@
 import streamlit as st
 from ui.icons import TOOL_DESCRIPTIONS, TOOL_ICONS, svg_to_base64
+from utils.vector_params import placeholder_names, placeholder_text
 
 
-def handle_confirmation_buttons(edited_query: str) -> str | None:
+def handle_confirmation_buttons(edited_query: str | list[str]) -> str | list[str] | None:
     """
     Handle the confirmation and rejection buttons for query editing.
     
     Args:
-        edited_query (str): The potentially edited query from the text area
+        edited_query (str | list[str]): The potentially edited query from the text area,
+            or all queries when the question produced several
         
     Returns:
-        str | None: Returns either:
+        str | list[str] | None: Returns either:
             - "waiting" if no button was pressed
-            - the edited query if Confirm was pressed
+            - the edited query (or queries) if Confirm was pressed
             - None if Reject was pressed
     """
     col1, col2 = st.columns(2)
@@ -32,14 +34,15 @@ def handle_confirmation_buttons(edited_query: str) -> str | None:
     return "waiting"
 
 # The complete create_query_confirmation_ui function would look like this:
-def create_query_confirmation_ui() -> str | None:
+def create_query_confirmation_ui() -> str | list[str] | None:
     """
     Create the query confirmation UI and return the confirmed query.
     
     Returns:
-        str | None: Returns either:
+        str | list[str] | None: Returns either:
             - "waiting" if no button was pressed
-            - the confirmed/edited query if Confirm was pressed
+            - the confirmed/edited query if Confirm was pressed, a list of
+              them if the question produced several queries
             - None if Reject was pressed
     """
     # Get the SVG icon for the current tool
@@ -61,6 +64,9 @@ def create_query_confirmation_ui() -> str | None:
     if st.session_state.last_error:
         st.error(f"Error in previous query: {st.session_state.last_error}")
         st.markdown("Please fix the query and try again, or reject to move to the next question.")
+    elif st.session_state.get("preflight_error"):
+        st.warning(f"This query does not compile yet: {st.session_state.preflight_error}")
+        st.markdown("Please fix the query before confirming, or reject to move to the next question.")
     
     edited_query = st.text_area(
         "Review and edit the query if needed, press Confirm to proceed:", 
@@ -68,4 +74,38 @@ def create_query_confirmation_ui() -> str | None:
         height=150
     )
     
-    return handle_confirmation_buttons(edited_query)
\ No newline at end of file
+    show_placeholder_captions(edited_query)
+
+    extra_queries = [
+        create_extra_query_editor(i, extra)
+        for i, extra in enumerate(st.session_state.get("extra_queries") or [], start=2)
+    ]
+    if extra_queries:
+        return handle_confirmation_buttons([edited_query] + extra_queries)
+    return handle_confirmation_buttons(edited_query)
+
+
+def show_placeholder_captions(query: str) -> None:
+    """Explain the embedding placeholders; their vectors are bound when the query runs"""
+    for name in placeholder_names(query):
+        st.caption(f"${name} = embedding of \"{placeholder_text(name) or 'unknown text'}\"")
+
+
+def create_extra_query_editor(number: int, extra: dict) -> str:
+    """
+    Show one more query of a compound question for review.
+    
+    Args:
+        number (int): The position of the query, starting at 2
+        extra (dict): The tool_name, query and preflight_error of the query
+        
+    Returns:
+        str: The potentially edited query
+    """
+    tool_name = extra["tool_name"]
+    st.markdown(f"**Query {number} uses the {tool_name.replace('_', ' ')}**")
+    if extra.get("preflight_error"):
+        st.warning(f"This query does not compile yet: {extra['preflight_error']}")
+    edited_query = st.text_area(f"Query {number} ({tool_name}):", value=extra["query"], height=150)
+    show_placeholder_captions(edited_query)
+    return edited_query
\ No newline at end of file
@@ -0,0 +1,277 @@
+# File: utils/app_context.py
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+
+class _Lazy:
+    """
+    A resource of AppContext that is created on first access.
+
+    The created value is stored in the instance __dict__, so later accesses are
+    plain attribute lookups and never reach the descriptor again. Each resource
+    has its own lock, so a slow factory (opening the database, loading the
+    example indexes) only blocks threads that wait for that same resource.
+    """
+
+    def __init__(self, factory: Callable[["AppContext"], Any]):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+
+    def __get__(self, context: "AppContext", owner=None) -> Any:
+        if context is None:
+            return self
+        with context._resource_lock(self.name):
+            if self.name not in context.__dict__:
+                context.__dict__[self.name] = self.factory(context)
+            return context.__dict__[self.name]
+
+
+class AppContext:
+    """
+    The process-wide resources of the app: config, database pool, LLM client and chains.
+
+    Nothing is opened when the context is created. Each resource is created on
+    first use, so importing a module never touches the network or the database.
+    All OpenAI clients share one keep-alive HTTP connection pool. Streamlit
+    keeps the context in st.cache_resource; other entry points call
+    get_context().warm_up() themselves.
+    """
+
+    def __init__(self, config_path: str = "config.yaml"):
+        self.config_path = config_path
+        self._lock = threading.RLock()
+        self._locks: Dict[str, threading.RLock] = {}
+        self._resources: Dict[str, Any] = {}
+        self.warmup_ms: Dict[str, float] = {}
+        self.fts_refresher = None
+
+    @_Lazy
+    def param(self) -> Dict[str, Any]:
+        """The parsed config.yaml"""
+        with open(self.config_path, "r") as stream:
+            return yaml.safe_load(stream)
+
+    @_Lazy
+    def pool(self):
+        """The DuckDB connection pool; the HNSW and full-text indexes are checked the first time it is opened"""
+        import my_db_specifics
+        import utils.fts_index as fts_index
+        import utils.vector_engine as vector_engine
+        import utils.vector_index as vector_index
+        from utils.db_pool import ConnectionPool
+
+        read_only = self.param.get("read_only", False)
+        # Every pooled connection loads the extensions, defines drug_graph and applies the HNSW search settings
+        pool = ConnectionPool(
+            self.param['drugdb_path'],
+            size=self.param.get("db_pool_size", 4),
+            init_commands=my_db_specifics.initialization_commands + vector_index.session_commands(),
+            read_only=read_only,
+        )
+        with pool.connection() as connection:
+            # A read-only process can only check for the index, it has to be built by a read-write run
+            logger.info("HNSW index: %s", vector_index.check_index(connection, create=not read_only))
+            logger.info("full-text index: %s", fts_index.check_index(connection, create=not read_only))
+
+            if vector_engine.backend() == "numpy":
+                vector_engine.load_engine(connection)
+        # Rebuilds the full-text index when the trials change after startup
+        self.fts_refresher = fts_index.start_refresher(pool)
+        return pool
+
+    @_Lazy
+    def db(self):
+        """LangChain's SQLDatabase, only used for the dialect and schema; it shares the pool's database"""
+        from duckdb_engine import ConnectionWrapper
+        from langchain_community.utilities import SQLDatabase
+        from sqlalchemy import create_engine
+
+        pool = self.pool
+        engine = create_engine('duckdb://', creator=lambda: ConnectionWrapper(pool.new_connection()))
+        db = SQLDatabase(engine=engine, view_support=True)
+        logger.info("tables: %s", db.get_usable_table_names())
+        return db
+
+    @_Lazy
+    def http_client(self):
+        """One keep-alive HTTP connection pool shared by every OpenAI client of the process"""
+        import httpx
+
+        limits = httpx.Limits(
+            max_connections=self.param.get("http_max_connections", 20),
+            max_keepalive_connections=self.param.get("http_max_connections", 20),
+            keepalive_expiry=self.param.get("http_keepalive_expiry_s", 30),
+        )
+        return httpx.Client(limits=limits, timeout=httpx.Timeout(60.0, connect=10.0))
+
+    @_Lazy
+    def openai_client(self):
+        """The OpenAI client used for the question and placeholder embeddings"""
+        import openai
+
+        return openai.OpenAI(api_key=self.param['openai_api'], http_client=self.http_client)
+
+    @_Lazy
+    def llm(self):
+        """The chat model used by the tools, the router and the answer step"""
+        from langchain_openai import ChatOpenAI
+
+        from utils.tracing import token_usage_callback
+
+        os.environ["OPENAI_API_KEY"] = self.param['openai_api']
+        # The callback adds the token usage of every call to the current tracing span
+        return ChatOpenAI(
+            model_name="gpt-4o-mini",
+            http_client=self.http_client,
+            callbacks=[token_usage_callback],
+            stream_usage=True,
+        )
+
+    @_Lazy
+    def example_embeddings(self):
+        """The embedding model of the few-shot example indexes"""
+        from langchain_openai import OpenAIEmbeddings
+
+        os.environ["OPENAI_API_KEY"] = self.param['openai_api']
+        return OpenAIEmbeddings(http_client=self.http_client)
+
+    @_Lazy
+    def example_selectors(self) -> Dict[str, Any]:
+        """The few-shot example selectors of the SQL and graph tools, loaded from their prebuilt indexes"""
+        import my_db_specifics
+        from utils.example_index import get_example_selector
+
+        return {
+            "sql": get_example_selector("sql", my_db_specifics.sql_examples, k=5),
+            "graph": get_example_selector("graph", my_db_specifics.graph_examples, k=5),
+        }
+
+    def _resource_lock(self, name: str) -> threading.RLock:
+        """Return the lock that guards the creation of one resource"""
+        with self._lock:
+            return self._locks.setdefault(name, threading.RLock())
+
+    def resource(self, name: str, factory: Callable[[], Any]) -> Any:
+        """
+        Return a named resource, creating it with factory on first use.
+
+        Modules use this for their own lazily built objects, e.g. chains that need llm.
+
+        Args:
+            name (str): A name unique within the process
+            factory: Called without arguments to create the resource
+
+        Returns:
+            Any: The resource
+        """
+        with self._resource_lock(name):
+            if name not in self._resources:
+                self._resources[name] = factory()
+            return self._resources[name]
+
+    def warm_up(self) -> Dict[str, float]:
+        """
+        Create every shared resource now instead of on the first question.
+
+        Returns:
+            Dict[str, float]: Milliseconds each resource took, also kept in warmup_ms
+        """
+        for name in WARM_UP_ORDER:
+            if name in self.__dict__:
+                continue
+            start = time.perf_counter()
+            getattr(self, name)
+            self.warmup_ms[name] = 1000 * (time.perf_counter() - start)
+        return dict(self.warmup_ms)
+
+    def health(self) -> Dict[str, Any]:
+        """
+        Check the shared resources without calling the OpenAI API.
+
+        The LLM and the example indexes are not probed, they are only reported
+        as created or not; they do not affect "ok".
+
+        Returns:
+            Dict[str, Any]: "ok", one entry per check, and the warm-up times
+        """
+        checks = {}
+        try:
+            with self.pool.connection(timeout=5) as connection:
+                connection.execute("SELECT 1").fetchall()
+            checks["database"] = {"ok": True, **self.pool.stats()}
+        except Exception as e:
+            checks["database"] = {"ok": False, "error": str(e)}
+
+        try:
+            import utils.fts_index as fts_index
+
+            with self.pool.connection(timeout=5) as connection:
+                info = fts_index.index_info(connection)
+            if self.fts_refresher is not None:
+                info["refresh"] = self.fts_refresher.stats()
+            checks["fts_index"] = {"ok": info["exists"], **info}
+        except Exception as e:
+            checks["fts_index"] = {"ok": False, "error": str(e)}
+
+        http_client = self.__dict__.get("http_client")
+        checks["http_client"] = {"ok": http_client is not None and not http_client.is_closed}
+        checks["llm"] = {"created": "llm" in self.__dict__}
+        checks["example_indexes"] = {"created": "example_selectors" in self.__dict__}
+        return {
+            "ok": all(check["ok"] for check in checks.values() if "ok" in check),
+            "checks": checks,
+            "warmup_ms": dict(self.warmup_ms),
+        }
+
+    def close(self) -> None:
+        """Close the HTTP connection pool and drop the clients and chains that use it"""
+        with self._lock:
+            http_client = self.__dict__.pop("http_client", None)
+            for name in ("openai_client", "llm", "example_embeddings"):
+                self.__dict__.pop(name, None)
+            self._resources.clear()
+        if http_client is not None:
+            http_client.close()
+
+    def initialized(self) -> Dict[str, bool]:
+        """Return which of the built-in resources have been created so far"""
+        return {
+            name: name in self.__dict__
+            for name, value in vars(AppContext).items()
+            if isinstance(value, _Lazy)
+        }
+
+
+# Resources created by warm_up, in dependency order
+WARM_UP_ORDER = ["param", "pool", "db", "http_client", "openai_client", "llm", "example_embeddings", "example_selectors"]
+
+_context = None
+_context_lock = threading.Lock()
+
+
+def get_context() -> AppContext:
+    """Return the process-wide AppContext"""
+    global _context
+    with _context_lock:
+        if _context is None:
+            _context = AppContext()
+        return _context
+
+
+def setting(key: str, default: Any = None) -> Any:
+    """
+    Return one setting of config.yaml, or default if it is not set.
+
+    Modules read their settings through this when they need them, not at
+    import, so importing a module never opens config.yaml.
+    """
+    return get_context().param.get(key, default)
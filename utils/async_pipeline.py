@@ -0,0 +1,211 @@
+# File: utils/async_pipeline.py
+
+import asyncio
+import logging
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import utils.router as local_router
+import utils.tracing as tracing
+from utils.app_context import get_context, setting
+from utils.my_langchain_tools import _compact_results, _has_rows, answer_chain, run_query
+from utils.query_generator import _arun_tool, cached_tool_call, llm_with_tools, normalize_tool_args, tool_executor, tool_timeout_s
+from utils.query_repair import preflight
+from utils.query_result import QueryResult
+from utils.semantic_cache import semantic_cache
+
+logger = logging.getLogger(__name__)
+
+
+def stage_limits() -> Dict[str, int]:
+    """How many requests of all sessions may be in each stage at once"""
+    return {
+        "llm": setting("async_llm_concurrency", 8),
+        "generation": setting("async_generation_concurrency", 4),
+        "embedding": setting("async_embedding_concurrency", 8),
+        "db": setting("db_pool_size", 4),
+    }
+
+
+# Blocking DuckDB and embedding calls run on fixed-size executors; the pre-flight uses the shared
+# tool_executor, and the pre-flight of multi-call responses fans out on query_repair.preflight_executor
+def db_executor() -> ThreadPoolExecutor:
+    return get_context().resource(
+        "db_executor", lambda: ThreadPoolExecutor(max_workers=stage_limits()["db"], thread_name_prefix="duckdb")
+    )
+
+
+def embedding_executor() -> ThreadPoolExecutor:
+    return get_context().resource(
+        "embedding_executor",
+        lambda: ThreadPoolExecutor(max_workers=stage_limits()["embedding"], thread_name_prefix="embedding"),
+    )
+
+
+# asyncio.Semaphore belongs to one event loop, so every loop gets its own set
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def stage(name: str) -> asyncio.Semaphore:
+    """Return the semaphore that bounds the concurrency of a pipeline stage on the running loop"""
+    semaphores = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    if name not in semaphores:
+        semaphores[name] = asyncio.Semaphore(stage_limits()[name])
+    return semaphores[name]
+
+
+async def _blocking(name: str, executor: ThreadPoolExecutor, function: Callable, *args) -> Any:
+    """Run a blocking call on an executor within the concurrency limit of its stage"""
+    async with stage(name):
+        # run_in_executor does not carry context variables over, the request id and parent span would be lost
+        return await asyncio.get_running_loop().run_in_executor(executor, tracing.in_context(function), *args)
+
+
+async def _invoke_tool(tool_call: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Generate the query of one tool call with the tool's ainvoke.
+
+    As in call_tools, the call gets tool_timeout_s() from the moment it gets a
+    generation slot and fails if it gets none within as long. The SQL and
+    graph tools await their LLM chains, so a call that times out is cancelled.
+    The full-text and vector tools run on LangChain's executor; a timed-out
+    call of theirs is abandoned, not stopped.
+    """
+    tool_call["args"] = normalize_tool_args(tool_call.get("args"))
+    timeout_s = tool_timeout_s()
+    slot = stage("generation")
+    try:
+        await asyncio.wait_for(slot.acquire(), timeout_s)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"{tool_call['name']} got no generation slot within {timeout_s} s") from None
+    try:
+        tool_call["output"] = await asyncio.wait_for(_arun_tool(tool_call["name"], tool_call["args"]), timeout_s)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"{tool_call['name']} did not finish within {timeout_s} s, cancelled") from None
+    finally:
+        slot.release()
+    return tool_call
+
+
+async def acall_tools(tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Generate the queries of several tool calls concurrently, each within tool_timeout_s() of starting.
+
+    Like call_tools, failed calls are dropped and an error is raised only if none succeeded.
+    """
+    outcomes = await asyncio.gather(*(_invoke_tool(tool_call) for tool_call in tool_calls), return_exceptions=True)
+    completed = [outcome for outcome in outcomes if not isinstance(outcome, BaseException)]
+    errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+    for error in errors:
+        logger.warning("tool call failed: %s", error)
+    if not completed and errors:
+        raise errors[0]
+    return completed
+
+
+async def agenerate(prompt: str) -> List[Dict[str, Any]]:
+    """
+    Async counterpart of query_generator.generate.
+
+    The semantic cache lookup and the routing run concurrently, so embedding
+    the question overlaps with the routing LLM call. A cache hit cancels the
+    routing. The tools only generate their queries after a miss, so a hit
+    never pays for generation calls that would be thrown away.
+
+    Args:
+        prompt (str): The user question
+
+    Returns:
+        List[Dict[str, Any]]: The tool calls with their pre-flighted queries in "output"
+    """
+    started = time.perf_counter()
+    lookup = asyncio.create_task(_lookup(prompt))
+    routing = asyncio.create_task(_route(prompt))
+    # A routing error after a hit is never awaited; retrieving it keeps asyncio from logging it
+    routing.add_done_callback(lambda task: task.cancelled() or task.exception())
+    try:
+        cached = await lookup
+        if cached is not None:
+            logger.info("semantic cache hit (%.3f): %s", cached["similarity"], cached["question"])
+            tool_calls = [cached_tool_call(prompt, cached)]
+        else:
+            tool_calls = await acall_tools(await routing)
+    finally:
+        # Only does something after a hit or a failed lookup
+        routing.cancel()
+
+    return await _blocking("generation", tool_executor(), preflight, tool_calls, started)
+
+
+async def _lookup(prompt: str) -> Optional[Dict[str, Any]]:
+    with tracing.span("semantic_cache") as span:
+        cached = await _blocking("embedding", embedding_executor(), semantic_cache().lookup, prompt)
+        span.set(hit=cached is not None)
+    return cached
+
+
+async def _route(prompt: str) -> List[Dict[str, Any]]:
+    """Pick the tools of a question, locally if the question is clear-cut, else with the routing LLM"""
+    if local_router.enabled():
+        with tracing.span("local_router") as span:
+            routed = local_router.router().route(prompt)
+            span.set(hit=routed is not None)
+        if routed is not None:
+            tool_name, args = routed
+            return [{"name": tool_name, "args": args, "id": "local_router"}]
+
+    with tracing.span("route") as span:
+        try:
+            async with stage("llm"):
+                message = await llm_with_tools().ainvoke(prompt)
+        except asyncio.CancelledError:
+            span.set(cancelled=True)
+            raise
+    return [dict(tool_call) for tool_call in message.tool_calls]
+
+
+async def arun_queries(queries: List[str]) -> List[QueryResult]:
+    """Run confirmed queries concurrently on the DuckDB executor, bounded by the connection pool"""
+    return list(await asyncio.gather(*(_blocking("db", db_executor(), run_query, query) for query in queries)))
+
+
+async def aanswer_query(my_question: str, query_result) -> str:
+    """Async counterpart of answer_query for one QueryResult or a list of them"""
+    if not _has_rows(query_result):
+        return "No results found."
+    async with stage("llm"):
+        return await answer_chain().ainvoke({"question": my_question, "query_result": _compact_results(query_result)})
+
+
+async def astream_answer(my_question: str, query_result) -> AsyncIterator[str]:
+    """Async counterpart of stream_answer, yielding the answer token by token"""
+    if not _has_rows(query_result):
+        yield "No results found."
+        return
+    async with stage("llm"):
+        async for chunk in answer_chain().astream({"question": my_question, "query_result": _compact_results(query_result)}):
+            yield chunk
+
+
+async def aask(prompt: str) -> Dict[str, Any]:
+    """
+    Answer a question end to end without the confirmation step, e.g. for an API or a benchmark.
+
+    Args:
+        prompt (str): The user question
+
+    Returns:
+        Dict[str, Any]: The tool calls, their query results and the answer
+    """
+    tool_calls = await agenerate(prompt)
+    query_results = await arun_queries([tool_call["output"] for tool_call in tool_calls])
+    answer_input = query_results[0] if len(query_results) == 1 else query_results
+    return {
+        "tool_calls": tool_calls,
+        "query_results": query_results,
+        "answer": await aanswer_query(prompt, answer_input),
+    }
@@ -1,10 +1,13 @@
 # File: utils/chain_processor.py
 
+import logging
+import time
 import streamlit as st
-from typing import List, Dict, Any, Union
-from utils.my_langchain_tools import *
+from typing import List, Dict, Any
 #from utils.message_handler import store_ai_message
 
+logger = logging.getLogger(__name__)
+
 def process_chain_response(response: List[Dict[str, Any]], prompt: str) -> None:
     """
     Process the response from the LangChain generation process and handle
@@ -24,10 +27,20 @@ def process_chain_response(response: List[Dict[str, Any]], prompt: str) -> None:
     # Store tool information in session state
     st.session_state.tool_name = tool_call["name"]
     
-    print ("tool_call prompt", prompt)
+    logger.debug("tool call %s for: %s", tool_call["name"], prompt)
 
     setup_confirmation_state(tool_call, prompt)
 
+    # A compound question can produce several queries; they are confirmed and answered together
+    st.session_state.extra_queries = [
+        {
+            "tool_name": extra_call["name"],
+            "query": extra_call["output"],
+            "preflight_error": extra_call.get("preflight", {}).get("error"),
+        }
+        for extra_call in response[1:]
+    ]
+
 
 # def requires_confirmation(tool_name: str) -> bool:
 #     """
@@ -58,6 +71,10 @@ def setup_confirmation_state(tool_call: Dict[str, Any], prompt: str) -> None:
     st.session_state.awaiting_confirmation = True
     st.session_state.current_query = tool_call["output"]
     st.session_state.current_chain_input = prompt
+    # Repairs ran out of attempts: show the DuckDB error together with the query
+    st.session_state.preflight_error = tool_call.get("preflight", {}).get("error")
+    # The confirmation wait is recorded as a tracing span once the user decides
+    st.session_state.confirmation_started = time.time()
 
 # def execute_tool_directly(tool_call: Dict[str, Any], prompt: str) -> None:
 #     """
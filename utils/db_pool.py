@@ -0,0 +1,142 @@
+# File: utils/db_pool.py
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import duckdb
+
+
+class ReadOnlyDatabaseError(RuntimeError):
+    """Raised when a statement tries to write to a database opened read-only"""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DuckDB connections to one database file.
+
+    All connections share one database instance. Every new connection runs the
+    initialization commands (extension loads, the property graph, session
+    settings), because DuckDB keeps those per connection. Each request checks
+    out its own connection, so concurrent sessions run queries in parallel.
+
+    With read_only set the file is opened with access_mode=READ_ONLY, so any
+    number of processes can serve from it at the same time.
+    """
+
+    def __init__(self, database: str, size: int, init_commands: List[str], read_only: bool = False):
+        self.database = database
+        self.size = size
+        self.init_commands = list(init_commands)
+        self.read_only = read_only
+        self._root = duckdb.connect(database, read_only=read_only)
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def new_connection(self) -> duckdb.DuckDBPyConnection:
+        """
+        Open a new initialized connection to the pooled database.
+
+        Returns:
+            duckdb.DuckDBPyConnection: A connection that has run all init commands
+        """
+        connection = self._root.cursor()
+        for command in self.init_commands:
+            try:
+                connection.execute(command)
+            except duckdb.Error as e:
+                # Objects such as the property graph may outlive the connection that created them
+                if "already exists" in str(e):
+                    continue
+                if self.read_only and "read-only" in str(e):
+                    raise ReadOnlyDatabaseError(
+                        f"Initialization command needs write access to {self.database}, "
+                        f"run it once without read_only: {command!r}"
+                    ) from e
+                raise
+        return connection
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[duckdb.DuckDBPyConnection]:
+        """
+        Check out a connection for one request and return it to the pool afterwards.
+
+        Args:
+            timeout: Seconds to wait for a free connection, None waits forever
+
+        Yields:
+            duckdb.DuckDBPyConnection: An initialized connection
+
+        Raises:
+            TimeoutError: If no connection became free within timeout
+            ReadOnlyDatabaseError: If the request tried to write to a read-only database
+        """
+        start = time.perf_counter()
+        connection = self._acquire(timeout)
+        wait = time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        try:
+            yield connection
+        except duckdb.Error as e:
+            if self.read_only and "read-only" in str(e):
+                raise ReadOnlyDatabaseError(
+                    f"{self.database} is served read-only (read_only: true in config.yaml), "
+                    f"writes are not allowed: {e}"
+                ) from e
+            raise
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._idle.put(connection)
+
+    def _acquire(self, timeout: Optional[float]) -> duckdb.DuckDBPyConnection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self.new_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No database connection became free within {timeout} seconds") from None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report pool size and wait-time metrics.
+
+        Returns:
+            Dict[str, Any]: Pool size, open/in-use connections, checkouts and wait times
+        """
+        with self._lock:
+            return {
+                "size": self.size,
+                "read_only": self.read_only,
+                "open": self._created,
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "avg_wait_ms": 1000 * self._total_wait / self._checkouts if self._checkouts else 0.0,
+                "max_wait_ms": 1000 * self._max_wait,
+            }
@@ -1,15 +1,244 @@
-import yaml
-import openai
+import array
+import hashlib
+import sqlite3
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
 
+from utils.app_context import get_context, setting
 
-with open("config.yaml", "r") as stream:
-    try:
-        PARAM = yaml.safe_load(stream)
-    except yaml.YAMLError as exc:
-        print(exc)
 
-client = openai.OpenAI(api_key = PARAM['openai_api'])
+def normalize_text(text):
+   """Collapse all whitespace (including newlines) into single spaces"""
+   return " ".join(text.split())
 
-def get_embedding(text, model=PARAM['vector_embedding_model']):
-   text = text.replace("\n", " ")
-   return client.embeddings.create(input = [text], model=model).data[0].embedding
\ No newline at end of file
+
+def cache_key(model, text):
+   """Content address of a (model, normalized text) pair"""
+   return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+   """
+   Two-level embedding cache keyed by (model, normalized text).
+
+   The first level is an in-memory LRU bounded by the bytes of the stored vectors.
+   The second level is a SQLite table of float32 blobs that every process shares.
+   The SQLite file is opened on the first lookup, not when the cache is created.
+   """
+
+   def __init__(self, path, max_bytes):
+      self.path = path
+      self.max_bytes = max_bytes
+      self._lru = OrderedDict()
+      self._lru_bytes = 0
+      self._lock = threading.Lock()
+      self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+      self._connection = None
+      # Placeholders registered before the file is opened, e.g. by the vector search examples
+      self._pending_placeholders = []
+
+   @property
+   def _db(self):
+      """The SQLite connection, opened on first use; callers hold self._lock"""
+      if self._connection is None:
+         db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+         db.execute("PRAGMA journal_mode=WAL")
+         db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT, text TEXT, vector BLOB)"
+         )
+         db.execute("CREATE TABLE IF NOT EXISTS placeholders (name TEXT PRIMARY KEY, text TEXT)")
+         db.executemany("INSERT OR IGNORE INTO placeholders VALUES (?, ?)", self._pending_placeholders)
+         db.commit()
+         self._pending_placeholders = []
+         self._connection = db
+      return self._connection
+
+   def get(self, model, text, record=True):
+      """Return the cached vector or None, counting the hit or miss if record is set"""
+      key = cache_key(model, text)
+      with self._lock:
+         if key in self._lru:
+            self._lru.move_to_end(key)
+            self.stats["memory_hits"] += record
+            return self._lru[key].tolist()
+
+         row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+         if row is None:
+            self.stats["misses"] += record
+            return None
+
+         self.stats["disk_hits"] += record
+         vector = array.array("f")
+         vector.frombytes(row[0])
+         self._remember(key, vector)
+         return vector.tolist()
+
+   def put(self, model, text, embedding):
+      """Store a vector in both levels"""
+      key = cache_key(model, text)
+      vector = array.array("f", embedding)
+      with self._lock:
+         self._db.execute(
+            "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+            (key, model, normalize_text(text), vector.tobytes()),
+         )
+         self._db.commit()
+         self._remember(key, vector)
+
+   def save_placeholder(self, name, text):
+      """Remember which text a query placeholder stands for"""
+      with self._lock:
+         if self._connection is None:
+            self._pending_placeholders.append((name, text))
+            return
+         self._db.execute("INSERT OR IGNORE INTO placeholders VALUES (?, ?)", (name, text))
+         self._db.commit()
+
+   def load_placeholder(self, name):
+      """Return the text behind a query placeholder or None"""
+      with self._lock:
+         row = self._db.execute("SELECT text FROM placeholders WHERE name = ?", (name,)).fetchone()
+      return row[0] if row else None
+
+   def _remember(self, key, vector):
+      """Insert into the LRU and evict the oldest entries beyond max_bytes"""
+      if key in self._lru:
+         self._lru_bytes -= len(self._lru.pop(key)) * vector.itemsize
+      self._lru[key] = vector
+      self._lru_bytes += len(vector) * vector.itemsize
+      while self._lru_bytes > self.max_bytes and len(self._lru) > 1:
+         _, evicted = self._lru.popitem(last=False)
+         self._lru_bytes -= len(evicted) * evicted.itemsize
+
+
+def cache():
+   """The EmbeddingCache of the process, created on first use"""
+   return get_context().resource("embedding_cache", lambda: EmbeddingCache(
+      setting("embedding_cache_path", ".embedding_cache.sqlite"),
+      setting("embedding_cache_max_bytes", 64 * 1024 * 1024),
+   ))
+
+
+def default_model():
+   """The embedding model of config.yaml"""
+   return get_context().param['vector_embedding_model']
+
+
+# The embeddings endpoint accepts at most 2048 inputs per request
+MAX_BATCH_SIZE = 2048
+
+
+def get_embeddings(texts, model=None):
+   """
+   Embed many texts with as few API calls as possible.
+
+   Cached texts are answered locally, duplicates are sent once and the
+   remaining texts go out in chunks of MAX_BATCH_SIZE.
+
+   Args:
+      texts: The strings to embed
+      model: The embedding model, defaults to vector_embedding_model
+
+   Returns:
+      list: One vector per input text, in input order
+   """
+   return _get_embeddings(texts, model or default_model(), record=True)
+
+
+def _get_embeddings(texts, model, record):
+   embedding_cache = cache()
+   embeddings = [embedding_cache.get(model, text, record=record) for text in texts]
+   missing = list(dict.fromkeys(normalize_text(text) for text, e in zip(texts, embeddings) if e is None))
+
+   fetched = {}
+   for start in range(0, len(missing), MAX_BATCH_SIZE):
+      chunk = missing[start:start + MAX_BATCH_SIZE]
+      response = get_context().openai_client.embeddings.create(input = chunk, model=model)
+      for item in response.data:
+         fetched[chunk[item.index]] = item.embedding
+         embedding_cache.put(model, chunk[item.index], item.embedding)
+
+   return [e if e is not None else fetched[normalize_text(text)] for text, e in zip(texts, embeddings)]
+
+
+class EmbeddingBatcher:
+   """
+   Micro-batching front end for single-text embedding requests.
+
+   Requests that arrive from different threads (e.g. Streamlit sessions)
+   within window_ms of each other are sent as one get_embeddings call, and
+   every caller receives its own vector through a Future. A request that
+   finds no other one queued is sent at once, so a single caller never
+   waits for the window.
+   """
+
+   def __init__(self, window_ms, max_batch_size=MAX_BATCH_SIZE):
+      self.window = window_ms / 1000
+      self.max_batch_size = max_batch_size
+      self._queue = queue.Queue()
+      self._worker = None
+      self._lock = threading.Lock()
+
+   def submit(self, text, model):
+      """Queue a text for embedding and return a Future of its vector"""
+      future = Future()
+      self._queue.put((text, model, future))
+      with self._lock:
+         if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._worker.start()
+      return future
+
+   def _run(self):
+      while True:
+         batch = [self._queue.get()]
+         # Only wait for more requests when others queued up, e.g. while the previous batch was in flight
+         deadline = time.monotonic() + (self.window if not self._queue.empty() else 0)
+         while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+               break
+            try:
+               batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+               break
+         self._flush(batch)
+
+   def _flush(self, batch):
+      by_model = {}
+      for text, model, future in batch:
+         by_model.setdefault(model, []).append((text, future))
+
+      for model, requests in by_model.items():
+         try:
+            # These texts were already counted as misses by get_embedding
+            embeddings = _get_embeddings([text for text, _ in requests], model, record=False)
+         except Exception as e:
+            for _, future in requests:
+               future.set_exception(e)
+            continue
+         for (_, future), embedding in zip(requests, embeddings):
+            future.set_result(embedding)
+
+
+def batcher():
+   """The EmbeddingBatcher of the process, or None if embedding_batch_window_ms is 0"""
+   def create():
+      window_ms = setting("embedding_batch_window_ms", 10)
+      return EmbeddingBatcher(window_ms) if window_ms > 0 else None
+   return get_context().resource("embedding_batcher", create)
+
+
+def get_embedding(text, model=None):
+   model = model or default_model()
+   embedding = cache().get(model, text)
+   if embedding is not None:
+      return embedding
+   embedding_batcher = batcher()
+   if embedding_batcher is not None:
+      return embedding_batcher.submit(text, model).result()
+   # cache.get already counted the miss
+   return _get_embeddings([text], model, record=False)[0]
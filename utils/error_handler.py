@@ -39,6 +39,10 @@ def clear_confirmation_state() -> None:
     st.session_state.current_query = None
     st.session_state.current_chain_input = None
     st.session_state.tool_name = None
+    st.session_state.preflight_error = None
+    st.session_state.extra_queries = []
+    st.session_state.request_id = None
+    st.session_state.confirmation_started = None
 
 # def get_friendly_error_message(error: Exception) -> str:
 #     """
@@ -0,0 +1,106 @@
+# File: utils/example_index.py
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_core.example_selectors import SemanticSimilarityExampleSelector
+from langchain_openai import OpenAIEmbeddings
+
+from utils.app_context import get_context, setting
+
+# Only these keys take part in the prompt, so only they define an example set
+EXAMPLE_KEYS = ["input", "query"]
+
+_selectors: Dict[str, SemanticSimilarityExampleSelector] = {}
+_lock = threading.Lock()
+
+
+def example_set_hash(examples: List[Dict[str, str]], model: str) -> str:
+    """
+    Compute a stable fingerprint of an example set and the embedding model.
+
+    Args:
+        examples: The few-shot examples, e.g. my_db_specifics.sql_examples
+        model: The name of the embedding model used to index the examples
+
+    Returns:
+        str: A hex digest that changes whenever an example or the model changes
+    """
+    payload = json.dumps(
+        {"model": model, "examples": [[eg[key] for key in EXAMPLE_KEYS] for eg in examples]},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_example_selector(name: str, examples: List[Dict[str, str]], k: int = 5) -> SemanticSimilarityExampleSelector:
+    """
+    Return the example selector for an example set, building it at most once per process.
+
+    The FAISS index is looked up on disk under the example-set hash first and
+    memory-mapped if present. Otherwise the examples are embedded once and the
+    index is saved for the next start.
+
+    Args:
+        name: A readable name for the example set, e.g. "sql" or "graph"
+        examples: The few-shot examples to index
+        k: Number of examples the selector returns
+
+    Returns:
+        SemanticSimilarityExampleSelector: The shared selector for this example set
+    """
+    embeddings = get_context().example_embeddings
+    index_name = f"{name}-{example_set_hash(examples, embeddings.model)}"
+    # The persisted index does not depend on k, but each k needs its own selector
+    key = f"{index_name}-k{k}"
+
+    with _lock:
+        if key not in _selectors:
+            folder = Path(setting("example_index_dir", ".example_index")) / index_name
+            if (folder / "index.faiss").exists():
+                vectorstore = _load_vectorstore(folder, embeddings)
+            else:
+                vectorstore = _build_vectorstore(folder, examples, embeddings)
+            _selectors[key] = SemanticSimilarityExampleSelector(
+                vectorstore=vectorstore,
+                k=k,
+                input_keys=["input"],
+                example_keys=EXAMPLE_KEYS,
+            )
+    return _selectors[key]
+
+
+def _build_vectorstore(folder: Path, examples: List[Dict[str, str]], embeddings: OpenAIEmbeddings) -> FAISS:
+    """Embed the examples, build a FAISS index and persist it under folder"""
+    texts = [eg["input"] for eg in examples]
+    metadatas = [{key: eg[key] for key in EXAMPLE_KEYS} for eg in examples]
+    vectorstore = FAISS.from_texts(texts, embeddings, metadatas=metadatas)
+
+    # Write into a temporary folder first so a concurrent process never sees half an index
+    tmp_folder = folder.with_name(f"{folder.name}.tmp{os.getpid()}")
+    vectorstore.save_local(str(tmp_folder))
+    try:
+        os.replace(tmp_folder, folder)
+    except OSError:
+        # Another process published the same example set first
+        for f in tmp_folder.iterdir():
+            f.unlink()
+        tmp_folder.rmdir()
+    return vectorstore
+
+
+def _load_vectorstore(folder: Path, embeddings: OpenAIEmbeddings) -> FAISS:
+    """Load a persisted FAISS index read-only through mmap"""
+    # IO_FLAG_MMAP_IFC maps the vectors of flat indexes, older faiss builds only have IO_FLAG_MMAP
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    index = faiss.read_index(str(folder / "index.faiss"), mmap_flag | faiss.IO_FLAG_READ_ONLY)
+    with open(folder / "index.pkl", "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
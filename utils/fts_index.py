@@ -0,0 +1,398 @@
+# File: utils/fts_index.py
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from utils.app_context import get_context, setting
+
+logger = logging.getLogger(__name__)
+
+# The queries of Fulltext_QueryTool call fts_main_Trials.match_bm25 on Trials.StudyTitle
+TABLE = "Trials"
+ID_COLUMN = "PostingID"
+FIELDS = ["StudyTitle"]
+FACADE_SCHEMA = "fts_main_Trials"
+
+# Every build copies the indexed columns into SOURCE_SCHEMA.Trials_g<n>; DuckDB puts its index into fts_<schema>_<table>
+SOURCE_SCHEMA = "fts_source"
+STATE_TABLE = f"{SOURCE_SCHEMA}.fts_state"
+STOPWORDS_TABLE = f"{SOURCE_SCHEMA}.stopwords"
+
+STEMMERS = {
+    "arabic", "basque", "catalan", "danish", "dutch", "english", "finnish", "french", "german", "greek",
+    "hindi", "hungarian", "indonesian", "irish", "italian", "lithuanian", "nepali", "norwegian", "porter",
+    "portuguese", "romanian", "russian", "serbian", "spanish", "swedish", "tamil", "turkish", "none",
+}
+
+_build_lock = threading.Lock()
+
+
+def configured() -> Dict[str, Any]:
+    """
+    Return the index settings of config.yaml.
+
+    Returns:
+        Dict[str, Any]: stemmer, stopwords ("english", "none", or a list of words) and strip_accents
+    """
+    param = get_context().param
+    stemmer = param.get("fts_stemmer", "porter")
+    if stemmer not in STEMMERS:
+        raise ValueError(f"fts_stemmer must be one of {', '.join(sorted(STEMMERS))}, got {stemmer!r}")
+    return {
+        "stemmer": stemmer,
+        "stopwords": param.get("fts_stopwords", "english"),
+        "strip_accents": bool(param.get("fts_strip_accents", True)),
+    }
+
+
+def settings() -> Dict[str, Any]:
+    """Return the configured index settings, in the form they are stored in STATE_TABLE"""
+    config = configured()
+    stopwords = config["stopwords"]
+    if not isinstance(stopwords, str):
+        stopwords = json.dumps(sorted(stopwords))
+    return {**config, "stopwords": stopwords}
+
+
+def generation_table(generation: int) -> str:
+    return f"{SOURCE_SCHEMA}.{TABLE}_g{generation}"
+
+
+def generation_schema(generation: int) -> str:
+    return f"fts_{SOURCE_SCHEMA}_{TABLE}_g{generation}"
+
+
+def content_checksum(connection: Any, table: str = TABLE) -> str:
+    """
+    Return a checksum of the indexed columns.
+
+    The sum of the row hashes does not depend on the row order, so it is cheap
+    to compute and changes whenever a trial is added, removed or retitled.
+
+    Args:
+        connection: A DuckDB connection
+        table (str): The table to read, Trials or a generation copy
+
+    Returns:
+        str: "<rows>:<sum of row hashes>"
+    """
+    columns = ", ".join([ID_COLUMN] + FIELDS)
+    rows, total = connection.execute(
+        f"SELECT COUNT(*), COALESCE(SUM(hash({columns})::HUGEINT), 0) FROM {table}"
+    ).fetchone()
+    return f"{rows}:{total}"
+
+
+def current_state(connection: Any) -> Optional[Dict[str, Any]]:
+    """
+    Read the generation the facade points to.
+
+    Args:
+        connection: A DuckDB connection
+
+    Returns:
+        Optional[Dict[str, Any]]: The row of STATE_TABLE, None if the index is not managed yet
+    """
+    exists = connection.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE schema_name = ? AND table_name = 'fts_state'", [SOURCE_SCHEMA]
+    ).fetchone()[0]
+    if not exists:
+        return None
+    cursor = connection.execute(f"SELECT * FROM {STATE_TABLE}")
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([column[0] for column in cursor.description], row))
+
+
+def facade_exists(connection: Any) -> bool:
+    """Check whether fts_main_Trials.match_bm25 can be called"""
+    count = connection.execute(
+        "SELECT COUNT(*) FROM duckdb_functions() WHERE schema_name = ? AND function_name = 'match_bm25'",
+        [FACADE_SCHEMA],
+    ).fetchone()[0]
+    return count > 0
+
+
+def build_generation(connection: Any, generation: int) -> Dict[str, Any]:
+    """
+    Build a new index next to the one in use.
+
+    The indexed columns are copied into a generation table first, so the
+    checksum recorded for the index is exactly the content it was built from,
+    and queries keep using the old index until swap() points the facade here.
+
+    Args:
+        connection: A read-write DuckDB connection with the fts extension loaded
+        generation (int): The number of the new generation
+
+    Returns:
+        Dict[str, Any]: The generation, its checksum and the build time in ms
+    """
+    start = time.perf_counter()
+    table = generation_table(generation)
+    connection.execute(f"CREATE SCHEMA IF NOT EXISTS {SOURCE_SCHEMA};")
+    connection.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT {', '.join([ID_COLUMN] + FIELDS)} FROM {TABLE};")
+
+    config = configured()
+    stopwords = config["stopwords"]
+    if not isinstance(stopwords, str):
+        # DuckDB reads custom stopwords from a table with one VARCHAR column named sw
+        connection.execute(f"CREATE OR REPLACE TABLE {STOPWORDS_TABLE} (sw VARCHAR);")
+        connection.executemany(f"INSERT INTO {STOPWORDS_TABLE} VALUES (?)", [[word] for word in stopwords])
+        stopwords = STOPWORDS_TABLE
+
+    fields = ", ".join(f"'{field}'" for field in FIELDS)
+    connection.execute(
+        f"PRAGMA create_fts_index('{table}', '{ID_COLUMN}', {fields}, "
+        f"stemmer = '{config['stemmer']}', stopwords = '{stopwords}', "
+        f"strip_accents = {int(config['strip_accents'])}, overwrite = 1);"
+    )
+    return {
+        "generation": generation,
+        "checksum": content_checksum(connection, table),
+        "build_ms": 1000 * (time.perf_counter() - start),
+    }
+
+
+def swap(connection: Any, build: Dict[str, Any]) -> None:
+    """
+    Point fts_main_Trials at a built generation and drop the older ones.
+
+    fts_main_Trials only holds macros that forward to the generation's macros.
+    Replacing them and the state row happens in one transaction, so a query
+    sees either the old or the new index, never a half-built one. An index
+    created directly on Trials by an earlier version is replaced the same way.
+
+    Args:
+        connection: A read-write DuckDB connection
+        build (Dict[str, Any]): The result of build_generation
+    """
+    schema = generation_schema(build["generation"])
+    legacy = connection.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE schema_name = ?", [FACADE_SCHEMA]
+    ).fetchone()[0]
+    state = {
+        "generation": build["generation"],
+        "index_schema": schema,
+        "checksum": build["checksum"],
+        **settings(),
+        "build_ms": build["build_ms"],
+    }
+
+    connection.execute("BEGIN TRANSACTION;")
+    try:
+        if legacy:
+            connection.execute(f"DROP SCHEMA {FACADE_SCHEMA} CASCADE;")
+        connection.execute(f"CREATE SCHEMA IF NOT EXISTS {FACADE_SCHEMA};")
+        connection.execute(f"""
+            CREATE OR REPLACE MACRO {FACADE_SCHEMA}.match_bm25(
+                input_id, query_string, fields := NULL, k := 1.2, b := 0.75, conjunctive := 0
+            ) AS {schema}.match_bm25(
+                input_id, query_string, fields := fields, k := k, b := b, conjunctive := conjunctive
+            );""")
+        connection.execute(f"CREATE OR REPLACE MACRO {FACADE_SCHEMA}.tokenize(s) AS {schema}.tokenize(s);")
+        connection.execute(f"""
+            CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+                generation INTEGER, index_schema VARCHAR, checksum VARCHAR, stemmer VARCHAR,
+                stopwords VARCHAR, strip_accents BOOLEAN, build_ms DOUBLE, built_at TIMESTAMP
+            );""")
+        connection.execute(f"DELETE FROM {STATE_TABLE};")
+        connection.execute(
+            f"INSERT INTO {STATE_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, current_timestamp::TIMESTAMP)",
+            [state[key] for key in ("generation", "index_schema", "checksum", "stemmer", "stopwords", "strip_accents", "build_ms")],
+        )
+        connection.execute("COMMIT;")
+    except Exception:
+        connection.execute("ROLLBACK;")
+        raise
+    drop_generations(connection, keep=build["generation"])
+
+
+def drop_generations(connection: Any, keep: int) -> None:
+    """Drop the generation tables and index schemas other than keep, including those of interrupted builds"""
+    tables = connection.execute(
+        "SELECT table_name FROM duckdb_tables() WHERE schema_name = ? AND table_name LIKE ?",
+        [SOURCE_SCHEMA, f"{TABLE}_g%"],
+    ).fetchall()
+    for (table_name,) in tables:
+        generation = table_name[len(TABLE) + 2:]
+        if not generation.isdigit() or int(generation) == keep:
+            continue
+        connection.execute(f"DROP SCHEMA IF EXISTS {generation_schema(int(generation))} CASCADE;")
+        connection.execute(f"DROP TABLE IF EXISTS {generation_table(int(generation))};")
+
+
+def rebuild(connection: Any) -> Dict[str, Any]:
+    """
+    Build the next generation and swap it in; only one build runs at a time.
+
+    Args:
+        connection: A read-write DuckDB connection with the fts extension loaded
+
+    Returns:
+        Dict[str, Any]: The generation, its checksum and the build time in ms
+    """
+    with _build_lock:
+        state = current_state(connection)
+        build = build_generation(connection, (state["generation"] if state else 0) + 1)
+        swap(connection, build)
+    logger.info("Built full-text index generation %s on %s in %.0f ms", build["generation"], TABLE, build["build_ms"])
+    return build
+
+
+def stale_reason(connection: Any) -> Optional[str]:
+    """
+    Tell why the index has to be (re)built.
+
+    Args:
+        connection: A DuckDB connection
+
+    Returns:
+        Optional[str]: "missing", "settings" or "content", None if the index is current
+    """
+    state = current_state(connection)
+    if state is None or not facade_exists(connection):
+        return "missing"
+    if any(state[key] != value for key, value in settings().items()):
+        return "settings"
+    if state["checksum"] != content_checksum(connection):
+        return "content"
+    return None
+
+
+def index_info(connection: Any) -> Dict[str, Any]:
+    """
+    Report the index in use: its settings, build time and size.
+
+    Args:
+        connection: A DuckDB connection
+
+    Returns:
+        Dict[str, Any]: The state row plus the document and term counts and the size of its tables
+    """
+    state = current_state(connection)
+    if state is None:
+        return {"exists": facade_exists(connection), "managed": False}
+
+    schema = state["index_schema"]
+    info = {"exists": facade_exists(connection), "managed": True, **state}
+    info["built_at"] = str(info["built_at"])
+    info["documents"] = connection.execute(f"SELECT COUNT(*) FROM {schema}.docs").fetchone()[0]
+    info["terms"] = connection.execute(f"SELECT COUNT(*) FROM {schema}.dict").fetchone()[0]
+    info["postings"] = connection.execute(f"SELECT COUNT(*) FROM {schema}.terms").fetchone()[0]
+
+    # Only checkpointed tables occupy blocks; a block can hold segments of several tables, so this is an upper bound
+    block_size = connection.execute("SELECT block_size FROM pragma_database_size()").fetchone()[0]
+    blocks = set()
+    for (table_name,) in connection.execute(
+        "SELECT table_name FROM duckdb_tables() WHERE schema_name = ?", [schema]
+    ).fetchall():
+        blocks.update(
+            block for (block,) in connection.execute(
+                f"SELECT DISTINCT block_id FROM pragma_storage_info('{schema}.{table_name}') WHERE block_id IS NOT NULL"
+            ).fetchall()
+        )
+    info["size_bytes"] = len(blocks) * block_size
+    return info
+
+
+def check_index(connection: Any, create: bool = True) -> Dict[str, Any]:
+    """
+    Make sure the full-text index on Trials.StudyTitle exists and matches the trials.
+
+    Args:
+        connection: A DuckDB connection with the fts extension loaded
+        create (bool): Build or rebuild the index if it is missing or stale;
+            a read-only connection can only report it
+
+    Returns:
+        Dict[str, Any]: The index_info, whether it was rebuilt and why
+    """
+    reason = stale_reason(connection)
+    rebuilt = False
+    if reason is not None and create:
+        rebuild(connection)
+        rebuilt = True
+    status = {**index_info(connection), "stale": None if rebuilt else reason, "rebuilt_because": reason if rebuilt else None}
+    if status["stale"]:
+        logger.warning("The full-text index on %s is stale (%s): %s", TABLE, reason, status)
+    return status
+
+
+class IndexRefresher:
+    """
+    Rebuilds the full-text index in the background when the trials change.
+
+    DuckDB does not update an FTS index on INSERT, UPDATE or DELETE, so the
+    thread compares the content checksum every fts_refresh_interval_s seconds and
+    builds a new generation on its own connection while queries keep using
+    the current one.
+    """
+
+    def __init__(self, pool: Any, interval_s: float):
+        self.pool = pool
+        self.interval_s = interval_s
+        self.checks = 0
+        self.rebuilds = 0
+        self.last_check: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fts-refresh", daemon=True)
+
+    def start(self) -> "IndexRefresher":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def refresh(self) -> bool:
+        """
+        Rebuild the index now if it is stale.
+
+        Returns:
+            bool: True if a new generation was swapped in
+        """
+        connection = self.pool.new_connection()
+        try:
+            self.checks += 1
+            self.last_check = time.time()
+            if stale_reason(connection) is None:
+                return False
+            rebuild(connection)
+            self.rebuilds += 1
+            return True
+        finally:
+            connection.close()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.warning("Full-text index refresh failed: %s", self.last_error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_s": self.interval_s,
+            "checks": self.checks,
+            "rebuilds": self.rebuilds,
+            "last_check": self.last_check,
+            "last_error": self.last_error,
+        }
+
+
+def start_refresher(pool: Any) -> Optional[IndexRefresher]:
+    """Start the background refresh of a read-write pool, None if it is read-only or the interval is 0"""
+    # Seconds between two checks for changed trials; 0 only checks when the database is opened
+    interval_s = setting("fts_refresh_interval_s", 300)
+    if pool.read_only or not interval_s:
+        return None
+    return IndexRefresher(pool, interval_s).start()
+
@@ -1,10 +1,12 @@
 # File: utils/message_handler.py
 
 from langchain.schema import AIMessage
-from typing import Union, Dict, Any
+from typing import Union, Dict, Any, List, Optional
 import streamlit as st
+from utils.app_context import setting
+from utils.query_result import QueryResult
 
-def store_ai_message(query_response: Union[str, AIMessage, Any], executed_query: str) -> None:
+def store_ai_message(query_response: Union[str, AIMessage, Any], executed_query: Union[str, List[str]], query_result: Union[QueryResult, List[QueryResult], None] = None) -> None:
     """
     Store an AI message in the session state with proper formatting and tool information.
     
@@ -13,62 +15,92 @@ def store_ai_message(query_response: Union[str, AIMessage, Any], executed_query:
             - str: A simple string response
             - AIMessage: A pre-formatted AI message
             - Any: Any other type of response that will be converted to string
-        executed_query: The actual query that was executed
+        executed_query: The actual query that was executed, or the list of
+            queries of a compound question (one tool call each)
+        query_result: The fetched rows; the message keeps only their metadata
+            and the first chat_result_preview_rows rows, so the history does
+            not hold every result of the session. A list aligned with
+            executed_query for a compound question
     """
+    executed_queries = executed_query if isinstance(executed_query, list) else [executed_query]
+    # The first query is the one in current_query, the rest come from a compound question
+    generated = [(st.session_state.tool_name, st.session_state.current_query)] + [
+        (extra["tool_name"], extra["query"]) for extra in st.session_state.get("extra_queries") or []
+    ]
+
     # Create tool call information
-    tool_call = {
-        "name": st.session_state.tool_name,
-        "args": create_tool_args(executed_query),
-        "id": generate_tool_call_id()
-    }
+    tool_calls = [
+        {
+            "name": tool_name,
+            "args": create_tool_args(query, generated_query),
+            "id": generate_tool_call_id(i)
+        }
+        for i, ((tool_name, generated_query), query) in enumerate(zip(generated, executed_queries))
+    ]
 
     # Handle different types of responses
     if isinstance(query_response, str):
         ai_message = AIMessage(
             content=query_response,
-            tool_calls=[tool_call]
+            tool_calls=tool_calls
         )
     elif isinstance(query_response, AIMessage):
         # If it's already an AIMessage, ensure it has tool calls
         if not hasattr(query_response, 'tool_calls'):
-            query_response.tool_calls = [tool_call]
+            query_response.tool_calls = tool_calls
         ai_message = query_response
     else:
         # For any other type of response, convert to string
         ai_message = AIMessage(
             content=str(query_response),
-            tool_calls=[tool_call]
+            tool_calls=tool_calls
         )
 
+    # Ties the message to the tracing spans of its question
+    if st.session_state.get("request_id"):
+        ai_message.additional_kwargs["request_id"] = st.session_state.request_id
+
+    preview_rows = setting("chat_result_preview_rows", 100)
+    if isinstance(query_result, list):
+        ai_message.additional_kwargs["query_results"] = [result.summary(preview_rows) for result in query_result]
+    elif query_result is not None:
+        ai_message.additional_kwargs["query_result"] = query_result.summary(preview_rows)
+
     # Store the message in session state
     st.session_state.messages.append(ai_message)
 
-def create_tool_args(executed_query: str) -> Dict[str, str]:
+def create_tool_args(executed_query: str, generated_query: Optional[str] = None) -> Dict[str, str]:
     """
     Create the arguments dictionary for a tool call.
     
     Args:
         executed_query: The query that was executed
+        generated_query: The query before the user's edits, defaults to current_query
         
     Returns:
         Dict containing the query information and context
     """
     return {
-        "query": st.session_state.current_query,
+        "query": generated_query if generated_query is not None else st.session_state.current_query,
         "executed_query": executed_query,
         "my_question": st.session_state.current_chain_input,
         "original_query": st.session_state.current_chain_input
     }
 
-def generate_tool_call_id() -> str:
+def generate_tool_call_id(index: int = 0) -> str:
     """
     Generate a unique ID for a tool call.
     
+    Args:
+        index: The position of the tool call within its message
+    
     Returns:
         str: A unique identifier for the tool call
     """
     # Get the current number of messages
     message_count = len(st.session_state.messages)
+    if index:
+        return f"call_{message_count + 1}_{index + 1}"
     return f"call_{message_count + 1}"
 
 # def format_query_response(response: Any, tool_name: str) -> str:
@@ -1,21 +1,17 @@
 #import duckdb
-from langchain_community.utilities import SQLDatabase
-from langchain_openai import ChatOpenAI
+import logging
 import utils.embedding as embedding
-import yaml
-import os
+import utils.vector_params as vector_params
+import utils.vector_index as vector_index
+import utils.vector_engine as vector_engine
+import utils.query_validator as query_validator
+import utils.prompts as prompts
+import utils.tracing as tracing
+from concurrent.futures import ThreadPoolExecutor
 import langchain
-from langchain_community.vectorstores import FAISS
-from langchain_core.example_selectors import SemanticSimilarityExampleSelector
-from langchain_openai import OpenAIEmbeddings
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-#from operator import itemgetter
 #from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
-from sqlalchemy import create_engine
 from langchain_core.tools import tool
-from langchain_core.prompts import FewShotPromptTemplate
-from langchain_core.prompts import PromptTemplate
 
 from langchain.chains import create_sql_query_chain
 #from langchain_core.messages import AIMessage
@@ -26,171 +22,136 @@ from langchain.chains import create_sql_query_chain
 #     RunnablePassthrough,
 # )
 import my_db_specifics as my_db_specifics
+from utils.app_context import get_context
+from utils.query_result import QueryResult, fetch_result
+from utils.result_compactor import answer_token_budget, compact_result
+from utils.result_cache import result_cache
 
-with open("config.yaml", "r") as stream:
-    try:
-        PARAM = yaml.safe_load(stream)
-    except yaml.YAMLError as exc:
-        print(exc)
+logger = logging.getLogger(__name__)
 
 langchain.debug = False
-engine = create_engine('duckdb:///' + PARAM['drugdb_path'])
-db = SQLDatabase(engine=engine, view_support=True)
-#print(db.dialect)
-print(db.get_usable_table_names())
-
-for c in my_db_specifics.initialization_commands:
-    db.run(c)
-
 
-# Set up your OpenAI API key
-os.environ["OPENAI_API_KEY"] = PARAM['openai_api']
-llm = ChatOpenAI(model_name="gpt-4o-mini")
+# The database, the LLM client and the chains are created by the app context on first use
 # os.environ["LANGCHAIN_TRACING_V2"] = "true"
 # os.environ["LANGSMITH_ENDPOINT"] = "https://api.smith.langchain.com"
 # os.environ["LANGCHAIN_API_KEY"] = PARAM['langsmith_api']
 # os.environ["LANGCHAIN_PROJECT"] = "default"
 
-@tool
-def SQL_QueryTool(my_question: str, limit: int = 20) -> str:
-    """Use the SQL route to get the answer from the database"""
-    print ("my_question", my_question)
-    print ("limit", limit)
+def explain_query(query):
+    """Return the DuckDB error of planning a query with EXPLAIN on a pooled connection, or None if it compiles"""
+    try:
+        parameters = vector_params.bind_embeddings(query)
+    except ValueError as e:
+        return str(e)
+    with get_context().pool.connection() as connection:
+        return query_validator.explain_error(connection, query, parameters)
 
-    database_description = my_db_specifics.sql_database_prompt
-    
-    examples = my_db_specifics.sql_examples
 
+def validate_query(query, limit, single_line=False):
+    """
+    Fix the common mistakes of a generated query locally.
 
-    example_selector = SemanticSimilarityExampleSelector.from_examples(
-        examples,
-        OpenAIEmbeddings(),
-        FAISS,
-        k=5,
-        input_keys=["input"],
-    )
+    Whether DuckDB can plan the query is checked once, by the EXPLAIN
+    pre-flight in query_repair, which is also the only step that sends a
+    failing query back to the LLM.
 
-    example_prompt = PromptTemplate.from_template("User input: {input}\nSQL query: {query}")
-    sql_generation_prompt = FewShotPromptTemplate(
-        example_selector=example_selector,
-        example_prompt=example_prompt,
-        prefix="You are a {dialect} expert. Given an input question, create a syntactically correct DuckDB query to run. Unless otherwise specificed, do not return more than {top_k} rows.\n\nHere is the relevant table info: {table_info}\n\nBelow are a number of examples of questions and their corresponding SQL queries.",
-        suffix="User input: {input}\nSQL query: ",
-        input_variables=["input", "top_k", "table_info"],
-    )
+    Args:
+        query (str): The generated query
+        limit (int): The row limit to enforce
+        single_line (bool): Replace newlines with spaces (for graph queries)
 
-    write_query = create_sql_query_chain(llm, db, sql_generation_prompt)
-    #write_query = create_sql_query_chain(llm, db)
-    print ("write_query", write_query)
+    Returns:
+        str: The fixed query
+    """
+    query, fixes = query_validator.normalize_query(query, limit, single_line=single_line)
+    if fixes:
+        logger.info("local query fixes: %s", fixes)
+    return query
 
 
+def sql_chain():
+    """
+    Return the SQL write chain.
 
-    system = f"""
-    Double check the user's {db.dialect} query for common mistakes, including:
-    - If the search term contains a single quote, it should be escaped with another single quote. For example, 'Alzheimer's Disease' should be 'Alzheimer''s Disease'.
-    - Only return SQL Query not anything else like ```sql ... ```
-    - Using NOT IN with NULL values
-    - Using UNION when UNION ALL should have been used
-    - Using BETWEEN for exclusive ranges
-    - Data type mismatch in predicates\
-    - Using the correct number of arguments for functions
-    - Casting to the correct data type
-    - Using the proper columns for joins
-    - Write a LIMIT {limit} clause at the end of the query.
-    - Never write 'LIMIT 0', instead, remove the LIMIT clause entirely.
-    - Make sure all parentheses are balanced.
-    - Ends with a semicolon
+    It is built once, on first use, loading (or building once) the few-shot
+    example index; the per-call limit is passed as the top_k input.
+    """
+    def build():
+        context = get_context()
+        selector = tracing.TracedExampleSelector(context.example_selectors["sql"], "sql.example_selection")
+        return create_sql_query_chain(context.llm, context.db, prompts.sql_generation_prompt(selector))
 
-    If there are any of the above mistakes, rewrite the query.
-    If there are no mistakes, just reproduce the original query with no further commentary.
+    return get_context().resource("sql_chain", build)
 
-    Output the final SQL query only."""
 
+def graph_chain():
+    """Return the graph generation chain, built once on first use like sql_chain"""
+    def build():
+        # Generation and validation instructions go to the LLM in one call
+        selector = tracing.TracedExampleSelector(get_context().example_selectors["graph"], "graph.example_selection")
+        return (
+            prompts.graph_validation_inputs(prompts.graph_generation_prompt(selector))
+            | prompts.graph_validation_prompt
+            | get_context().llm
+            | StrOutputParser()
+        )
 
-    validation_prompt = ChatPromptTemplate.from_messages(
-        [("system", system), ("human", "{query}")]
-    )
+    return get_context().resource("graph_chain", build)
 
 
-    generate_query = (
-        write_query
-        | validation_prompt | llm | StrOutputParser()
-    )
-    
-    sql_query = generate_query.invoke({"question": my_question, "top_k": limit, "table_info": database_description})
-    
+@tool
+def SQL_QueryTool(my_question: str, limit: int = 20) -> str:
+    """Use the SQL route to get the answer from the database"""
+    with tracing.span("sql.write", limit=limit):
+        sql_query = sql_chain().invoke({"question": my_question, "top_k": limit, "table_info": my_db_specifics.sql_database_prompt})
+    with tracing.span("sql.validate"):
+        sql_query = validate_query(sql_query, limit)
+
     return sql_query
 
 @tool
 def Graph_QueryTool(my_question: str, limit: int = 20) -> str:
     """Use the graph query language route to get the answer from the database. Only suitable for questions that involve the interrelationship between the Drugs, Disorders, and MOA tables."""
 
-    print ("my_question", my_question)
-    print ("limit", limit)
-    database_description = my_db_specifics.graph_database_prompt
-    
-    examples = my_db_specifics.graph_examples
-
-    example_selector = SemanticSimilarityExampleSelector.from_examples(
-        examples,
-        OpenAIEmbeddings(),
-        FAISS,
-        k=5,
-        input_keys=["input"],
-    )
-
-    example_prompt = PromptTemplate.from_template("User input: {input}\graph query: {query}")
-
-    pgq_generation_prompt = FewShotPromptTemplate(
-        example_selector=example_selector,
-        example_prompt=example_prompt,
-        prefix="Forget the previous answer. You are a graph expert. Given an input question, create a syntactically correct graph query to run. \n\nHere is the relevant table info: {table_info}\n\nBelow are a number of examples of questions and their corresponding graph queries.",
-        suffix="User input: {input}\ngraph query: ",
-        input_variables=["input", "table_info", "top_k"],
-    )
-
-    system = f"""
-    DuckPGQ is very similar to Cypher. But there are some differences.
-    Double check the user's DuckPGQ graph query for common mistakes, including:
-    - If the search term contains a single quote, it should be escaped with another single quote. For example, 'Alzheimer's Disease' should be 'Alzheimer''s Disease'.
-    - It must start with "FROM GRAPH_TABLE (drug_graph" before the MATCH clause. It ends with a closing parenthesis before the LIMIT clause.
-    - Only return graph qery not anything else like ```sql ... ```
-    - Every variable in the graph pattern has to be bound by a variable. For example, (i:Drug)-[:MAY_TREAT]->(c:Disorder WHERE c.name = 'Alzheimer''s Disease') is not correct because :MAY_TREAT is not bound to a variable. Instead, it should be (i:Drug)-[m:MAY_TREAT]->(c:Disorder WHERE c.name = 'Alzheimer''s Disease').
-    - Use "COLUMNS" as the return statement in the graph query.
-    - Replace all '\n' with a space.
-    - Write a LIMIT {limit} clause at the end of the query.
-    - Never write 'LIMIT 0', instead, remove the LIMIT clause entirely but not the closing parenthesis before it, because that closing parenthesis belongs to the COLUMNS () clause.
-    - Make sure all parentheses are balanced.
+    with tracing.span("graph.write", limit=limit):
+        graph_query = graph_chain().invoke({"input": my_question, "table_info": my_db_specifics.graph_database_prompt, "top_k": limit})
+    with tracing.span("graph.validate"):
+        graph_query = validate_query(graph_query, limit, single_line=True)
+    logger.debug("graph query: %s", graph_query)
+    return graph_query
 
-    - Ends with a semicolon
 
-    If there are any of the above mistakes, rewrite the query.
-    If there are no mistakes, just reproduce the original query with no further commentary.
+async def _asql_query(my_question: str, limit: int = 20) -> str:
+    with tracing.span("sql.write", limit=limit):
+        sql_query = await sql_chain().ainvoke({"question": my_question, "top_k": limit, "table_info": my_db_specifics.sql_database_prompt})
+    with tracing.span("sql.validate"):
+        return validate_query(sql_query, limit)
 
-    Output the final graph query only."""
 
-    validation_prompt = ChatPromptTemplate.from_messages(
-        [("system", system), ("human", "{query}")]
-    )
+async def _agraph_query(my_question: str, limit: int = 20) -> str:
+    with tracing.span("graph.write", limit=limit):
+        graph_query = await graph_chain().ainvoke({"input": my_question, "table_info": my_db_specifics.graph_database_prompt, "top_k": limit})
+    with tracing.span("graph.validate"):
+        return validate_query(graph_query, limit, single_line=True)
 
-    generate_query = (
-        pgq_generation_prompt
-        | validation_prompt
-        | llm | StrOutputParser()
-    )
 
-    graph_query = generate_query.invoke({"input": my_question, "table_info": database_description, "top_k": limit})
-    print ("graph_query", graph_query)
-    return graph_query
+# The async bodies of the LLM tools, used by tool.ainvoke in the asyncio pipeline; the full-text
+# and vector tools have none, LangChain runs their sync bodies on its executor
+SQL_QueryTool.coroutine = _asql_query
+Graph_QueryTool.coroutine = _agraph_query
 
 
 @tool
 def Fulltext_QueryTool(my_question: str, original_query: str, limit: int = 20) -> str:
     """Use the full text search to get the trials from the database. Only suitable for questions that involve the StudyTitle. Use this tool when users question does not read like a sentence and looks like some keywords instead. Keep the original query for the user's reference. And keep all the operators such as &, |, and ! in the query."""
-    print ("original_query", original_query)
     field_with_full_text_search = "StudyTitle"
 
-    generate_query = my_db_specifics.full_text_search_query_template.format(original_query=original_query.replace("'", "''"), field=field_with_full_text_search, limit=limit)
+    logger.debug("full-text terms: %s", original_query)
+    with tracing.span("fulltext.build", limit=limit):
+        generate_query = my_db_specifics.full_text_search_query_template.format(original_query=original_query.replace("'", "''"), field=field_with_full_text_search, limit=limit)
+        if limit <= 0:
+            # All results: normalize_query drops the template's LIMIT 0
+            generate_query = query_validator.normalize_query(generate_query, limit)[0]
 
     # print ("Fulltext_QueryTool, query", query)
     # system = """
@@ -222,34 +183,94 @@ def Fulltext_QueryTool(my_question: str, original_query: str, limit: int = 20) -
 def Vector_QueryTool(my_question: str, limit: int = 20) -> str:
     """Use the vector search to get the disorder from the database. Only suitable for questions that involve the definition of disorder."""
     
-    question_embedding = embedding.get_embedding(my_question)
+    if vector_engine.backend() == "numpy":
+        get_context().pool  # opening the pool exports the embeddings if needed
+        with tracing.span("vector.embed"):
+            question_embedding = embedding.get_embedding(my_question)
+        with tracing.span("vector.search"):
+            engine = vector_engine.load_engine()
+            # A limit of 0 or less ranks every disorder
+            disorder_cuis = engine.search([question_embedding], limit if limit > 0 else len(engine.ids))[0]
+        return my_db_specifics.vector_search_by_cui_query_template.format(disorder_cuis=disorder_cuis)
+
+    # Warm the embedding cache now; the vector itself is bound as a parameter at execution
+    with tracing.span("vector.embed"):
+        embedding.get_embedding(my_question)
+    question_embedding = vector_params.embedding_placeholder(my_question)
     
-    vector_response = my_db_specifics.vector_search_query_template.format(question_embedding=question_embedding, limit=limit)
+    vector_response = my_db_specifics.vector_search_query_template.format(distance_function=vector_index.distance_function(), question_embedding=question_embedding, limit=limit)
+    if limit <= 0:
+        vector_response = query_validator.normalize_query(vector_response, limit)[0]
     
     return vector_response
 
 
 
-def execute_query(my_question, confirmed_query):
-    execute_result = db.run(confirmed_query)
-    #print (execute_result)
-    #print (len(execute_result))
+def run_query(query):
+    """Run a query on a pooled connection, binding any embedding placeholders as prepared-statement parameters"""
+    with tracing.span("db.run") as span:
+        query_result = result_cache().get(query)
+        if query_result is None:
+            parameters = vector_params.bind_embeddings(query)
+            with get_context().pool.connection() as connection:
+                query_result = fetch_result(connection, query, parameters)
+            result_cache().put(query, query_result)
+            span.set(cache_hit=False)
+        else:
+            span.set(cache_hit=True)
+        span.set(rows=query_result.row_count, result_bytes=query_result.nbytes)
+    return query_result
+
+
+def run_queries(queries):
+    """Run several confirmed queries concurrently; the connection pool bounds how many execute at once"""
+    if len(queries) == 1:
+        return [run_query(queries[0])]
+    with ThreadPoolExecutor(max_workers=min(len(queries), get_context().pool.size)) as executor:
+        futures = [executor.submit(tracing.in_context(run_query), query) for query in queries]
+        return [future.result() for future in futures]
+
+
+def answer_chain():
+    """Return the answer chain, built once on first use"""
+    return get_context().resource("answer_chain", lambda: prompts.answer_prompt | get_context().llm | StrOutputParser())
+
+
+def _compact_results(query_results):
+    """Compact one result, or several results that share the answer token budget, for the answer LLM"""
+    if isinstance(query_results, QueryResult):
+        return compact_result(query_results)
+    budget = answer_token_budget() // len(query_results)
+    return "\n\n".join(
+        f"Result of query {i}:\n{query_result.query}\n{compact_result(query_result, budget)}"
+        for i, query_result in enumerate(query_results, start=1)
+    )
+
+
+def _has_rows(query_results):
+    if isinstance(query_results, QueryResult):
+        return query_results.row_count > 0
+    return any(query_result.row_count > 0 for query_result in query_results)
 
-    if len(execute_result) == 0:
+
+def answer_query(my_question, query_result):
+    """Turn the rows of one executed query, or of several, into a single human readable answer"""
+    if not _has_rows(query_result):
         return "No results found."
 
-    answer_prompt = PromptTemplate.from_template(
-        """Given the Question {question} and the query_result {query_result}, format the results into sentences or a table for the human to understand. 
-        Don't add any data or facts outside of the query_result. 
-    """
-    )
+    final_response = answer_chain().invoke({"question": my_question, "query_result": _compact_results(query_result)})
 
-    formulate_human_readable_answer = (
-      answer_prompt
-      | llm
-      | StrOutputParser()
-    )
+    return final_response
+
+
+def stream_answer(my_question, query_result):
+    """Like answer_query, but yield the answer token by token as the LLM produces it"""
+    if not _has_rows(query_result):
+        yield "No results found."
+        return
 
-    final_response = formulate_human_readable_answer.invoke({"question": my_question, "query_result": execute_result})
+    yield from answer_chain().stream({"question": my_question, "query_result": _compact_results(query_result)})
 
-    return final_response
\ No newline at end of file
+
+def execute_query(my_question, confirmed_query):
+    return answer_query(my_question, run_query(confirmed_query))
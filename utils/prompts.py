@@ -0,0 +1,101 @@
+# File: utils/prompts.py
+
+from langchain_core.example_selectors import BaseExampleSelector
+from langchain_core.prompts import ChatPromptTemplate, FewShotPromptTemplate, PromptTemplate
+from langchain_core.runnables import Runnable, RunnableLambda
+
+# The prompts are built once per process; per-call values such as limit are prompt inputs
+
+sql_example_prompt = PromptTemplate.from_template("User input: {input}\nSQL query: {query}")
+
+SQL_GENERATION_PREFIX = "You are a {dialect} expert. Given an input question, create a syntactically correct DuckDB query to run. Unless otherwise specificed, do not return more than {top_k} rows.\n\nHere is the relevant table info: {table_info}\n\nBelow are a number of examples of questions and their corresponding SQL queries."
+SQL_GENERATION_SUFFIX = "User input: {input}\nSQL query: "
+
+sql_validation_system = """
+    Double check the user's {dialect} query for common mistakes, including:
+    - If the search term contains a single quote, it should be escaped with another single quote. For example, 'Alzheimer's Disease' should be 'Alzheimer''s Disease'.
+    - Only return SQL Query not anything else like ```sql ... ```
+    - Using NOT IN with NULL values
+    - Using UNION when UNION ALL should have been used
+    - Using BETWEEN for exclusive ranges
+    - Data type mismatch in predicates\
+    - Using the correct number of arguments for functions
+    - Casting to the correct data type
+    - Using the proper columns for joins
+    - Write a LIMIT {limit} clause at the end of the query.
+    - Never write 'LIMIT 0', instead, remove the LIMIT clause entirely.
+    - Make sure all parentheses are balanced.
+    - Ends with a semicolon
+
+    If there are any of the above mistakes, rewrite the query.
+    If there are no mistakes, just reproduce the original query with no further commentary.
+
+    Output the final SQL query only."""
+
+sql_validation_prompt = ChatPromptTemplate.from_messages(
+    [("system", sql_validation_system), ("human", "{query}")]
+)
+
+graph_example_prompt = PromptTemplate.from_template("User input: {input}\\graph query: {query}")
+
+GRAPH_GENERATION_PREFIX = "Forget the previous answer. You are a graph expert. Given an input question, create a syntactically correct graph query to run. \n\nHere is the relevant table info: {table_info}\n\nBelow are a number of examples of questions and their corresponding graph queries."
+GRAPH_GENERATION_SUFFIX = "User input: {input}\ngraph query: "
+
+graph_validation_system = """
+    DuckPGQ is very similar to Cypher. But there are some differences.
+    Double check the user's DuckPGQ graph query for common mistakes, including:
+    - If the search term contains a single quote, it should be escaped with another single quote. For example, 'Alzheimer's Disease' should be 'Alzheimer''s Disease'.
+    - It must start with "FROM GRAPH_TABLE (drug_graph" before the MATCH clause. It ends with a closing parenthesis before the LIMIT clause.
+    - Only return graph qery not anything else like ```sql ... ```
+    - Every variable in the graph pattern has to be bound by a variable. For example, (i:Drug)-[:MAY_TREAT]->(c:Disorder WHERE c.name = 'Alzheimer''s Disease') is not correct because :MAY_TREAT is not bound to a variable. Instead, it should be (i:Drug)-[m:MAY_TREAT]->(c:Disorder WHERE c.name = 'Alzheimer''s Disease').
+    - Use "COLUMNS" as the return statement in the graph query.
+    - Replace all '\n' with a space.
+    - Write a LIMIT {limit} clause at the end of the query.
+    - Never write 'LIMIT 0', instead, remove the LIMIT clause entirely but not the closing parenthesis before it, because that closing parenthesis belongs to the COLUMNS () clause.
+    - Make sure all parentheses are balanced.
+
+    - Ends with a semicolon
+
+    If there are any of the above mistakes, rewrite the query.
+    If there are no mistakes, just reproduce the original query with no further commentary.
+
+    Output the final graph query only."""
+
+graph_validation_prompt = ChatPromptTemplate.from_messages(
+    [("system", graph_validation_system), ("human", "{query}")]
+)
+
+answer_prompt = PromptTemplate.from_template(
+    """Given the Question {question} and the query_result {query_result}, format the results into sentences or a table for the human to understand.
+        Don't add any data or facts outside of the query_result.
+    """
+)
+
+
+def sql_generation_prompt(example_selector: BaseExampleSelector) -> FewShotPromptTemplate:
+    """Build the few-shot SQL generation prompt around an example selector"""
+    return FewShotPromptTemplate(
+        example_selector=example_selector,
+        example_prompt=sql_example_prompt,
+        prefix=SQL_GENERATION_PREFIX,
+        suffix=SQL_GENERATION_SUFFIX,
+        input_variables=["input", "top_k", "table_info"],
+    )
+
+
+def graph_generation_prompt(example_selector: BaseExampleSelector) -> FewShotPromptTemplate:
+    """Build the few-shot graph query generation prompt around an example selector"""
+    return FewShotPromptTemplate(
+        example_selector=example_selector,
+        example_prompt=graph_example_prompt,
+        prefix=GRAPH_GENERATION_PREFIX,
+        suffix=GRAPH_GENERATION_SUFFIX,
+        input_variables=["input", "table_info", "top_k"],
+    )
+
+
+def graph_validation_inputs(generation_prompt: FewShotPromptTemplate) -> Runnable:
+    """Render the graph generation prompt as the {query} of the validation prompt, passing top_k on as limit"""
+    return RunnableLambda(
+        lambda inputs: {"query": generation_prompt.format(**inputs), "limit": inputs["top_k"]}
+    )
@@ -1,36 +1,173 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.runnables import Runnable
-from utils.my_langchain_tools import *
+from utils.my_langchain_tools import SQL_QueryTool, Graph_QueryTool, Fulltext_QueryTool, Vector_QueryTool
+from utils.app_context import get_context, setting
 from langchain_core.messages import AIMessage
+from utils.semantic_cache import semantic_cache
+import utils.router as local_router
+from utils.query_repair import preflight
+import utils.query_validator as query_validator
+import utils.tracing as tracing
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Tool calls of one routing response are generated concurrently, each within tool_timeout_s()
+def tool_timeout_s():
+    """Seconds one tool call may take to get a worker, and again to generate its query"""
+    return setting("tool_timeout_s", 60)
+
+def tool_executor():
+    """Return the executor all sessions share for tool calls, created on first use"""
+    return get_context().resource(
+        "tool_executor",
+        lambda: ThreadPoolExecutor(max_workers=setting("tool_workers", 4), thread_name_prefix="tool"),
+    )
 
-llm = ChatOpenAI(model_name="gpt-4o-mini")
 tools = [SQL_QueryTool, Graph_QueryTool, 
          Fulltext_QueryTool, Vector_QueryTool]
+tool_map = {tool.name: tool for tool in tools}
 
 ## chain as tool chooser
-llm_with_tools = llm.bind_tools(tools)
-tool_map = {tool.name: tool for tool in tools}
+def llm_with_tools():
+    """Return the shared chat model with the tools bound, created on first use"""
+    return get_context().resource("llm_with_tools", lambda: get_context().llm.bind_tools(tools))
+
+def normalize_tool_args(args):
+    """Fill in original_query and limit, which the routing LLM may leave out"""
+    if not isinstance(args, dict):
+        return args
+    return {
+        "my_question": args.get("my_question"),
+        "original_query": args.get("original_query", args.get("my_question")),
+        "limit": args.get("limit", 20)
+    }
 
 def call_tools(msg: AIMessage) -> Runnable:
-    """Tool calling helper that preserves original query"""
-    # print ("hello, I am in call_tools", msg)
+    """
+    Tool calling helper that preserves original query.
+
+    The tool calls of one routing response run concurrently on tool_executor,
+    which all sessions share. Each call gets tool_timeout_s() from the moment
+    a worker starts it, and at most as long to get a worker: a call still
+    queued then is cancelled. A call that fails or times out is dropped; the
+    error is only raised if no call produced a query.
+
+    A running call cannot be cancelled. After its timeout it is abandoned and
+    keeps its worker until the tool returns.
+    """
     tool_calls = msg.tool_calls.copy()
 
-    #print ("tool_call", tool_calls)
+    submitted = []
     for tool_call in tool_calls:
-        print ("tool_call in the for loop", tool_call)
-        # print ("tool_call args", tool_call.get("args"), type(tool_call.get("args")))
-        if isinstance(tool_call.get("args"), dict):
-            tool_call["args"] = {
-                "my_question": tool_call.get("args").get("my_question"),
-                "original_query": tool_call.get("args").get("original_query", tool_call.get("args").get("my_question")),
-                "limit": tool_call.get("args").get("limit", 20)
-            }
-        print ('tool_call["args"]', tool_call["args"])
-        tool_call["output"] = tool_map[tool_call["name"]].invoke(tool_call["args"])
-    return tool_calls
-
-generator = llm_with_tools | call_tools
+        tool_call["args"] = normalize_tool_args(tool_call.get("args"))
+        logger.debug("tool call %s: %s", tool_call["name"], tool_call["args"])
+        submitted.append(_submit_tool(tool_call["name"], tool_call["args"]))
+
+    timeout_s = tool_timeout_s()
+    queue_deadline = time.monotonic() + timeout_s
+    completed, first_error = [], None
+    for tool_call, (future, started) in zip(tool_calls, submitted):
+        try:
+            if not started["event"].wait(timeout=max(0.0, queue_deadline - time.monotonic())) and future.cancel():
+                raise TimeoutError(f"{tool_call['name']} got no tool worker within {timeout_s} s")
+            started["event"].wait()
+            remaining = started["at"] + timeout_s - time.monotonic()
+            tool_call["output"] = future.result(timeout=max(0.0, remaining))
+        except Exception as e:
+            if isinstance(e, FuturesTimeoutError):
+                e = TimeoutError(f"{tool_call['name']} did not finish within {timeout_s} s, abandoned")
+            logger.warning("tool call %s failed: %s", tool_call["name"], e)
+            first_error = first_error or e
+            continue
+        completed.append(tool_call)
+
+    if not completed and first_error is not None:
+        raise first_error
+    return completed
+
+
+def _submit_tool(tool_name, args):
+    """Submit a tool call to tool_executor; the returned dict gets the time the call started running"""
+    started = {"event": threading.Event(), "at": None}
+
+    def run():
+        started["at"] = time.monotonic()
+        started["event"].set()
+        return _run_tool(tool_name, args)
+
+    return tool_executor().submit(tracing.in_context(run)), started
+
+def _run_tool(tool_name, args):
+    with tracing.span(f"tool.{tool_name}"):
+        return tool_map[tool_name].invoke(args)
+
+async def _arun_tool(tool_name, args):
+    with tracing.span(f"tool.{tool_name}"):
+        return await tool_map[tool_name].ainvoke(args)
+
+
+def cached_tool_call(prompt: str, cached: dict) -> dict:
+    """Turn a semantic cache hit into a tool call, with the row limit the new question asks for"""
+    limit = local_router.question_limit(prompt)
+    return {
+        "name": cached["tool_name"],
+        "args": {"my_question": prompt, "original_query": prompt, "limit": limit},
+        "id": "semantic_cache",
+        "output": query_validator.apply_limit(
+            cached["query"], limit, single_line=cached["tool_name"] == "Graph_QueryTool"
+        ),
+    }
+
+
+def generate(prompt: str) -> list:
+    """
+    Generate the tool calls for a prompt with as few LLM calls as possible.
+
+    A near-duplicate earlier question reuses its confirmed query, a clear-cut
+    question goes straight to its tool, and only the rest ask the LLM router.
+    Every query then passes the EXPLAIN pre-flight, which repairs queries that
+    do not compile before they reach the confirmation UI.
+    """
+    started = time.perf_counter()
+    with tracing.span("generate"):
+        return preflight(_tool_calls(prompt), started)
+
+
+def _tool_calls(prompt: str) -> list:
+    with tracing.span("semantic_cache") as span:
+        cached = semantic_cache().lookup(prompt)
+        span.set(hit=cached is not None)
+        if cached is not None:
+            span.set(similarity=cached["similarity"])
+    if cached is not None:
+        logger.info("semantic cache hit (%.3f): %s", cached["similarity"], cached["question"])
+        return [cached_tool_call(prompt, cached)]
+
+    routed = None
+    if local_router.enabled():
+        with tracing.span("local_router") as span:
+            routed = local_router.router().route(prompt)
+            span.set(hit=routed is not None)
+            if routed is not None:
+                span.set(tool=routed[0])
+    if routed is not None:
+        tool_name, args = routed
+        logger.debug("local router: %s %s", tool_name, args)
+        return [{
+            "name": tool_name,
+            "args": args,
+            "id": "local_router",
+            "output": _run_tool(tool_name, args),
+        }]
+
+    with tracing.span("route"):
+        message = llm_with_tools().invoke(prompt)
+    with tracing.span("call_tools") as span:
+        span.set(tool_calls=len(message.tool_calls))
+        return call_tools(message)
 
 
 ## Not working
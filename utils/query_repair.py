@@ -0,0 +1,187 @@
+# File: utils/query_repair.py
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import openai
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+import my_db_specifics
+import utils.query_validator as query_validator
+import utils.tracing as tracing
+from utils.app_context import get_context, setting
+from utils.my_langchain_tools import explain_query
+
+logger = logging.getLogger(__name__)
+
+
+def preflight_executor() -> ThreadPoolExecutor:
+    """The executor on which the queries of one multi-call routing response are checked and repaired side by side"""
+    return get_context().resource(
+        "preflight_executor",
+        lambda: ThreadPoolExecutor(max_workers=setting("tool_workers", 4), thread_name_prefix="preflight"),
+    )
+
+
+# Only LLM-written queries are repaired; the full-text and vector queries come from templates
+REPAIRABLE_TOOLS = {
+    "SQL_QueryTool": ("DuckDB SQL", my_db_specifics.sql_database_prompt),
+    "Graph_QueryTool": ("DuckPGQ graph", my_db_specifics.graph_database_prompt),
+}
+
+repair_prompt = ChatPromptTemplate.from_messages([
+    ("system", """You fix {language} queries that DuckDB rejected.
+Here is the relevant table info: {table_info}
+
+Rewrite the query so that it answers the question and DuckDB can run it. Keep everything that is not related to the error.
+Output the corrected query only, without ``` fences or commentary."""),
+    ("human", "Question: {question}\n\nQuery:\n{query}\n\nDuckDB error:\n{error}"),
+])
+
+
+def repair_chain(timeout_s: float):
+    """
+    Return the repair chain with its LLM call limited to timeout_s seconds.
+
+    It uses the shared chat model. The client retries a call that timed out,
+    so each attempt gets its share of timeout_s and the retries together
+    stay within it.
+    """
+    llm = get_context().llm
+    retries = getattr(llm, "max_retries", 0)
+    if retries is None:
+        retries = openai.DEFAULT_MAX_RETRIES
+    return repair_prompt | llm.bind(timeout=timeout_s / (retries + 1)) | StrOutputParser()
+
+
+class PreflightStats:
+    """Counters of the pre-flight checks and the time until the first query that compiles"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {"checked": 0, "valid_first_try": 0, "repaired": 0, "failed": 0, "repair_calls": 0}
+        self._first_valid_ms = []
+
+    def record(self, attempts: int, valid: bool, first_valid_ms: float) -> None:
+        with self._lock:
+            self.stats["checked"] += 1
+            self.stats["repair_calls"] += attempts
+            if not valid:
+                self.stats["failed"] += 1
+                return
+            self.stats["repaired" if attempts else "valid_first_try"] += 1
+            self._first_valid_ms.append(first_valid_ms)
+
+    def info(self) -> Dict[str, Any]:
+        """Return the counters and the average time-to-first-valid-query in milliseconds"""
+        with self._lock:
+            timings = self._first_valid_ms
+            return {
+                **self.stats,
+                "avg_time_to_valid_query_ms": sum(timings) / len(timings) if timings else 0.0,
+                "max_time_to_valid_query_ms": max(timings) if timings else 0.0,
+            }
+
+
+preflight_stats = PreflightStats()
+
+
+def repair_query(tool_name: str, question: str, query: str, error: str, limit: int, timeout_s: float) -> str:
+    """
+    Ask the LLM to fix a query given the DuckDB error it produced.
+
+    Args:
+        tool_name (str): The tool that generated the query
+        question (str): The user question the query answers
+        query (str): The failing query
+        error (str): The DuckDB error message
+        limit (int): The row limit to keep
+        timeout_s (float): Seconds the LLM call may take, the rest of the repair budget
+
+    Returns:
+        str: The repaired and locally normalized query
+    """
+    language, table_info = REPAIRABLE_TOOLS[tool_name]
+    repaired = repair_chain(timeout_s).invoke({
+        "language": language,
+        "table_info": table_info,
+        "question": question,
+        "query": query,
+        "error": error,
+    })
+    return query_validator.normalize_query(repaired, limit, single_line=tool_name == "Graph_QueryTool")[0]
+
+
+def preflight(tool_calls: List[Dict[str, Any]], started: float) -> List[Dict[str, Any]]:
+    """
+    Check every generated query with EXPLAIN before it is shown for confirmation.
+
+    A failing query of the SQL or graph tool is repaired with the DuckDB error,
+    up to repair_max_attempts times within repair_time_budget_s; each repair
+    call gets what is left of the budget as its timeout. Each tool call
+    gets a "preflight" entry with the outcome, the remaining error (if any),
+    the repair attempts and the time-to-first-valid-query.
+
+    Args:
+        tool_calls (List[Dict[str, Any]]): The tool calls with their generated query in "output"
+        started (float): time.perf_counter() when generation of the question began
+
+    Returns:
+        List[Dict[str, Any]]: The same tool calls, with repaired queries where needed
+    """
+    with tracing.span("preflight"):
+        if len(tool_calls) > 1:
+            futures = [
+                preflight_executor().submit(tracing.in_context(_preflight_one), tool_call, started)
+                for tool_call in tool_calls
+            ]
+            for future in futures:
+                future.result()
+        else:
+            for tool_call in tool_calls:
+                _preflight_one(tool_call, started)
+    return tool_calls
+
+
+def _preflight_one(tool_call: Dict[str, Any], started: float) -> None:
+    query = tool_call["output"]
+    args = tool_call.get("args") or {}
+    error = explain_query(query)
+    attempts = 0
+
+    # How often a query that fails EXPLAIN is sent back to the LLM with the error, and for how long
+    max_attempts = setting("repair_max_attempts", 2)
+    deadline = time.perf_counter() + setting("repair_time_budget_s", 20)
+    while (
+        error is not None
+        and tool_call["name"] in REPAIRABLE_TOOLS
+        and attempts < max_attempts
+        and time.perf_counter() < deadline
+    ):
+        attempts += 1
+        logger.info("pre-flight failed, repair attempt %d: %s", attempts, error)
+        try:
+            with tracing.span("repair", attempt=attempts):
+                query = repair_query(
+                    tool_call["name"], args.get("my_question", ""), query, error, args.get("limit", 20),
+                    timeout_s=deadline - time.perf_counter(),
+                )
+        except Exception as e:
+            # A timed-out or failed repair keeps the last query and its DuckDB error
+            logger.warning("repair attempt %d failed: %s", attempts, e)
+            break
+        error = explain_query(query)
+
+    first_valid_ms = 1000 * (time.perf_counter() - started)
+    preflight_stats.record(attempts, error is None, first_valid_ms)
+    tool_call["output"] = query
+    tool_call["preflight"] = {
+        "valid": error is None,
+        "error": error,
+        "repair_attempts": attempts,
+        "time_to_valid_query_ms": first_valid_ms if error is None else None,
+    }
@@ -0,0 +1,102 @@
+# File: utils/query_result.py
+
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+import pyarrow as pa
+
+# Same cut-off LangChain's SQLDatabase.run applies to long strings
+MAX_STRING_LENGTH = 300
+
+
+@dataclass
+class QueryResult:
+    """
+    The rows of one executed query as an Arrow table, plus its metadata.
+
+    The table comes straight from DuckDB's native cursor and can be handed to
+    st.dataframe without a copy. to_llm_text() renders the compact form that is
+    sent to the answer LLM.
+    """
+
+    query: str
+    table: pa.Table
+
+    @property
+    def row_count(self) -> int:
+        return self.table.num_rows
+
+    @property
+    def columns(self) -> List[str]:
+        return self.table.column_names
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes
+
+    def metadata(self) -> Dict[str, Any]:
+        """Return the row count, column names and byte size of the result"""
+        return {"row_count": self.row_count, "columns": self.columns, "nbytes": self.nbytes}
+
+    def summary(self, max_rows: int) -> Dict[str, Any]:
+        """
+        Return the metadata plus a copy of the first rows, for keeping the result in the chat history.
+
+        take() copies the rows, so the summary does not keep the buffers of the
+        full table alive the way a slice would.
+
+        Args:
+            max_rows: How many rows the preview keeps
+
+        Returns:
+            Dict[str, Any]: The metadata, the query and the "preview" table
+        """
+        preview = self.table.take(pa.array(range(min(max_rows, self.row_count)), type=pa.int64()))
+        return {**self.metadata(), "query": self.query, "preview": preview}
+
+    def to_llm_text(self, table: pa.Table | None = None) -> str:
+        """
+        Serialize rows as a header line plus one pipe-separated line per row.
+
+        Args:
+            table: The rows to serialize, defaults to the whole result
+
+        Returns:
+            str: The compact text form of the rows
+        """
+        table = self.table if table is None else table
+        lines = [" | ".join(table.column_names)]
+        for row in zip(*(column.to_pylist() for column in table.columns)):
+            lines.append(" | ".join(format_value(value) for value in row))
+        return "\n".join(lines)
+
+
+def format_value(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    text = str(value).replace("\n", " ")
+    if len(text) > MAX_STRING_LENGTH:
+        text = text[:MAX_STRING_LENGTH - 3] + "..."
+    return text
+
+
+def fetch_result(connection: Any, query: str, parameters: Dict[str, Any] | None = None) -> QueryResult:
+    """
+    Run a query on a DuckDB connection and fetch the rows as Arrow.
+
+    Args:
+        connection: A DuckDB connection
+        query: The query to run
+        parameters: Named parameters for the prepared statement, if any
+
+    Returns:
+        QueryResult: The fetched rows and their metadata
+    """
+    cursor = connection.execute(query, parameters or None)
+    if cursor.description is None:
+        # Statements such as SET or CREATE produce no result set
+        return QueryResult(query=query, table=pa.table({}))
+    arrow = cursor.arrow()
+    # Newer DuckDB versions return a RecordBatchReader from .arrow()
+    table = arrow.read_all() if isinstance(arrow, pa.RecordBatchReader) else arrow
+    return QueryResult(query=query, table=table)
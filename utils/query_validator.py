@@ -0,0 +1,178 @@
+# File: utils/query_validator.py
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# String literals are left alone by every fix below
+_LITERAL = re.compile(r"('(?:[^']|'')*')")
+_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+_LABEL = re.compile(r"^\s*(?:SQL ?query|graph query|SQLQuery)\s*:\s*", re.IGNORECASE)
+# An apostrophe inside a word, e.g. Alzheimer's or O'Brien, that was not doubled
+_BARE_APOSTROPHE = re.compile(r"(?<=[A-Za-z])'(?=[A-Za-z])")
+# A quoted text whose in-word apostrophes may not be doubled yet: they do not end it
+_QUOTED_TEXT = re.compile(r"'(?:''|(?<=[A-Za-z])'(?=[A-Za-z])|[^'])*'")
+_LIMIT_ZERO = re.compile(r"\s+LIMIT\s+0\b", re.IGNORECASE)
+# The row limit clauses at the end of a query: LIMIT n [OFFSET m] or OFFSET m [LIMIT n]
+_LIMIT_TAIL = re.compile(
+    r"\b(?:LIMIT\s+\d+(?:\s+OFFSET\s+\d+)?|OFFSET\s+\d+(?:\s+LIMIT\s+\d+)?)\s*$", re.IGNORECASE
+)
+_LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+_OFFSET = re.compile(r"\bOFFSET\s+\d+", re.IGNORECASE)
+
+
+def normalize_query(query: str, limit: int, single_line: bool = False) -> Tuple[str, List[str]]:
+    """
+    Fix the common mistakes of generated queries locally.
+
+    Covers the checks the LLM validation pass is asked for that need no
+    understanding of the question: markdown fences, line comments,
+    unescaped apostrophes in string literals, LIMIT 0, a missing LIMIT,
+    unbalanced parentheses and a missing semicolon.
+
+    Args:
+        query (str): The generated query
+        limit (int): The row limit to enforce, 0 or less for none
+        single_line (bool): Replace newlines with spaces (wanted for graph queries)
+
+    Returns:
+        Tuple[str, List[str]]: The fixed query and a description of each fix applied
+    """
+    fixes = []
+
+    stripped = _LABEL.sub("", _FENCE.sub("", query.strip())).strip()
+    if stripped != query.strip():
+        fixes.append("removed markdown fences or labels")
+    query = stripped
+
+    # A trailing comment would swallow the LIMIT appended below, and every later line in single_line mode
+    without_comments = _strip_line_comments(query)
+    if without_comments != query:
+        fixes.append("removed line comments")
+        query = "\n".join(line.rstrip() for line in without_comments.splitlines()).strip()
+
+    escaped = _inside_literals(query, lambda text: _BARE_APOSTROPHE.sub("''", text))
+    if escaped != query:
+        fixes.append("escaped apostrophes inside string literals")
+        query = escaped
+
+    if single_line:
+        query = " ".join(query.split())
+
+    body = query.rstrip().rstrip(";").rstrip()
+
+    without_zero = _outside_literals(body, lambda part: _LIMIT_ZERO.sub("", part))
+    if without_zero != body:
+        fixes.append("removed LIMIT 0")
+        body = without_zero
+
+    tail = _LIMIT_TAIL.search(body)
+    if limit and limit > 0 and not (tail and _LIMIT.search(tail.group(0))):
+        separator = " " if single_line else "\n"
+        if tail:
+            # Only an OFFSET: the LIMIT has to come before it
+            body = f"{body[:tail.start()].rstrip()}{separator}LIMIT {limit} {tail.group(0).strip()}"
+        else:
+            body = f"{body}{separator}LIMIT {limit}"
+        fixes.append(f"added LIMIT {limit}")
+
+    missing = _parenthesis_balance(body)
+    if missing > 0:
+        # The missing parentheses almost always close the clause before the final LIMIT
+        match = _LIMIT_TAIL.search(body)
+        position = match.start() if match else len(body)
+        body = body[:position].rstrip() + ")" * missing + " " + body[position:]
+        body = body.rstrip()
+        fixes.append(f"closed {missing} parenthes{'is' if missing == 1 else 'es'}")
+
+    if not query.rstrip().endswith(";"):
+        fixes.append("added semicolon")
+    return body + ";", fixes
+
+
+def apply_limit(query: str, limit: int, single_line: bool = False) -> str:
+    """
+    Replace the row limit at the end of a query.
+
+    Used when a stored query answers a question that asks for a different
+    number of rows. An OFFSET is kept, and the query is then normalized like
+    a generated one.
+
+    Args:
+        query (str): The query
+        limit (int): The new row limit, 0 or less for none
+        single_line (bool): Replace newlines with spaces (wanted for graph queries)
+
+    Returns:
+        str: The query with the new limit
+    """
+    body = query.rstrip().rstrip(";").rstrip()
+    tail = _LIMIT_TAIL.search(body)
+    if tail:
+        offset = _OFFSET.search(tail.group(0))
+        body = body[:tail.start()].rstrip() + (f" {offset.group(0)}" if offset else "")
+    return normalize_query(body, limit, single_line)[0]
+
+
+def explain_error(connection: Any, query: str, parameters: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Parse, bind and plan a query with EXPLAIN without running it.
+
+    Args:
+        connection: A DuckDB connection with the extensions loaded
+        query (str): The query to check
+        parameters: Named parameters of the query, if any
+
+    Returns:
+        Optional[str]: The DuckDB error message, or None if the query compiles
+    """
+    try:
+        connection.execute("EXPLAIN " + query, parameters or None).fetchall()
+    except Exception as e:
+        return str(e)
+    return None
+
+
+def _outside_literals(query: str, fix) -> str:
+    parts = _LITERAL.split(query)
+    for i in range(0, len(parts), 2):
+        parts[i] = fix(parts[i])
+    return "".join(parts)
+
+
+def _strip_line_comments(query: str) -> str:
+    """Remove -- comments outside string literals, reading literals like _QUOTED_TEXT"""
+    out = []
+    i, in_literal = 0, False
+    while i < len(query):
+        char = query[i]
+        if in_literal:
+            out.append(char)
+            if char == "'":
+                if query.startswith("''", i):
+                    out.append("'")
+                    i += 1
+                elif not _BARE_APOSTROPHE.match(query, i):
+                    in_literal = False
+        elif char == "'":
+            out.append(char)
+            in_literal = True
+        elif query.startswith("--", i):
+            end = query.find("\n", i)
+            i = len(query) if end < 0 else end
+            continue
+        else:
+            out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def _inside_literals(query: str, fix) -> str:
+    """Apply fix to the text between the quotes of every string literal"""
+    return _QUOTED_TEXT.sub(lambda match: "'" + fix(match.group(0)[1:-1]) + "'", query)
+
+
+def _parenthesis_balance(query: str) -> int:
+    """Return how many more opening than closing parentheses appear outside literals"""
+    parts = _LITERAL.split(query)
+    code = "".join(parts[0::2])
+    return code.count("(") - code.count(")")
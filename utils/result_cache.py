@@ -0,0 +1,174 @@
+# File: utils/result_cache.py
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils.app_context import get_context
+from utils.query_result import QueryResult
+
+# String literals and quoted identifiers are kept verbatim, everything else is normalized
+_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+# Statements whose result only depends on the data, i.e. plain queries and graph pattern matches
+_READ_ONLY_START = {"select", "with", "from", "match"}
+_WRITE_KEYWORDS = re.compile(
+    r"\b(insert|update|delete|merge|create|drop|alter|copy|export|import|attach|detach|"
+    r"install|load|set|reset|pragma|call|checkpoint|vacuum|truncate|begin|commit|rollback)\b"
+)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query so that formatting differences map to the same cache key.
+
+    Whitespace is collapsed and everything outside quotes is case-folded
+    (DuckDB keywords and identifiers are case-insensitive). String literals
+    keep their exact content, and trailing semicolons are dropped.
+
+    Args:
+        query (str): The query text
+
+    Returns:
+        str: The normalized query text
+    """
+    parts = _QUOTED.split(query)
+    for i in range(0, len(parts), 2):
+        parts[i] = " ".join(parts[i].split()).lower()
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def is_read_only(query: str) -> bool:
+    """
+    Return whether a query only reads data, so that its result may be cached.
+
+    The statement must start with SELECT, WITH, FROM or a graph MATCH, be a
+    single statement and contain no keyword that writes or changes settings.
+    Keywords inside string literals and quoted identifiers do not count.
+
+    Args:
+        query (str): The query text
+
+    Returns:
+        bool: True if the result can be cached
+    """
+    parts = _QUOTED.split(query)
+    text = " ".join(_COMMENT.sub(" ", part) for part in parts[::2]).lower()
+    text = text.strip().rstrip(";")
+    if ";" in text:
+        return False
+    words = text.lstrip("( ").split(None, 1)
+    return bool(words) and words[0] in _READ_ONLY_START and not _WRITE_KEYWORDS.search(text)
+
+
+def database_version(path: str) -> Tuple:
+    """
+    Return a token that changes whenever the database file or its WAL changes.
+
+    Args:
+        path (str): The DuckDB database file
+
+    Returns:
+        Tuple: (mtime, size) of the database file and of its write-ahead log
+    """
+    version = []
+    for file in (path, path + ".wal"):
+        try:
+            stat = os.stat(file)
+            version.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+
+class ResultCache:
+    """
+    LRU cache of query results, bounded by the bytes of the cached Arrow tables.
+
+    Keys are the normalized query text. All entries belong to one database
+    version; the first lookup after the database file changed drops them all.
+    Only read-only queries (is_read_only) are cached.
+    """
+
+    def __init__(self, database: str, max_bytes: int, ttl: float):
+        self.database = database
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._version = database_version(database)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def get(self, query: str) -> Optional[QueryResult]:
+        """Return the cached result of a query or None"""
+        key = normalize_query(query)
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl:
+                self._drop(key)
+                self.stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put(self, query: str, query_result: QueryResult) -> None:
+        """Cache the result of a read-only query, evicting the least recently used entries beyond max_bytes"""
+        if query_result.nbytes > self.max_bytes or not is_read_only(query):
+            return
+        key = normalize_query(query)
+        with self._lock:
+            self._check_version()
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (query_result, time.monotonic())
+            self._bytes += query_result.nbytes
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def invalidate(self) -> None:
+        """Drop every cached result, e.g. after the data was reloaded"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = database_version(self.database)
+            self.stats["invalidations"] += 1
+
+    def info(self) -> Dict[str, Any]:
+        """Return the hit/miss counters together with the current size"""
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self._bytes}
+
+    def _check_version(self) -> None:
+        version = database_version(self.database)
+        if version != self._version:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+            self.stats["invalidations"] += 1
+
+    def _drop(self, key: str) -> None:
+        query_result, _ = self._entries.pop(key)
+        self._bytes -= query_result.nbytes
+
+
+def result_cache() -> ResultCache:
+    """The ResultCache of the process, created on first use"""
+    def create():
+        param = get_context().param
+        return ResultCache(
+            param['drugdb_path'],
+            max_bytes=param.get("result_cache_max_bytes", 256 * 1024 * 1024),
+            ttl=param.get("result_cache_ttl_s", 600),
+        )
+    return get_context().resource("result_cache", create)
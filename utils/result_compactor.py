@@ -0,0 +1,177 @@
+# File: utils/result_compactor.py
+
+import functools
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from utils.app_context import setting
+from utils.query_result import QueryResult, format_value
+
+# A head+tail sample smaller than this says too little, aggregates are used instead
+MIN_SAMPLE_ROWS = 10
+TOP_VALUES = 5
+AGGREGATE_VALUE_LENGTH = 60
+
+
+def answer_token_budget() -> int:
+    """Return the upper bound for the query_result part of the answer prompt"""
+    return setting("answer_token_budget", 3000)
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding():
+    """The tokenizer of the answer model, loaded on first use; tiktoken may download it"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text for the answer model.
+
+    Falls back to the usual estimate of four characters per token when
+    tiktoken or its encoding is not available.
+
+    Args:
+        text (str): The text to measure
+
+    Returns:
+        int: The number of tokens
+    """
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def compact_result(query_result: QueryResult, budget: Optional[int] = None) -> str:
+    """
+    Render a query result for the answer LLM within a token budget.
+
+    Depending on the size of the result this is the full set of rows, a head+tail
+    sample, or per-column aggregates. Whenever rows are left out, a note says so.
+
+    Args:
+        query_result (QueryResult): The executed query's rows
+        budget (int): Maximum number of tokens for the rendered result, defaults to answer_token_budget()
+
+    Returns:
+        str: The rows, sample or aggregates, followed by a note on anything left out
+    """
+    if budget is None:
+        budget = answer_token_budget()
+    # Every row costs at least one token, so only render all rows when they can fit
+    if query_result.row_count <= budget:
+        full = query_result.to_llm_text()
+        if count_tokens(full) <= budget:
+            return full
+
+    total = query_result.row_count
+    sample_size = _largest_sample(query_result, budget)
+    if sample_size >= MIN_SAMPLE_ROWS:
+        head = sample_size - sample_size // 2
+        tail = sample_size // 2
+        return (
+            _sample_text(query_result, sample_size)
+            + f"\n\nNote: the query returned {total} rows. Only the first {head} and the last {tail} rows are shown, "
+            f"the {total - sample_size} rows in between were left out."
+        )
+
+    note = (
+        f"\n\nNote: the query returned {total} rows, too many to show. "
+        "The lines above are per-column aggregates instead of the rows."
+    )
+    return _fit_aggregates(query_result.table, budget - count_tokens(note)) + note
+
+
+def _fit_aggregates(table: pa.Table, budget: int) -> str:
+    """
+    Render the aggregates within the budget.
+
+    Wide tables drop the most frequent values first, then the columns at the
+    end, with a line naming how many columns were left out.
+    """
+    for top_values in (TOP_VALUES, 0):
+        lines = _aggregates(table, top_values)
+        text = "\n".join(lines)
+        if count_tokens(text) <= budget:
+            return text
+
+    def truncated(kept: int) -> str:
+        return "\n".join(lines[:kept] + [f"... {len(lines) - kept} more columns left out"])
+
+    # Binary search for the most leading columns that fit
+    low, high = 0, len(lines) - 1
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(truncated(middle)) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return truncated(low)
+
+
+def _sample_text(query_result: QueryResult, size: int) -> str:
+    total = query_result.row_count
+    head = size - size // 2
+    tail = size // 2
+    table = pa.concat_tables([query_result.table.slice(0, head), query_result.table.slice(total - tail, tail)])
+    return query_result.to_llm_text(table)
+
+
+def _largest_sample(query_result: QueryResult, budget: int) -> int:
+    """Binary search for the largest head+tail sample that fits into the budget"""
+    # Leave room for the note that follows the sample
+    budget -= 60
+    # Every row costs at least one token, so no sample can be larger than the budget
+    low, high = 0, min(query_result.row_count - 1, budget)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(_sample_text(query_result, middle)) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _aggregates(table: pa.Table, top_values: int = TOP_VALUES) -> List[str]:
+    """Summarize every column by non-null count, distinct count, range and most frequent values, one line each"""
+    lines: List[str] = []
+    for name, column in zip(table.column_names, table.columns):
+        non_null = pc.count(column).as_py()
+        distinct = None
+        parts = [f"{non_null} non-null"]
+        try:
+            distinct = pc.count_distinct(column).as_py()
+            parts.append(f"{distinct} distinct")
+        except (pa.ArrowNotImplementedError, pa.ArrowTypeError):
+            pass
+        try:
+            min_max = pc.min_max(column).as_py()
+            if min_max["min"] is not None:
+                parts.append(f"min {_short(min_max['min'])}, max {_short(min_max['max'])}")
+        except (pa.ArrowNotImplementedError, pa.ArrowTypeError):
+            pass
+        # Frequencies only say something when values repeat
+        if top_values and distinct is not None and distinct < non_null:
+            try:
+                counts = pc.value_counts(column).to_pylist()
+                counts.sort(key=lambda c: c["counts"], reverse=True)
+                top = ", ".join(f"{_short(c['values'])} ({c['counts']})" for c in counts[:top_values])
+                parts.append(f"most frequent: {top}")
+            except (pa.ArrowNotImplementedError, pa.ArrowTypeError):
+                pass
+        lines.append(f"{name}: " + "; ".join(parts))
+    return lines
+
+
+def _short(value) -> str:
+    text = format_value(value)
+    if len(text) > AGGREGATE_VALUE_LENGTH:
+        text = text[:AGGREGATE_VALUE_LENGTH - 3] + "..."
+    return text
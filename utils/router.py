@@ -0,0 +1,257 @@
+# File: utils/router.py
+
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import my_db_specifics
+from utils.app_context import get_context, setting
+
+logger = logging.getLogger(__name__)
+
+# A precision measured on fewer confident held-out predictions than this is not trusted
+MIN_EVAL_PREDICTIONS = 10
+
+DEFAULT_LIMIT = 20
+
+# Keyword operators of the full-text search between two terms: a & b, a | b, a & !b
+_FULLTEXT_OPERATORS = re.compile(r"\w['\"]?\s+[&|]\s+!?['\"]?\w")
+_QUOTED = re.compile(r"\"([^\"]+)\"")
+_VECTOR_HINTS = re.compile(r"\bdefinition\b|\w-related disorder", re.IGNORECASE)
+_GRAPH_HINTS = re.compile(r"\buse the graph query\b", re.IGNORECASE)
+_LIMIT = re.compile(r"\b(?:show|give|search|list|find|top)(?:\s+me)?\s+(\d+)\b", re.IGNORECASE)
+_NO_LIMIT = re.compile(r"\b(?:without (?:a |any )?limit|no limit|all (?:the )?(?:results|rows|matches))\b", re.IGNORECASE)
+# Keyword input: terms joined by operators, e.g. double blind & Alzheimer's disease or !placebo | insulin
+_KEYWORD_INPUT = re.compile(r"^[(!\s]*[\w'\- ]+[)\s]*(?:[&|][(!\s]*[\w'\- ]+[)\s]*)+$")
+# Words that start a sentence; with one of these first the input is a question, not keywords
+_SENTENCE_START = re.compile(
+    r"^\s*(?:what|which|who|whom|whose|when|where|why|how|is|are|was|were|do|does|did|can|could|should|"
+    r"find|show|list|give|get|search|tell|return|display)\b",
+    re.IGNORECASE,
+)
+# Words that join the parts of a sentence; keyword input rarely has them, the LLM router decides then
+_SENTENCE_WORDS = re.compile(r"\b(?:for|in|with|of|that|treat|treats|about|from|by|to|me)\b", re.IGNORECASE)
+_TOKEN = re.compile(r"[a-z]+")
+
+
+def question_limit(question: str) -> int:
+    """Return the number of rows a question asks for, e.g. "Show me 5 drugs", 0 for all results, or DEFAULT_LIMIT"""
+    if _NO_LIMIT.search(question):
+        return 0
+    match = _LIMIT.search(question)
+    return int(match.group(1)) if match else DEFAULT_LIMIT
+
+
+def is_keyword_search(question: str) -> bool:
+    """
+    Return whether a question is a full-text keyword expression.
+
+    That is either a quoted expression with operators inside a question, e.g.
+    Search trials titled "double blind & Valaciclovir", or an input that is
+    nothing but terms joined by operators. A sentence that merely contains
+    & or |, e.g. Which drugs treat Alzheimer's & Parkinson's disease? or
+    Trials for insulin | metformin in children, is not.
+    """
+    if any(_FULLTEXT_OPERATORS.search(quoted) for quoted in _QUOTED.findall(question)):
+        return True
+    text = question.strip().rstrip(".")
+    return (
+        bool(_FULLTEXT_OPERATORS.search(text))
+        and not _SENTENCE_START.match(text.lstrip("(! "))
+        and not _SENTENCE_WORDS.search(text)
+        and bool(_KEYWORD_INPUT.match(text))
+    )
+
+
+def tagged_examples() -> List[Tuple[str, str]]:
+    """Return (question, tool name) pairs from the examples in my_db_specifics"""
+    examples = []
+    for tool_name, tool_examples in (
+        ("SQL_QueryTool", my_db_specifics.sql_examples),
+        ("Graph_QueryTool", my_db_specifics.graph_examples),
+        ("Fulltext_QueryTool", my_db_specifics.full_text_search_examples),
+        ("Vector_QueryTool", my_db_specifics.vector_search_examples),
+    ):
+        examples.extend((example["input"], tool_name) for example in tool_examples)
+    return examples
+
+
+class NaiveBayesRouter:
+    """Multinomial naive Bayes over question words, trained on tagged example questions"""
+
+    def __init__(self, examples: List[Tuple[str, str]]):
+        self.word_counts: Dict[str, Counter] = {}
+        self.class_counts: Counter = Counter()
+        for question, tool_name in examples:
+            self.class_counts[tool_name] += 1
+            self.word_counts.setdefault(tool_name, Counter()).update(_TOKEN.findall(question.lower()))
+        self.vocabulary = set().union(*self.word_counts.values()) if self.word_counts else set()
+        self.totals = {tool_name: sum(counts.values()) for tool_name, counts in self.word_counts.items()}
+
+    def predict(self, question: str) -> Tuple[str, float]:
+        """
+        Return the most likely tool and its posterior probability.
+
+        Args:
+            question (str): The user question
+
+        Returns:
+            Tuple[str, float]: The tool name and the probability of that choice
+        """
+        words = [word for word in _TOKEN.findall(question.lower()) if word in self.vocabulary]
+        total_examples = sum(self.class_counts.values())
+        scores = {}
+        for tool_name, counts in self.word_counts.items():
+            score = math.log(self.class_counts[tool_name] / total_examples)
+            for word in words:
+                score += math.log((counts[word] + 1) / (self.totals[tool_name] + len(self.vocabulary)))
+            scores[tool_name] = score
+
+        best = max(scores, key=scores.get)
+        normalizer = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1 / normalizer
+
+
+def evaluate_classifier(examples: List[Tuple[str, str]], min_confidence: float) -> Dict[str, Any]:
+    """
+    Measure the classifier on held-out questions by leave-one-out.
+
+    Each example question is predicted by a classifier trained on all the
+    other examples; only predictions at or above min_confidence count, as
+    only those would skip the LLM router.
+
+    Args:
+        examples: (question, tool name) pairs, e.g. tagged_examples()
+        min_confidence (float): The posterior the router requires
+
+    Returns:
+        Dict[str, Any]: Number of examples, confident and correct predictions, precision and coverage
+    """
+    confident = correct = 0
+    for i, (question, tool_name) in enumerate(examples):
+        predicted, confidence = NaiveBayesRouter(examples[:i] + examples[i + 1:]).predict(question)
+        if confidence >= min_confidence:
+            confident += 1
+            correct += predicted == tool_name
+    return {
+        "examples": len(examples),
+        "confident": confident,
+        "correct": correct,
+        "precision": correct / confident if confident else 0.0,
+        "coverage": confident / len(examples) if examples else 0.0,
+    }
+
+
+class LocalRouter:
+    """
+    Picks the tool for easy questions without the routing LLM call.
+
+    Unambiguous phrasings are matched by rules first. The naive Bayes
+    classifier only decides when it is confident enough and, with
+    use_classifier="auto", when its leave-one-out precision on the example
+    questions reached min_precision. Everything else returns None, so the
+    caller falls back to the LLM router.
+    """
+
+    def __init__(self, min_confidence: float = 0.9, use_classifier: Any = "auto", min_precision: float = 0.95):
+        self.min_confidence = min_confidence
+        examples = tagged_examples()
+        self.classifier = NaiveBayesRouter(examples)
+        self.evaluation = evaluate_classifier(examples, min_confidence)
+        if use_classifier == "auto":
+            use_classifier = (
+                self.evaluation["confident"] >= MIN_EVAL_PREDICTIONS
+                and self.evaluation["precision"] >= min_precision
+            )
+        self.use_classifier = bool(use_classifier)
+        logger.info("local router: classifier %s, held-out %s", "on" if self.use_classifier else "off", self.evaluation)
+        self._lock = threading.Lock()
+        self.stats = {"routed": 0, "fast_path": 0, "rule": 0, "classifier": 0, "total_ms": 0.0}
+
+    def route(self, question: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Choose a tool and its arguments for a question, if the choice is clear.
+
+        Args:
+            question (str): The user question
+
+        Returns:
+            Optional[Tuple[str, Dict[str, Any]]]: The tool name and tool args, or None if unsure
+        """
+        start = time.perf_counter()
+        tool_name, source = self._choose(question)
+        elapsed = 1000 * (time.perf_counter() - start)
+
+        with self._lock:
+            self.stats["routed"] += 1
+            self.stats["total_ms"] += elapsed
+            if tool_name is not None:
+                self.stats["fast_path"] += 1
+                self.stats[source] += 1
+        if tool_name is None:
+            return None
+        return tool_name, self._tool_args(tool_name, question)
+
+    def _choose(self, question: str) -> Tuple[Optional[str], Optional[str]]:
+        if is_keyword_search(question):
+            return "Fulltext_QueryTool", "rule"
+        if _GRAPH_HINTS.search(question):
+            return "Graph_QueryTool", "rule"
+        if _VECTOR_HINTS.search(question):
+            return "Vector_QueryTool", "rule"
+
+        if not self.use_classifier:
+            return None, None
+        tool_name, confidence = self.classifier.predict(question)
+        if confidence >= self.min_confidence:
+            return tool_name, "classifier"
+        return None, None
+
+    def _tool_args(self, tool_name: str, question: str) -> Dict[str, Any]:
+        """Build the same args call_tools passes to a tool"""
+        original_query = question
+        if tool_name == "Fulltext_QueryTool":
+            # Keep only the quoted keywords, e.g. Search 3 trials ... "double blind & Valaciclovir"
+            quoted = [q for q in _QUOTED.findall(question) if _FULLTEXT_OPERATORS.search(q)]
+            if quoted:
+                original_query = quoted[0]
+        return {
+            "my_question": question,
+            "original_query": original_query,
+            "limit": question_limit(question),
+        }
+
+    def info(self) -> Dict[str, Any]:
+        """Return the fast-path rate and the average local routing latency"""
+        with self._lock:
+            routed = self.stats["routed"]
+            return {
+                **{key: value for key, value in self.stats.items() if key != "total_ms"},
+                "fast_path_rate": self.stats["fast_path"] / routed if routed else 0.0,
+                "avg_ms": self.stats["total_ms"] / routed if routed else 0.0,
+                "classifier_enabled": self.use_classifier,
+                "classifier_precision": self.evaluation["precision"],
+            }
+
+
+def enabled() -> bool:
+    """Return False when local_router: false sends every question to the LLM router"""
+    return setting("local_router", True)
+
+
+def router() -> LocalRouter:
+    """The LocalRouter of the process, trained and evaluated on first use"""
+    def create():
+        param = get_context().param
+        return LocalRouter(
+            # Below this posterior the classifier defers to the LLM router
+            min_confidence=param.get("router_min_confidence", 0.9),
+            # true, false, or "auto": use the classifier only if its held-out precision reaches router_min_precision
+            use_classifier=param.get("router_classifier", "auto"),
+            min_precision=param.get("router_min_precision", 0.95),
+        )
+    return get_context().resource("local_router", create)
@@ -0,0 +1,149 @@
+# File: utils/semantic_cache.py
+
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+import utils.embedding as embedding
+from utils.app_context import get_context, setting
+
+# Only the LLM-written queries are reused. The full-text and vector queries are filled from templates
+# with terms and embeddings of their own question, so reusing them would answer the stored question.
+CACHED_TOOLS = ("SQL_QueryTool", "Graph_QueryTool")
+
+# LLM calls a cache hit saves: the routing call plus the tool's generation call
+# (repair calls only run when a query fails the pre-flight, so they are not counted)
+LLM_CALLS_PER_TOOL = {
+    "SQL_QueryTool": 2,
+    "Graph_QueryTool": 2,
+}
+
+
+class SemanticCache:
+    """
+    Cache of confirmed (question, tool, query) triples looked up by question similarity.
+
+    Questions are embedded and kept as unit vectors in one matrix, so a lookup
+    is a single matrix-vector product. Triples are stored in SQLite and loaded
+    back on first use. Only queries of CACHED_TOOLS are kept.
+    """
+
+    def __init__(self, path: str, threshold: float):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._db = None
+        self._entries = None
+        self._matrix = None
+        self.stats = {"lookups": 0, "hits": 0, "llm_calls_saved": 0}
+
+    def _open(self) -> None:
+        """Open the SQLite file and load the stored triples on first use; callers hold self._lock"""
+        if self._db is not None:
+            return
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS questions (question TEXT PRIMARY KEY, tool_name TEXT, query TEXT)"
+        )
+        self._db.commit()
+        self._entries = self._db.execute(
+            "SELECT question, tool_name, query FROM questions WHERE tool_name IN (?, ?)",
+            CACHED_TOOLS,
+        ).fetchall()
+
+    def _load(self) -> None:
+        """Embed the stored questions on first use, without holding self._lock during the API call"""
+        with self._load_lock:
+            if self._loaded:
+                return
+            with self._lock:
+                self._open()
+                questions = [question for question, _, _ in self._entries]
+            matrix = _unit_rows(embedding.get_embeddings(questions)) if questions else None
+            with self._lock:
+                self._matrix = matrix
+            self._loaded = True
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Find an earlier confirmed question similar enough to reuse its tool and query.
+
+        The question is embedded outside the lock, so concurrent sessions reach
+        the embedding batcher together; the lock only guards the matrix and entries.
+
+        Args:
+            question (str): The incoming question
+
+        Returns:
+            Optional[Dict[str, Any]]: The stored question, tool_name, query and similarity, or None
+        """
+        self._load()
+        with self._lock:
+            self.stats["lookups"] += 1
+            if self._matrix is None:
+                return None
+
+        vector = _unit_rows([embedding.get_embedding(question)])[0]
+        # add() only appends rows, so row i of any snapshot still belongs to entry i
+        with self._lock:
+            matrix = self._matrix
+        similarities = matrix @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+
+        with self._lock:
+            stored_question, tool_name, query = self._entries[best]
+            self.stats["hits"] += 1
+            self.stats["llm_calls_saved"] += LLM_CALLS_PER_TOOL.get(tool_name, 1)
+        return {
+            "question": stored_question,
+            "tool_name": tool_name,
+            "query": query,
+            "similarity": float(similarities[best]),
+        }
+
+    def add(self, question: str, tool_name: str, query: str) -> None:
+        """Remember a question whose generated query the user confirmed unchanged and that ran successfully"""
+        if tool_name not in CACHED_TOOLS:
+            return
+        self._load()
+        vector = _unit_rows([embedding.get_embedding(question)])
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO questions VALUES (?, ?, ?)", (question, tool_name, query))
+            self._db.commit()
+
+            for i, (stored_question, _, _) in enumerate(self._entries):
+                if stored_question == question:
+                    self._entries[i] = (question, tool_name, query)
+                    return
+            self._entries.append((question, tool_name, query))
+            self._matrix = vector if self._matrix is None else np.vstack([self._matrix, vector])
+
+    def info(self) -> Dict[str, Any]:
+        """Return lookups, hits, hit rate and LLM calls saved"""
+        with self._lock:
+            lookups = self.stats["lookups"]
+            return {
+                **self.stats,
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries) if self._entries is not None else None,
+            }
+
+
+def _unit_rows(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def semantic_cache() -> SemanticCache:
+    """The SemanticCache of the process, created on first use"""
+    return get_context().resource("semantic_cache", lambda: SemanticCache(
+        setting("semantic_cache_path", ".semantic_cache.sqlite"),
+        threshold=setting("semantic_cache_threshold", 0.95),
+    ))
@@ -0,0 +1,383 @@
+# File: utils/tracing.py
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.example_selectors import BaseExampleSelector
+
+from utils.app_context import get_context, setting
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the duration histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Numeric span attributes that are also summed into Prometheus counters
+COUNTERS = {
+    "prompt_tokens": "LLM prompt tokens",
+    "completion_tokens": "LLM completion tokens",
+    "rows": "Rows returned by queries",
+    "result_bytes": "Bytes of the query results",
+}
+
+_request_id: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+_span: contextvars.ContextVar = contextvars.ContextVar("span", default=None)
+
+
+class Span:
+    """One timed stage of a request, with attributes such as token or row counts"""
+
+    __slots__ = ("name", "request_id", "span_id", "parent_id", "start", "duration_ms", "attributes")
+
+    def __init__(self, name: str, request_id: Optional[str], parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.request_id = request_id
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration_ms = 0.0
+        self.attributes = dict(attributes)
+
+    def set(self, **attributes: Any) -> None:
+        """Set attributes, replacing earlier values"""
+        self.attributes.update(attributes)
+
+    def add(self, **counts: float) -> None:
+        """Add to numeric attributes, e.g. the tokens of several LLM calls"""
+        for key, value in counts.items():
+            self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            **self.attributes,
+        }
+
+
+class Tracer:
+    """
+    Collects finished spans: keeps per-stage histograms, counters and a window
+    of recent durations for the percentiles, and optionally appends them to a
+    size-capped JSONL file.
+    """
+
+    def __init__(self, path: str, window: int, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.window = window
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._file = None
+        self._last_flush = 0.0
+        self._durations: Dict[str, deque] = {}
+        self._buckets: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._counters: Dict[tuple, float] = {}
+        self._recent: deque = deque(maxlen=window)
+
+    def record(self, span: Span) -> None:
+        seconds = span.duration_ms / 1000
+        with self._lock:
+            if span.name not in self._durations:
+                self._durations[span.name] = deque(maxlen=self.window)
+                self._buckets[span.name] = [0] * len(BUCKETS)
+                self._sums[span.name] = 0.0
+                self._counts[span.name] = 0
+            self._durations[span.name].append(span.duration_ms)
+            self._sums[span.name] += seconds
+            self._counts[span.name] += 1
+            # Prometheus buckets are cumulative: a span counts in every bucket it fits in
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    self._buckets[span.name][i] += 1
+            for key in COUNTERS:
+                value = span.attributes.get(key)
+                if isinstance(value, (int, float)):
+                    self._counters[(span.name, key)] = self._counters.get((span.name, key), 0) + value
+            record = span.to_dict()
+            self._recent.append(record)
+
+        if self.path:
+            self._write(json.dumps(record, default=str) + "\n")
+
+    def _write(self, line: str) -> None:
+        """Append a line to the trace file, rotating it at max_bytes; flushed at most once a second"""
+        with self._file_lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            if self._file.tell() + len(line) > self.max_bytes:
+                self._file.close()
+                os.replace(self.path, self.path + ".1")
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            now = time.monotonic()
+            if now - self._last_flush >= 1.0:
+                self._file.flush()
+                self._last_flush = now
+
+    def percentiles(self) -> Dict[str, Dict[str, float]]:
+        """Return the count, p50 and p95 in milliseconds of every stage"""
+        with self._lock:
+            windows = {name: sorted(durations) for name, durations in self._durations.items()}
+        return {
+            name: {
+                "count": len(durations),
+                "p50_ms": durations[int(0.5 * (len(durations) - 1))],
+                "p95_ms": durations[int(0.95 * (len(durations) - 1))],
+            }
+            for name, durations in windows.items()
+        }
+
+    def spans(self, request_id: str) -> List[Dict[str, Any]]:
+        """Return the recent spans of one request, in the order they finished"""
+        with self._lock:
+            return [span for span in self._recent if span["request_id"] == request_id]
+
+    def prometheus(self) -> str:
+        """Render the histograms and counters in the Prometheus text format"""
+        lines = [
+            "# HELP drugbot_stage_duration_seconds Duration of the stages of a question",
+            "# TYPE drugbot_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name, buckets in self._buckets.items():
+                for bound, count in zip(BUCKETS, buckets):
+                    lines.append(f'drugbot_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                count = self._counts[name]
+                lines.append(f'drugbot_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+                lines.append(f'drugbot_stage_duration_seconds_sum{{stage="{name}"}} {self._sums[name]:.6f}')
+                lines.append(f'drugbot_stage_duration_seconds_count{{stage="{name}"}} {count}')
+            for key, description in COUNTERS.items():
+                lines.append(f"# HELP drugbot_{key}_total {description}")
+                lines.append(f"# TYPE drugbot_{key}_total counter")
+                for (name, counter), value in self._counters.items():
+                    if counter == key:
+                        lines.append(f'drugbot_{key}_total{{stage="{name}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+    def flush(self) -> None:
+        with self._file_lock:
+            if self._file is not None:
+                self._file.flush()
+
+
+def enabled() -> bool:
+    """Return False when tracing: false records no spans at all"""
+    return setting("tracing", True)
+
+
+def tracer() -> Tracer:
+    """The Tracer of the process, created on first use"""
+    def create():
+        param = get_context().param
+        created = Tracer(
+            # When set, every finished span is appended here as one JSON line; by default spans stay in memory only
+            param.get("trace_path", ""),
+            # The percentiles are computed over the last trace_window spans of each stage
+            param.get("trace_window", 1000),
+            # The file is rotated to <trace_path>.1 when it grows beyond this size
+            max_bytes=param.get("trace_max_bytes", 50 * 1024 * 1024),
+        )
+        atexit.register(created.flush)
+        return created
+    return get_context().resource("tracer", create)
+
+
+def new_request_id() -> str:
+    """Return a new id for one user question"""
+    return uuid.uuid4().hex[:16]
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+@contextmanager
+def request(request_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Make a request id current; spans opened inside the block belong to it.
+
+    A question spans several Streamlit reruns, so the app keeps the id in
+    session state and re-enters it for the confirmation and answer steps.
+
+    Args:
+        request_id (str): The id to use, or None for a new one
+
+    Yields:
+        str: The request id
+    """
+    request_id = request_id or new_request_id()
+    token = _request_id.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _request_id.reset(token)
+
+
+class _NoSpan:
+    """Stands in for a Span when tracing is off"""
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def add(self, **counts: float) -> None:
+        pass
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Time a stage of the current request.
+
+    Spans nest: a span opened inside another one records it as its parent.
+    An exception is stored in the "error" attribute and raised again.
+
+    Args:
+        name (str): The stage, e.g. "route" or "sql.write"
+        **attributes: Initial attributes of the span
+
+    Yields:
+        Span: The open span, to set attributes such as rows or result_bytes
+    """
+    if not enabled():
+        yield _NoSpan()
+        return
+
+    parent = _span.get()
+    current = Span(name, _request_id.get(), parent.span_id if parent else None, attributes)
+    token = _span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.attributes["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration_ms = 1000 * (time.perf_counter() - start)
+        _span.reset(token)
+        tracer().record(current)
+
+
+def record_span(name: str, duration_ms: float, **attributes: Any) -> None:
+    """Record a stage that was timed outside a with block, e.g. the wait for the user's confirmation"""
+    if not enabled():
+        return
+    parent = _span.get()
+    finished = Span(name, _request_id.get(), parent.span_id if parent else None, attributes)
+    finished.start -= duration_ms / 1000
+    finished.duration_ms = duration_ms
+    tracer().record(finished)
+
+
+def add_to_span(**counts: float) -> None:
+    """Add counts to the innermost open span, if any"""
+    current = _span.get()
+    if current is not None:
+        current.add(**counts)
+
+
+def in_context(function: Callable) -> Callable:
+    """
+    Bind a function to a copy of the current context.
+
+    Executor threads do not inherit context variables, so work submitted to a
+    thread pool is wrapped with this to keep its request id and parent span.
+    Wrap once per submitted call: a context cannot be entered twice at once.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Adds the token usage of every LLM call to the span that made the call"""
+
+    run_inline = True
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            add_to_span(
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                completion_tokens=usage.get("completion_tokens", 0),
+            )
+            return
+        # Streamed responses carry the usage on the message instead
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if metadata:
+                    add_to_span(
+                        prompt_tokens=metadata.get("input_tokens", 0),
+                        completion_tokens=metadata.get("output_tokens", 0),
+                    )
+
+
+token_usage_callback = TokenUsageCallback()
+
+
+class TracedExampleSelector(BaseExampleSelector):
+    """Wraps an example selector so that the few-shot example lookup gets its own span"""
+
+    def __init__(self, selector: BaseExampleSelector, name: str):
+        self.selector = selector
+        self.name = name
+
+    def add_example(self, example: Dict[str, str]) -> Any:
+        return self.selector.add_example(example)
+
+    def select_examples(self, input_variables: Dict[str, str]) -> List[dict]:
+        with span(self.name):
+            return self.selector.select_examples(input_variables)
+
+
+_metrics_server = None
+_metrics_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = tracer().prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int, host: Optional[str] = None) -> None:
+    """
+    Serve tracer().prometheus() on /metrics from a daemon thread; later calls do nothing.
+
+    host defaults to trace_metrics_host, 127.0.0.1 unless configured, so only local clients can scrape it.
+    """
+    global _metrics_server
+    host = host or setting("trace_metrics_host", "127.0.0.1")
+    with _metrics_lock:
+        if _metrics_server is not None:
+            return
+        _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=_metrics_server.serve_forever, name="metrics", daemon=True).start()
+        logger.info("serving Prometheus metrics on http://%s:%s/metrics", host, port)
@@ -0,0 +1,177 @@
+# File: utils/vector_engine.py
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+import utils.vector_index as vector_index
+from utils.app_context import setting
+
+logger = logging.getLogger(__name__)
+
+MATRIX_FILE = "disorder_embeddings.npy"
+NORMS_FILE = "disorder_norms.npy"
+IDS_FILE = "disorder_cuis.npy"
+# Written last, so an export that was interrupted never looks current
+CHECKSUM_FILE = "disorder_checksum.txt"
+
+
+def backend() -> str:
+    """Return "duckdb", which ranks inside the query, or "numpy", which ranks in process with NumpyVectorEngine"""
+    return setting("vector_backend", "duckdb")
+
+
+def engine_dir() -> Path:
+    """Return the folder of the exported .npy files"""
+    return Path(setting("vector_engine_dir", ".vector_engine"))
+
+
+def content_checksum(connection: Any) -> str:
+    """
+    Return a checksum of the exported Disorder columns.
+
+    Like fts_index.content_checksum, the sum of the row hashes does not depend
+    on the row order and changes whenever a disorder or its embedding changes.
+
+    Args:
+        connection: A DuckDB connection
+
+    Returns:
+        str: "<rows>:<sum of row hashes>"
+    """
+    rows, total = connection.execute(
+        "SELECT COUNT(*), COALESCE(SUM(hash(disorder_cui, definitionEmbedding)::HUGEINT), 0) FROM Disorder "
+        "WHERE definitionEmbedding IS NOT NULL"
+    ).fetchone()
+    return f"{rows}:{total}"
+
+
+def exported_checksum(directory: Optional[Path] = None) -> Optional[str]:
+    """Return the checksum recorded with the export, or None if there is no complete export"""
+    path = (directory or engine_dir()) / CHECKSUM_FILE
+    return path.read_text().strip() if path.exists() else None
+
+
+def export_embeddings(connection: Any, directory: Optional[Path] = None) -> int:
+    """
+    Export Disorder.definitionEmbedding into a contiguous float32 matrix.
+
+    Writes the matrix, its row norms and the matching disorder_cuis as .npy
+    files, then the content checksum of the exported rows. Files are written
+    under temporary names and renamed, so processes that have the old files
+    mapped keep a consistent view.
+
+    Args:
+        connection: A DuckDB connection
+        directory: Where to write the .npy files, defaults to engine_dir()
+
+    Returns:
+        int: The number of exported disorders
+    """
+    directory = directory or engine_dir()
+    # One transaction, so the checksum describes exactly the exported rows
+    connection.execute("BEGIN TRANSACTION")
+    try:
+        rows = connection.execute(
+            "SELECT disorder_cui, definitionEmbedding FROM Disorder "
+            "WHERE definitionEmbedding IS NOT NULL ORDER BY disorder_cui"
+        ).fetchall()
+        checksum = content_checksum(connection)
+    finally:
+        connection.execute("COMMIT")
+    ids = np.array([row[0] for row in rows], dtype=str)
+    matrix = np.ascontiguousarray(np.array([row[1] for row in rows], dtype=np.float32).reshape(len(rows), -1))
+    norms = np.linalg.norm(matrix, axis=1).astype(np.float32)
+
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, array in ((MATRIX_FILE, matrix), (NORMS_FILE, norms), (IDS_FILE, ids)):
+        tmp_path = directory / f"{name}.tmp{os.getpid()}.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, directory / name)
+    tmp_path = directory / f"{CHECKSUM_FILE}.tmp{os.getpid()}"
+    tmp_path.write_text(checksum)
+    os.replace(tmp_path, directory / CHECKSUM_FILE)
+    return len(ids)
+
+
+class NumpyVectorEngine:
+    """
+    In-process top-k search over memory-mapped disorder embeddings.
+
+    The matrix is opened with np.memmap (read-only), so worker processes on the
+    same host share its pages through the OS page cache.
+    """
+
+    def __init__(self, directory: Optional[Path] = None, metric: Optional[str] = None):
+        directory = directory or engine_dir()
+        self.metric = metric or vector_index.index_settings()["metric"]
+        self.matrix = np.load(directory / MATRIX_FILE, mmap_mode="r")
+        self.norms = np.load(directory / NORMS_FILE)
+        self.squared_norms = self.norms ** 2
+        self.ids = np.load(directory / IDS_FILE)
+
+    def search(self, queries: Sequence[Sequence[float]], k: int) -> List[List[str]]:
+        """
+        Find the k nearest disorders for a batch of query vectors.
+
+        Args:
+            queries: One or more query embeddings, shape (n, 1536)
+            k: Number of neighbours per query
+
+        Returns:
+            List[List[str]]: The disorder_cuis of each query, nearest first
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, len(self.ids))
+        if k <= 0:
+            return [[] for _ in queries]
+
+        # One matrix product scores every disorder against every query
+        products = queries @ self.matrix.T
+        if self.metric == "l2sq":
+            # ||x - q||^2 up to the per-query constant ||q||^2
+            distances = self.squared_norms - 2 * products
+        elif self.metric == "cosine":
+            distances = -products / np.maximum(self.norms, 1e-12)
+        else:
+            distances = -products
+
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(distances, top, axis=1).argsort(axis=1)
+        nearest = np.take_along_axis(top, order, axis=1)
+        return [self.ids[row].tolist() for row in nearest]
+
+
+_engine: NumpyVectorEngine | None = None
+_engine_lock = threading.Lock()
+
+
+def load_engine(connection: Any = None) -> NumpyVectorEngine:
+    """
+    Open the memory-mapped engine, exporting the embeddings first if needed.
+
+    With a connection, the export is redone when its checksum no longer
+    matches the Disorder table. Without one, an existing export is used as is.
+
+    Args:
+        connection: A DuckDB connection, needed when no export exists yet
+
+    Returns:
+        NumpyVectorEngine: The engine shared by this process
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            checksum = exported_checksum()
+            if connection is not None:
+                if checksum != content_checksum(connection):
+                    logger.info("vector engine: export missing or stale, exporting to %s", engine_dir())
+                    export_embeddings(connection)
+            elif checksum is None:
+                raise FileNotFoundError(f"No exported embeddings in {engine_dir()}, pass a connection to export them")
+            _engine = NumpyVectorEngine()
+        return _engine
@@ -0,0 +1,145 @@
+# File: utils/vector_index.py
+
+import logging
+from typing import Any, Dict, List
+
+from utils.app_context import get_context
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "disorder_definition_hnsw"
+
+# The HNSW index only serves ORDER BY <distance> LIMIT k queries whose distance matches its metric
+DISTANCE_FUNCTIONS = {
+    "l2sq": "array_distance",
+    "cosine": "array_cosine_distance",
+    "ip": "array_negative_inner_product",
+}
+
+
+def index_settings() -> Dict[str, Any]:
+    """
+    Return the metric and the HNSW parameters configured in config.yaml.
+
+    Returns:
+        Dict[str, Any]: metric, M, ef_construction and ef_search
+    """
+    param = get_context().param
+    metric = param.get("hnsw_metric", "l2sq")
+    if metric not in DISTANCE_FUNCTIONS:
+        raise ValueError(f"hnsw_metric must be one of {', '.join(DISTANCE_FUNCTIONS)}, got {metric!r}")
+    return {
+        "metric": metric,
+        "M": int(param.get("hnsw_m", 16)),
+        "ef_construction": int(param.get("hnsw_ef_construction", 128)),
+        "ef_search": int(param.get("hnsw_ef_search", 64)),
+    }
+
+
+def distance_function() -> str:
+    """Return the DuckDB distance function that matches the configured metric"""
+    return DISTANCE_FUNCTIONS[index_settings()["metric"]]
+
+
+def session_commands() -> List[str]:
+    """
+    Return the per-connection settings for HNSW search.
+
+    Returns:
+        List[str]: Statements to run on every new connection
+    """
+    return [
+        # Needed to create or load an HNSW index in a database file
+        "SET hnsw_enable_experimental_persistence = true;",
+        f"SET hnsw_ef_search = {index_settings()['ef_search']};",
+    ]
+
+
+def index_exists(connection: Any) -> bool:
+    """
+    Check whether the HNSW index on Disorder.definitionEmbedding exists.
+
+    Args:
+        connection: A DuckDB connection
+
+    Returns:
+        bool: True if the index exists
+    """
+    count = connection.execute(
+        "SELECT COUNT(*) FROM duckdb_indexes() WHERE index_name = ?", [INDEX_NAME]
+    ).fetchone()[0]
+    return count > 0
+
+
+def ensure_index(connection: Any) -> bool:
+    """
+    Create the HNSW index on Disorder.definitionEmbedding if it is missing.
+
+    The index is stored in the database file and checkpointed right away.
+
+    Args:
+        connection: A read-write DuckDB connection with vss loaded
+
+    Returns:
+        bool: True if the index was created, False if it already existed
+    """
+    if index_exists(connection):
+        return False
+
+    for command in session_commands():
+        connection.execute(command)
+    hnsw = index_settings()
+    connection.execute(
+        f"""CREATE INDEX {INDEX_NAME} ON Disorder USING HNSW (definitionEmbedding)
+            WITH (metric = '{hnsw['metric']}', M = {hnsw['M']}, ef_construction = {hnsw['ef_construction']});"""
+    )
+    connection.execute("CHECKPOINT;")
+    return True
+
+
+def uses_index_scan(connection: Any, limit: int = 10) -> bool:
+    """
+    Check through EXPLAIN that a vector search is answered by an HNSW index scan.
+
+    The probe has the same shape as the vector queries the tools generate,
+    including the embedding bound as a parameter.
+
+    Args:
+        connection: A DuckDB connection with vss loaded
+        limit: The LIMIT of the probe query
+
+    Returns:
+        bool: True if the physical plan contains an HNSW index scan
+    """
+    plan = connection.execute(
+        f"""EXPLAIN SELECT name, definition
+            FROM Disorder
+            ORDER BY {distance_function()}(definitionEmbedding, $probe::FLOAT[1536])
+            LIMIT {limit};""",
+        {"probe": [0.0] * 1536},
+    ).fetchall()
+    return any("HNSW_INDEX_SCAN" in str(row[-1]) for row in plan)
+
+
+def check_index(connection: Any, create: bool = True) -> Dict[str, Any]:
+    """
+    Make sure the HNSW index exists and is used, and report on it.
+
+    Args:
+        connection: A DuckDB connection with vss loaded
+        create: Create the index if it is missing (requires a read-write connection)
+
+    Returns:
+        Dict[str, Any]: The index settings and whether it was created and is used
+    """
+    created = ensure_index(connection) if create else False
+    status = {
+        "index": INDEX_NAME,
+        **index_settings(),
+        "exists": index_exists(connection),
+        "created": created,
+    }
+    status["index_scan"] = status["exists"] and uses_index_scan(connection)
+    if not status["index_scan"]:
+        logger.warning("Vector queries on Disorder do not use the HNSW index %s: %s", INDEX_NAME, status)
+    return status
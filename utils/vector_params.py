@@ -0,0 +1,77 @@
+# File: utils/vector_params.py
+
+import hashlib
+import re
+from typing import Dict, List
+
+import utils.embedding as embedding
+
+# A query placeholder such as $emb_1f2e3d4c5b6a7988 stands for the embedding of one text
+PLACEHOLDER_PATTERN = re.compile(r"\$(emb_[0-9a-f]{16})\b")
+
+_texts: Dict[str, str] = {}
+
+
+def embedding_placeholder(text: str) -> str:
+    """
+    Return a compact query placeholder for the embedding of a text.
+
+    The placeholder is derived from the text itself, so the same question always
+    maps to the same name. The vector is only looked up when the query is executed.
+
+    Args:
+        text (str): The text whose embedding the query needs
+
+    Returns:
+        str: A DuckDB named parameter, e.g. "$emb_1f2e3d4c5b6a7988"
+    """
+    text = embedding.normalize_text(text)
+    name = "emb_" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    if name not in _texts:
+        _texts[name] = text
+        embedding.cache().save_placeholder(name, text)
+    return "$" + name
+
+
+def placeholder_text(name: str) -> str | None:
+    """
+    Look up the text a placeholder name was created for.
+
+    Args:
+        name (str): The placeholder name without the leading "$"
+
+    Returns:
+        str | None: The text, or None if the placeholder is unknown
+    """
+    if name not in _texts:
+        text = embedding.cache().load_placeholder(name)
+        if text is None:
+            return None
+        _texts[name] = text
+    return _texts[name]
+
+
+def placeholder_names(query: str) -> List[str]:
+    """Return the distinct embedding placeholder names used in a query"""
+    return list(dict.fromkeys(PLACEHOLDER_PATTERN.findall(query)))
+
+
+def bind_embeddings(query: str) -> Dict[str, List[float]]:
+    """
+    Build the parameter dict for every embedding placeholder in a query.
+
+    Args:
+        query (str): A query that may contain embedding placeholders
+
+    Returns:
+        Dict[str, List[float]]: Placeholder name to embedding vector
+
+    Raises:
+        ValueError: If the query uses a placeholder that was never created
+    """
+    names = placeholder_names(query)
+    texts = [placeholder_text(name) for name in names]
+    unknown = [name for name, text in zip(names, texts) if text is None]
+    if unknown:
+        raise ValueError(f"Unknown embedding placeholder(s): {', '.join('$' + n for n in unknown)}")
+    return dict(zip(names, embedding.get_embeddings(texts)))